@@ -7,6 +7,7 @@ let likesData = null;
 let presetsData = null;
 let presetsDetailedData = null;
 let hydrationData = null;
+let duplicatesData = null;
 
 // Cluster colors
 const clusterColors = {
@@ -25,12 +26,13 @@ const clusterColors = {
 async function loadData() {
     try {
         const basePath = 'data/';
-        const [clusters, likes, presets, presetsDetailed, hydration] = await Promise.all([
+        const [clusters, likes, presets, presetsDetailed, hydration, duplicates] = await Promise.all([
             fetch(basePath + 'track_clusters.json').then(r => r.json()),
             fetch(basePath + 'soundcloud_likes.json').then(r => r.json()),
             fetch(basePath + 'eq_presets.json').then(r => r.json()),
             fetch(basePath + 'eq_presets_detailed.json').then(r => r.json()),
-            fetch(basePath + 'soundcloud_hydration.json').then(r => r.json()).catch(() => null)
+            fetch(basePath + 'soundcloud_hydration.json').then(r => r.json()).catch(() => null),
+            fetch(basePath + 'duplicate_groups.json').then(r => r.json()).catch(() => null)
         ]);
 
         clustersData = clusters;
@@ -38,6 +40,7 @@ async function loadData() {
         presetsData = presets;
         presetsDetailedData = presetsDetailed;
         hydrationData = hydration;
+        duplicatesData = duplicates;
 
         return true;
     } catch (error) {
@@ -71,6 +74,9 @@ async function loadDashboard() {
     // Populate sample tracks
     populateSampleTracks();
 
+    // Populate duplicate groups
+    populateDuplicates();
+
     // Populate user info
     populateUserInfo();
 }
@@ -152,6 +158,29 @@ function populateSampleTracks() {
     `).join('');
 }
 
+function populateDuplicates() {
+    const container = document.getElementById('duplicates-list');
+    const summary = document.getElementById('duplicates-summary');
+
+    if (!duplicatesData || !duplicatesData.groups.length) {
+        summary.textContent = 'No re-uploads or alternate versions found';
+        return;
+    }
+
+    summary.textContent = `${duplicatesData.duplicate_tracks.toLocaleString()} tracks are re-uploads or versions ` +
+        `of ${duplicatesData.group_count.toLocaleString()} others`;
+    container.innerHTML = duplicatesData.groups.slice(0, 5).map(g => `
+        <div class="track-item" onclick="window.open('${g.representative.url}', '_blank')"
+             title="${escapeHtml(g.duplicates.map(d => `${d.artist} - ${d.title}`).join('\n')).replace(/"/g, '&quot;')}">
+            <div class="track-info">
+                <div class="track-title">${escapeHtml(g.representative.title)}</div>
+                <div class="track-artist">${escapeHtml(g.representative.artist)}</div>
+            </div>
+            <div class="track-meta">${g.size} versions</div>
+        </div>
+    `).join('');
+}
+
 function populateUserInfo() {
     const container = document.getElementById('user-info-content');
 
@@ -604,10 +633,62 @@ function openTrackModal(trackId) {
             </div>
         </div>
         ${track.description ? `<p style="color: var(--text-muted); margin-bottom: 1rem;">${escapeHtml(track.description.substring(0, 300))}...</p>` : ''}
+        <div id="modal-similar-tracks"></div>
         <a href="${track.url}" target="_blank" class="btn btn-primary">Open on SoundCloud</a>
     `;
 
     document.getElementById('trackModal').classList.add('active');
+    renderSimilarTracks(track);
+}
+
+// Precomputed nearest-neighbor index (built by src/similarity_index.py)
+let similarityIndex = null;
+
+async function loadSimilarityIndex() {
+    if (similarityIndex) return similarityIndex;
+    const manifest = await fetch('data/track_neighbors.json').then(r => r.json());
+    const buffer = await fetch('data/' + manifest.index_file).then(r => r.arrayBuffer());
+    const rows = new Map(manifest.track_ids.map((id, row) => [id, row]));
+    similarityIndex = { manifest, rows, view: new DataView(buffer) };
+    return similarityIndex;
+}
+
+async function renderSimilarTracks(track, limit = 5) {
+    const container = document.getElementById('modal-similar-tracks');
+    let index;
+    try {
+        index = await loadSimilarityIndex();
+    } catch (error) {
+        return;
+    }
+
+    const { manifest, rows, view } = index;
+    const row = rows.get(String(track.track_id || track.url));
+    if (row === undefined) return;
+
+    const simOffset = manifest.count * manifest.k * 4;
+    const similar = [];
+    for (let i = 0; i < Math.min(limit, manifest.k); i++) {
+        const neighbor = view.getInt32((row * manifest.k + i) * 4, true);
+        if (neighbor < 0) break;
+        const sim = view.getInt16(simOffset + (row * manifest.k + i) * 2, true) / manifest.layout.similarity_scale;
+        const id = manifest.track_ids[neighbor];
+        const match = allTracks.find(t => String(t.track_id || t.url) === id);
+        if (match) similar.push({ track: match, sim });
+    }
+    if (!similar.length) return;
+
+    container.innerHTML = `
+        <h3 style="margin-bottom: 0.5rem;">Similar Tracks</h3>
+        <ul style="margin-bottom: 1rem;">
+            ${similar.map(({ track: t, sim }) => `
+                <li style="cursor: pointer;" onclick="openTrackModal('${t.track_id}')">
+                    ${escapeHtml(t.title)} - ${escapeHtml(t.artist)}
+                    <span style="color: var(--text-muted);">(${(sim * 100).toFixed(0)}%)</span>
+                </li>
+            `).join('')}
+        </ul>
+    `;
 }
 
 function closeTrackModal() {
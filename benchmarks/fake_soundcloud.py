@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Fake SoundCloud Server
+Local stand-in for soundcloud.com and api-v2.soundcloud.com so the fetchers
+(fetch_likes, soundcloud_api_scraper, scrape_likes_http) can be load- and
+regression-tested offline. Serves:
+
+    GET /                          homepage with JS bundles (one holds a client_id)
+    GET /assets/<name>.js          the bundles
+    GET /<username>/likes          likes page with window.__sc_hydration
+    GET /resolve?url=...           user (or track) resolution
+    GET /users/<id>/likes          likes with cursor-based next_href pagination
+    GET /tracks?ids=1,2,3          batched track lookup
+
+Latency, 401/429 and truncated-page faults are configurable. With
+accounts=N, extra users user-0001..user-N each like a rotated view of the
+same library (multi-account runs). Point the fetchers at it with
+SOUNDCLOUD_URL / SOUNDCLOUD_API_URL.
+"""
+
+import argparse
+import base64
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlencode, urlparse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from synthetic_library import generate_library
+
+CLIENT_ID = "FakeClientId0123456789abcdefABCD"
+USER_ID = 57658459
+USERNAME = "amr-farouk-10"
+MAX_LIMIT = 200
+HYDRATION_LIKES = 20
+ACCOUNT_ID_BASE = 1000
+
+
+def api_track(track):
+    """Convert a synthetic library track into the API v2 track shape."""
+    return {
+        "kind": "track",
+        "id": track["track_id"],
+        "title": track["title"],
+        "user": {"id": track["artist_id"], "username": track["artist"], "kind": "user"},
+        "permalink_url": track["url"],
+        "duration": track["duration_ms"],
+        "playback_count": track["plays"],
+        "likes_count": track["likes"],
+        "reposts_count": track["reposts"],
+        "comment_count": track["comments"],
+        "genre": track["genre"],
+        "tag_list": track["tag_list"],
+        "description": track["description"],
+        "created_at": track["created_at"],
+        "artwork_url": track["artwork_url"],
+        "waveform_url": track["waveform_url"],
+    }
+
+
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(f"likes:{position}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Accept both opaque cursors and plain numeric offsets."""
+    if cursor.isdigit():
+        return int(cursor)
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return int(base64.urlsafe_b64decode(padded).decode().split(":", 1)[1])
+
+
+class FakeSoundCloud:
+    """Shared server state: the library plus fault configuration."""
+
+    def __init__(self, tracks, username=USERNAME, user_id=USER_ID, latency=0.0, jitter=0.0,
+                 error_401_rate=0.0, error_429_rate=0.0, truncate_rate=0.0, numeric_offsets=False, seed=0,
+                 accounts=0):
+        self.likes = [
+            {"created_at": t["liked_at"], "kind": "like", "track": api_track(t)} for t in tracks
+        ]
+        self.by_id = {item["track"]["id"]: item["track"] for item in self.likes}
+        self.by_url = {item["track"]["permalink_url"]: item["track"] for item in self.likes}
+        self.username = username
+        self.user_id = user_id
+        # Extra accounts: user id -> rotation of the likes list
+        self.accounts = {f"user-{i:04d}": ACCOUNT_ID_BASE + i for i in range(1, accounts + 1)}
+        self.rotations = {uid: (uid * 7919) % max(1, len(self.likes)) for uid in self.accounts.values()}
+        self.rotations[user_id] = 0
+        self.latency = latency
+        self.jitter = jitter
+        self.error_401_rate = error_401_rate
+        self.error_429_rate = error_429_rate
+        self.truncate_rate = truncate_rate
+        self.numeric_offsets = numeric_offsets
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def roll(self, rate):
+        with self.lock:
+            return rate > 0 and self.rng.random() < rate
+
+    def user(self, username=None):
+        username = username or self.username
+        user_id = self.accounts.get(username, self.user_id)
+        return {"kind": "user", "id": user_id, "username": username,
+                "permalink": username, "likes_count": len(self.likes),
+                "followers_count": 316}
+
+    def likes_of(self, user_id, start, limit):
+        rotation = self.rotations[user_id]
+        count = len(self.likes)
+        return [self.likes[(rotation + i) % count] for i in range(start, min(start + limit, count))]
+
+
+class FakeSoundCloudHandler(BaseHTTPRequestHandler):
+    state = None
+    protocol_version = "HTTP/1.1"
+
+    def base_url(self):
+        return f"http://{self.headers.get('Host')}"
+
+    def send_body(self, status, body, content_type="application/json"):
+        data = body.encode("utf-8") if isinstance(body, str) else body
+        truncated = status == 200 and content_type == "application/json" and self.state.roll(self.state.truncate_rate)
+        if truncated:
+            data = data[:max(1, len(data) // 2)]
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_json(self, obj, status=200):
+        self.send_body(status, json.dumps(obj, ensure_ascii=False))
+
+    def do_GET(self):
+        state = self.state
+        with state.lock:
+            state.requests += 1
+        if state.latency or state.jitter:
+            time.sleep(state.latency + state.rng.random() * state.jitter)
+
+        parsed = urlparse(self.path)
+        path = parsed.path.rstrip("/") or "/"
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+
+        # Web pages
+        if path == "/":
+            return self.homepage()
+        if path.startswith("/assets/"):
+            return self.asset(path)
+        if path == f"/{state.username}/likes":
+            return self.likes_page()
+
+        # API v2
+        if query.get("client_id") != CLIENT_ID or state.roll(state.error_401_rate):
+            return self.send_json({"error": "Unauthorized"}, 401)
+        if state.roll(state.error_429_rate):
+            return self.send_json({"error": "Too Many Requests"}, 429)
+
+        if path == "/resolve":
+            return self.resolve(query.get("url", ""))
+        if path.startswith("/users/") and path.endswith("/likes"):
+            user_id = path.split("/")[2]
+            if user_id.isdigit() and int(user_id) in state.rotations:
+                return self.user_likes(int(user_id), query)
+        if path == "/tracks":
+            ids = [int(i) for i in query.get("ids", "").split(",") if i.isdigit()]
+            return self.send_json([state.by_id[i] for i in ids if i in state.by_id])
+        if path.startswith("/tracks/"):
+            track_id = path.rsplit("/", 1)[1]
+            track = state.by_id.get(int(track_id)) if track_id.isdigit() else None
+            return self.send_json(track) if track else self.send_json({"error": "Not Found"}, 404)
+
+        self.send_json({"error": "Not Found"}, 404)
+
+    def homepage(self):
+        base = self.base_url()
+        scripts = "\n".join(
+            f'<script crossorigin src="{base}/assets/{name}.js"></script>'
+            for name in ("vendor-1a2b", "app-3c4d", "config-5e6f")
+        )
+        self.send_body(200, f"<!DOCTYPE html><html><head><title>SoundCloud</title></head><body>{scripts}</body></html>",
+                       "text/html; charset=utf-8")
+
+    def asset(self, path):
+        if path.endswith("config-5e6f.js"):
+            body = 'webpackJsonp([1],{42:function(e,t){e.exports={env:"production",client_id:"' + CLIENT_ID + '"}}});'
+        else:
+            body = "!function(e){var t={};function n(r){return t[r]}}(" + "0," * 2000 + "0);"
+        self.send_body(200, body, "application/javascript")
+
+    def likes_page(self):
+        state = self.state
+        hydration = [
+            {"hydratable": "anonymousId", "data": "fake-anon"},
+            {"hydratable": "apiClient", "data": {"id": CLIENT_ID, "isExpiring": False}},
+            {"hydratable": "user", "data": state.user()},
+            {"hydratable": "soundCollection", "data": {"collection": state.likes[:HYDRATION_LIKES]}},
+        ]
+        body = (
+            "<!DOCTYPE html><html><head><title>Likes</title>"
+            f'<script>window.__sc_version="1700000000"</script></head><body>'
+            f'<script>window.__sc_hydration = {json.dumps(hydration, ensure_ascii=False)};</script>'
+            f'<script crossorigin src="{self.base_url()}/assets/app-3c4d.js"></script>'
+            "</body></html>"
+        )
+        self.send_body(200, body, "text/html; charset=utf-8")
+
+    def resolve(self, url):
+        state = self.state
+        if url in state.by_url:
+            return self.send_json(state.by_url[url])
+        permalink = urlparse(url).path.strip("/")
+        if permalink == state.username or permalink in state.accounts:
+            return self.send_json(state.user(permalink))
+        if permalink and "/" not in permalink:
+            # Any other profile (e.g. client_id validation against /soundcloud)
+            return self.send_json({"kind": "user", "id": 1, "username": permalink, "permalink": permalink})
+        self.send_json({"error": "Not Found"}, 404)
+
+    def user_likes(self, user_id, query):
+        state = self.state
+        limit = min(int(query.get("limit", 50)), MAX_LIMIT)
+        start = decode_cursor(query.get("offset", "0"))
+        page = state.likes_of(user_id, start, limit)
+
+        next_href = None
+        if start + limit < len(state.likes):
+            cursor = start + limit if state.numeric_offsets else encode_cursor(start + limit)
+            params = {"offset": cursor, "limit": limit, "linked_partitioning": 1}
+            next_href = f"{self.base_url()}/users/{user_id}/likes?{urlencode(params)}"
+        self.send_json({"collection": page, "next_href": next_href, "query_urn": None})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(tracks, port=0, **faults):
+    """Start the fake server in a background thread; returns (server, base_url, state)."""
+    state = FakeSoundCloud(tracks, **faults)
+    handler = type("Handler", (FakeSoundCloudHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}", state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake SoundCloud web + API v2 server")
+    parser.add_argument("--port", type=int, default=8788)
+    parser.add_argument("--likes", type=int, default=1000, help="Size of the synthetic likes library")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra latency (seconds)")
+    parser.add_argument("--error-401-rate", type=float, default=0.0)
+    parser.add_argument("--error-429-rate", type=float, default=0.0)
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="Fraction of JSON bodies cut in half")
+    parser.add_argument("--numeric-offsets", action="store_true",
+                        help="Hand out plain integer offsets in next_href (allows offset windows)")
+    parser.add_argument("--accounts", type=int, default=0,
+                        help="Extra accounts user-0001..user-N (rotated views of the library)")
+    args = parser.parse_args()
+
+    tracks = generate_library(args.likes, args.seed)
+    server, base_url, _ = start_server(
+        tracks, args.port, latency=args.latency, jitter=args.jitter,
+        error_401_rate=args.error_401_rate, error_429_rate=args.error_429_rate,
+        truncate_rate=args.truncate_rate, numeric_offsets=args.numeric_offsets, seed=args.seed,
+        accounts=args.accounts,
+    )
+    print(f"Fake SoundCloud listening on {base_url} ({len(tracks)} likes, user {USERNAME})")
+    print(f"  SOUNDCLOUD_URL={base_url} SOUNDCLOUD_API_URL={base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
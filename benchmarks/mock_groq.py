@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Mock Groq Server
+Local stand-in for the OpenAI-compatible chat completions endpoint, so the
+Groq clustering path can be benchmarked offline. Point the pipeline at it
+with GROQ_API_URL=http://127.0.0.1:<port>/openai/v1/chat/completions.
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EQ_BANDS = [32, 64, 125, 250, 500, 1000, 2000, 4000, 8000, 16000]
+
+# Chance per band that a batched preset gain is out of range (exercises retries)
+INVALID_PRESET_RATE = 0.01
+
+# Characters per streamed delta (a few tokens, like the real API)
+STREAM_CHUNK_CHARS = 16
+
+# Clusters handed out by the analysis prompt (keywords match the synthetic library)
+CANNED_CLUSTERS = [
+    ("sufi_devotional", "Sufi Devotional", ["sufi", "dhikr", "ذكر", "صوفي", "حضرة", "إنشاد"]),
+    ("arabic_tarab", "Arabic Tarab", ["tarab", "طرب", "oud", "عود", "arabic", "maqam"]),
+    ("organic_house", "Organic House", ["house", "deep", "remix", "groove", "edit"]),
+    ("ambient_chill", "Ambient / Chill", ["ambient", "piano", "rain", "dream", "chill"]),
+    ("world_fusion", "World Fusion", ["world", "tribal", "desert", "ethnic", "dub"]),
+]
+
+# Other names batches give the same clusters (exercise consolidation)
+CLUSTER_ALIASES = {
+    "sufi_devotional": [("sufi_music", "Sufi Music"), ("spiritual_sufi", "Spiritual Sufi")],
+    "arabic_tarab": [("classical_tarab", "Classical Tarab"), ("arabic_classical", "Arabic Classical")],
+    "organic_house": [("deep_organic_house", "Deep Organic House"), ("organic_grooves", "Organic Grooves")],
+    "ambient_chill": [("chill_ambient", "Chill Ambient"), ("ambient_piano", "Ambient Piano")],
+    "world_fusion": [("ethnic_fusion", "Ethnic Fusion"), ("desert_world", "Desert World")],
+}
+
+# Different clusters with similar names, overlapping keywords and the same
+# audio profile, which consolidation must keep apart
+_POP_AUDIO = {"bass_emphasis": "medium", "vocal_presence": "high", "energy_level": "energetic"}
+DISTINCT_CLUSTER_PAIRS = [
+    ({"cluster_id": "arabic_pop", "name": "Arabic Pop", "keywords": ["pop", "arabic pop", "khaleeji"],
+      "audio_characteristics": _POP_AUDIO},
+     {"cluster_id": "western_pop", "name": "Western Pop", "keywords": ["pop", "top 40", "dance pop"],
+      "audio_characteristics": _POP_AUDIO}),
+    ({"cluster_id": "pop_rock", "name": "Pop Rock", "keywords": ["rock", "guitar", "pop rock", "power pop"],
+      "audio_characteristics": _POP_AUDIO},
+     {"cluster_id": "classic_rock", "name": "Classic Rock", "keywords": ["rock", "guitar", "classic rock", "70s"],
+      "audio_characteristics": _POP_AUDIO}),
+]
+
+
+def _completion(content, prompt_tokens, completion_tokens, finish_reason="stop"):
+    return {
+        "id": "mock-completion",
+        "object": "chat.completion",
+        "model": "mock",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                     "finish_reason": finish_reason}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+
+def malformed(content, rng):
+    """Near-valid JSON like models produce: a fence, a trailing comma, quoted numbers."""
+    content = re.sub(r'(": )(-?\d+)(?=[,}\s])', lambda m: f'{m.group(1)}"{m.group(2)}"'
+                     if rng.random() < 0.5 else m.group(0), content)
+    content = re.sub(r"\}$", ",}", content) if content.endswith("}") else content
+    return f"```json\n{content}\n```"
+
+
+def respond(prompt, rng, json_mode=False):
+    """Produce a plausible reply for the kind of prompt the pipeline sends."""
+    if "identified_clusters" in prompt:
+        match = re.search(r"Analyze these (\d+) tracks", prompt)
+        batch = int(match.group(1)) if match else 50
+        picks = rng.sample(CANNED_CLUSTERS, rng.randint(2, 4))
+        return json.dumps({"identified_clusters": [
+            {
+                "cluster_id": alias_id,
+                "name": alias_name,
+                "description": f"{alias_name} tracks",
+                "keywords": rng.sample(keywords, len(keywords) - 1),
+                "audio_characteristics": {
+                    "bass_emphasis": rng.choice(["low", "medium", "high"]),
+                    "vocal_presence": rng.choice(["low", "medium", "high"]),
+                    "energy_level": rng.choice(["calm", "moderate", "energetic"]),
+                },
+                "matching_track_indices": sorted(rng.sample(range(batch), min(5, batch))),
+            }
+            for cid, name, keywords in picks
+            for alias_id, alias_name in [rng.choice([(cid, name)] + CLUSTER_ALIASES[cid])]
+        ]}, ensure_ascii=False)
+
+    if '"presets"' in prompt:
+        # Batched presets keyed by cluster_id; some come back out of range
+        ids = re.findall(r"^([^\t\n]+)\t", prompt.split("Clusters (", 1)[-1], re.M)[1:]
+        return json.dumps({"presets": {
+            cid: {
+                "preset_name": f"Mock EQ {cid}",
+                "eq_settings": {str(f): rng.randint(-6, 6) if rng.random() > INVALID_PRESET_RATE else 9
+                                for f in EQ_BANDS},
+                "description": "Mock preset",
+                "characteristics": ["mock"],
+            }
+            for cid in ids
+        }}, ensure_ascii=False)
+
+    if "eq_settings" in prompt:
+        return json.dumps({
+            "preset_name": "Mock EQ",
+            "eq_settings": {str(f): rng.randint(-6, 6) for f in EQ_BANDS},
+            "description": "Mock preset",
+            "characteristics": ["mock"],
+        })
+
+    cluster_id = rng.choice(CANNED_CLUSTERS)[0]
+    return json.dumps({"cluster_id": cluster_id}) if json_mode else cluster_id
+
+
+def _stream_chunk(delta, finish_reason=None, usage=None):
+    chunk = {
+        "id": "mock-completion",
+        "object": "chat.completion.chunk",
+        "model": "mock",
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    if usage:
+        chunk["x_groq"] = {"usage": usage}
+    return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+class MockGroqHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    error_rate = 0.0
+    token_rate = 0.0  # completion tokens generated per second (0 = instant)
+    malformed_rate = 0.0  # fraction of JSON replies sent near-valid (see malformed)
+    rng = random.Random(0)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.latency:
+            time.sleep(self.latency)
+        if self.rng.random() < self.error_rate:
+            self.send_error(429, "Rate limit reached")
+            return
+
+        payload = json.loads(body)
+        prompt = "\n".join(m.get("content", "") for m in payload.get("messages", []))
+        json_mode = (payload.get("response_format") or {}).get("type") == "json_object"
+        content = respond(prompt, self.rng, json_mode)
+        if content.startswith("{") and self.rng.random() < self.malformed_rate:
+            content = malformed(content, self.rng)
+        # Like the real API, stop at max_tokens (~4 characters per token)
+        finish_reason = "stop"
+        max_chars = payload.get("max_tokens", 4096) * 4
+        if len(content) > max_chars:
+            content, finish_reason = content[:max_chars], "length"
+        if payload.get("stream"):
+            self._stream(content, len(prompt) // 4, finish_reason)
+            return
+        if self.token_rate:
+            time.sleep(len(content) / 4 / self.token_rate)
+        reply = json.dumps(_completion(content, len(prompt) // 4, len(content) // 4, finish_reason)).encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def _stream(self, content, prompt_tokens, finish_reason):
+        """Server-sent events: role, content deltas, finish chunk with usage, [DONE]."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(_stream_chunk({"role": "assistant", "content": ""}))
+        for i in range(0, len(content), STREAM_CHUNK_CHARS):
+            piece = content[i:i + STREAM_CHUNK_CHARS]
+            if self.token_rate:
+                time.sleep(len(piece) / 4 / self.token_rate)
+            self.wfile.write(_stream_chunk({"content": piece}))
+            self.wfile.flush()
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4,
+                 "total_tokens": prompt_tokens + len(content) // 4}
+        self.wfile.write(_stream_chunk({}, finish_reason, usage))
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port=0, latency=0.0, error_rate=0.0, token_rate=0.0, malformed_rate=0.0):
+    """Start the mock in a background thread; returns (server, completions_url)."""
+    handler = type("Handler", (MockGroqHandler,), {"latency": latency, "error_rate": error_rate,
+                                                   "token_rate": token_rate, "malformed_rate": malformed_rate})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/openai/v1/chat/completions"
+    return server, url
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local mock Groq chat completions server")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every reply")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of 429 replies")
+    parser.add_argument("--token-rate", type=float, default=0.0,
+                        help="Completion tokens generated per second (0 = instant)")
+    parser.add_argument("--malformed-rate", type=float, default=0.0,
+                        help="Fraction of JSON replies with fences, trailing commas and quoted numbers")
+    args = parser.parse_args()
+
+    server, url = start_server(args.port, args.latency, args.error_rate, args.token_rate, args.malformed_rate)
+    print(f"Mock Groq listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,637 @@
+#!/usr/bin/env python3
+"""
+AutoEQ Benchmark Suite
+Times the pipeline's hot paths on synthetic libraries and writes a JSON
+report (throughput, p50/p99 latency, peak memory) that can be compared
+across commits.
+
+    python benchmarks/run_benchmarks.py --sizes 1000,10000,100000
+"""
+
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import random
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import requests
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+import cluster_consolidation
+import cluster_tracks
+import dedup
+import fetch_likes
+import scrape_likes_http
+import soundcloud_api_scraper
+import generate_eq_presets
+import groq_cluster
+import json_stream
+import llm_schema
+import preset_service
+import preset_table
+import prompt_packing
+from preset_export import export_bundle
+from rate_limit import TokenBucket
+from track import load_tracks
+from track_gains import save_track_gains
+from synthetic_library import generate_library, library_document
+import mock_groq
+import fake_soundcloud
+
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+# Per-call latency sampling is capped so 1M-track runs stay tractable
+LATENCY_SAMPLE = 20000
+
+# The Groq path sends at most 10 token-budgeted batches (<= 400 tracks each)
+# for discovery; larger libraries only change the keyword classification step
+GROQ_MAX_TRACKS = 10000
+
+# Multi-account fetch: likes per account and worker counts compared
+ACCOUNT_TRACKS = 1000
+ACCOUNT_WORKERS = [1, 2, 4, 8]
+
+# Mock replies parsed by the llm_repair benchmark
+LLM_REPLIES = 1000
+
+# Preset lookup service: requests timed over HTTP (keep-alive, one client)
+LOOKUP_HTTP_REQUESTS = 2000
+
+
+def percentiles(samples_ns):
+    """p50/p99/max of a list of nanosecond samples, in milliseconds."""
+    ordered = sorted(samples_ns)
+    if not ordered:
+        return {}
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] / 1e6
+
+    return {
+        "p50_ms": round(pick(0.50), 4),
+        "p99_ms": round(pick(0.99), 4),
+        "max_ms": round(ordered[-1] / 1e6, 4),
+        "mean_ms": round(statistics.fmean(ordered) / 1e6, 4),
+    }
+
+
+def measure(fn, items, repeat=1):
+    """Run fn repeat times; report throughput (items/s) and per-run latency."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        fn()
+        samples.append(time.perf_counter_ns() - start)
+    best = min(samples)
+    result = {"items": items, "runs": repeat, "throughput_per_s": round(items / (best / 1e9), 1)}
+    result.update(percentiles(samples))
+    return result
+
+
+def peak_memory(fn):
+    """Peak Python heap allocated while running fn (tracemalloc), in bytes."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+# ---------------------------------------------------------------------------
+# Benchmarks: each takes (tracks, workdir, args) and returns a result dict
+# ---------------------------------------------------------------------------
+
+def bench_classify_track(tracks, workdir, args):
+    sample = tracks[:LATENCY_SAMPLE]
+    samples = []
+    for track in sample:
+        start = time.perf_counter_ns()
+        cluster_tracks.classify_track(track)
+        samples.append(time.perf_counter_ns() - start)
+    total_s = sum(samples) / 1e9
+    result = {"items": len(sample), "throughput_per_s": round(len(sample) / total_s, 1)}
+    result.update(percentiles(samples))
+    return result
+
+
+def bench_cluster_tracks(tracks, workdir, args):
+    result = measure(lambda: cluster_tracks.cluster_tracks(tracks), len(tracks), args.repeat)
+    result["peak_memory_bytes"] = peak_memory(lambda: cluster_tracks.cluster_tracks(tracks))
+    return result
+
+
+def _clusters_document(tracks):
+    clusters, stats = cluster_tracks.cluster_tracks(tracks)
+    return {
+        "source": "benchmark",
+        "total_tracks": len(tracks),
+        "cluster_count": len(clusters),
+        "clusters": [
+            {"id": cid, "name": cid, "track_count": len(items),
+             "sample_tracks": stats[cid]["sample_tracks"], "tracks": items}
+            for cid, items in clusters.items()
+        ],
+    }
+
+
+def _preset_details(clusters_doc):
+    return [
+        {
+            "cluster_id": c["id"],
+            "cluster_name": c["name"],
+            "track_count": c["track_count"],
+            "preset_name": generate_eq_presets.EQ_PRESETS[c["id"]]["name"],
+            "description": generate_eq_presets.EQ_PRESETS[c["id"]]["description"],
+            "characteristics": generate_eq_presets.EQ_PRESETS[c["id"]]["characteristics"],
+            "eq_settings": generate_eq_presets.EQ_PRESETS[c["id"]]["bands"],
+            "sample_tracks": c["sample_tracks"][:3],
+        }
+        for c in clusters_doc["clusters"] if c["id"] in generate_eq_presets.EQ_PRESETS
+    ]
+
+
+def bench_json_files(tracks, workdir, args):
+    clusters_doc = _clusters_document(tracks)
+    details = _preset_details(clusters_doc)
+    documents = {
+        "soundcloud_likes.json": library_document(tracks),
+        "track_clusters.json": clusters_doc,
+        "eq_presets_detailed.json": {"presets": details},
+        "eq_presets.json": {"presets": [
+            generate_eq_presets.generate_eqmac_preset(generate_eq_presets.EQ_PRESETS[d["cluster_id"]], d["cluster_id"])
+            for d in details
+        ]},
+    }
+
+    results = {}
+    for name, doc in documents.items():
+        path = Path(workdir) / name
+
+        def dump():
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(doc, f, ensure_ascii=False, indent=2)
+
+        def load():
+            with open(path, "r", encoding="utf-8") as f:
+                json.load(f)
+
+        dump_result = measure(dump, 1, args.repeat)
+        size = path.stat().st_size
+        load_result = measure(load, 1, args.repeat)
+        results[name] = {
+            "bytes": size,
+            "dump": {**dump_result, "mb_per_s": round(size / 1e6 / (dump_result["p50_ms"] / 1e3), 1)},
+            "load": {**load_result, "mb_per_s": round(size / 1e6 / (load_result["p50_ms"] / 1e3), 1)},
+            "load_peak_memory_bytes": peak_memory(load),
+        }
+    return results
+
+
+def bench_preset_generation(tracks, workdir, args):
+    clusters_doc = _clusters_document(tracks)
+    details = _preset_details(clusters_doc)
+    classified = [t for c in clusters_doc["clusters"] for t in c["tracks"]]
+    bands = {cid: p["bands"] for cid, p in generate_eq_presets.EQ_PRESETS.items()}
+
+    return {
+        "eqmac": measure(lambda: [generate_eq_presets.generate_eqmac_preset(generate_eq_presets.EQ_PRESETS[d["cluster_id"]], d["cluster_id"]) for d in details],
+                         len(details), args.repeat),
+        "export_bundle": measure(lambda: export_bundle(details, workdir), len(details), args.repeat),
+        "track_gains": {
+            **measure(lambda: save_track_gains(classified, bands, generate_eq_presets.EQ_BANDS, workdir),
+                      len(classified), args.repeat),
+            "peak_memory_bytes": peak_memory(
+                lambda: save_track_gains(classified, bands, generate_eq_presets.EQ_BANDS, workdir)),
+        },
+    }
+
+
+def bench_groq_path(tracks, workdir, args):
+    server, url = mock_groq.start_server(latency=args.groq_latency)
+    os.environ.setdefault("GROQ_API_KEY", "benchmark")
+    groq_cluster.GROQ_API_URL = url
+    # Fresh response cache, or repeated runs would measure cache hits
+    groq_cluster.GROQ_CACHE_DIR = os.path.join(workdir, "groq_cache")
+    subset = tracks[:GROQ_MAX_TRACKS]
+    try:
+        result = measure(lambda: groq_cluster.dynamic_cluster_tracks(subset, workdir), len(subset), 1)
+    finally:
+        server.shutdown()
+    result["mock_latency_s"] = args.groq_latency
+    return result
+
+
+def bench_fetchers(tracks, workdir, args):
+    server, base_url, state = fake_soundcloud.start_server(tracks, latency=args.fetch_latency)
+    for module in (fetch_likes, soundcloud_api_scraper, scrape_likes_http):
+        module.SOUNDCLOUD_URL = base_url
+    fetch_likes.API_V2 = soundcloud_api_scraper.BASE_API = scrape_likes_http.API_V2 = base_url
+
+    def run(fn):
+        before = state.requests
+        start = time.perf_counter_ns()
+        fetched = fn()
+        elapsed = (time.perf_counter_ns() - start) / 1e9
+        return {
+            "tracks": len(fetched),
+            "requests": state.requests - before,
+            "seconds": round(elapsed, 3),
+            "throughput_per_s": round(len(fetched) / elapsed, 1) if elapsed else None,
+        }
+
+    try:
+        client_id = fetch_likes.get_client_id()
+        html = requests.get(f"{base_url}/{fake_soundcloud.USERNAME}/likes").text
+        return {
+            "likes": len(tracks),
+            "latency_s": args.fetch_latency,
+            "fetch_likes": run(lambda: fetch_likes.fetch_likes(
+                fake_soundcloud.USER_ID, client_id, max_tracks=len(tracks))),
+            "soundcloud_api_scraper": run(lambda: soundcloud_api_scraper.get_user_likes(
+                fake_soundcloud.USER_ID, client_id)),
+            "hydration_extract": measure(lambda: scrape_likes_http.scan_page(html), 1, args.repeat),
+        }
+    finally:
+        server.shutdown()
+
+
+def bench_accounts(tracks, workdir, args):
+    """Fetch stage for many accounts at increasing worker counts, one shared rate limit."""
+    library = tracks[:ACCOUNT_TRACKS]
+    server, base_url, state = fake_soundcloud.start_server(
+        library, latency=args.fetch_latency, accounts=args.accounts)
+    fetch_likes.SOUNDCLOUD_URL = fetch_likes.API_V2 = base_url
+    shared_limiter = fetch_likes.SOUNDCLOUD_LIMITER
+    usernames = sorted(state.accounts)
+    result = {
+        "accounts": len(usernames),
+        "tracks_per_account": len(library),
+        "latency_s": args.fetch_latency,
+        "rate_limit": args.accounts_rate_limit,
+    }
+
+    def fetch(username):
+        out_dir = os.path.join(workdir, "users", username)
+        return fetch_likes.fetch_all_likes(username, len(library), out_dir)["track_count"]
+
+    try:
+        for workers in ACCOUNT_WORKERS:
+            fetch_likes.SOUNDCLOUD_LIMITER = TokenBucket(args.accounts_rate_limit, fetch_likes.MAX_CONCURRENCY)
+            before = state.requests
+            start = time.perf_counter_ns()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                fetched = list(pool.map(fetch, usernames))
+            elapsed = (time.perf_counter_ns() - start) / 1e9
+            result[f"workers_{workers}"] = {
+                "tracks": sum(fetched),
+                "requests": state.requests - before,
+                "seconds": round(elapsed, 3),
+                "accounts_per_s": round(len(usernames) / elapsed, 2),
+            }
+    finally:
+        fetch_likes.SOUNDCLOUD_LIMITER = shared_limiter
+        server.shutdown()
+    return result
+
+
+def bench_preset_lookup(tracks, workdir, args):
+    """Preset service: index build, in-process lookup and HTTP round-trip latency."""
+    clusters_doc = _clusters_document(tracks)
+    with open(Path(workdir) / "track_clusters.json", "w", encoding="utf-8") as f:
+        json.dump(clusters_doc, f, ensure_ascii=False)
+    with open(Path(workdir) / "eq_presets_detailed.json", "w", encoding="utf-8") as f:
+        json.dump({"presets": _preset_details(clusters_doc)}, f, ensure_ascii=False)
+
+    store = preset_service.IndexStore(workdir)
+    result = {"index_build": measure(lambda: preset_service.PresetIndex(workdir), len(tracks), args.repeat),
+              "index_peak_memory_bytes": peak_memory(lambda: preset_service.PresetIndex(workdir))}
+    store.get()
+
+    targets = [f"/api/eq?track_id={t['track_id']}" for t in tracks[:LATENCY_SAMPLE]]
+    samples = []
+    for target in targets:
+        start = time.perf_counter_ns()
+        preset_service.respond(store, "GET", target, {})
+        samples.append(time.perf_counter_ns() - start)
+    result["lookup"] = {"items": len(samples), **percentiles(samples)}
+
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(asyncio.start_server(
+        lambda r, w: preset_service.handle_connection(store, r, w), "127.0.0.1", 0))
+    port = server.sockets[0].getsockname()[1]
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        samples = []
+        for target in targets[:LOOKUP_HTTP_REQUESTS]:
+            start = time.perf_counter_ns()
+            conn.request("GET", target)
+            conn.getresponse().read()
+            samples.append(time.perf_counter_ns() - start)
+        result["http"] = {"items": len(samples), **percentiles(samples)}
+        # Let the server end the connection so its handler finishes
+        conn.request("GET", "/api/health", headers={"Connection": "close"})
+        conn.getresponse().read()
+        conn.close()
+    finally:
+        async def shutdown():
+            server.close()
+            await server.wait_closed()
+            pending = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            if pending:
+                await asyncio.wait(pending, timeout=1)
+
+        asyncio.run_coroutine_threadsafe(shutdown(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+    return result
+
+
+def bench_preset_table(tracks, workdir, args):
+    """Binary preset table vs track_clusters.json: size, open time, lookup latency."""
+    clusters_doc = _clusters_document(tracks)
+    presets = {cid: [p["bands"][f] for f in generate_eq_presets.EQ_BANDS]
+               for cid, p in generate_eq_presets.EQ_PRESETS.items()}
+    json_path = Path(workdir) / "track_clusters.json"
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(clusters_doc, f, ensure_ascii=False)
+
+    build = measure(lambda: preset_table.build_table(clusters_doc, presets, workdir), len(tracks), args.repeat)
+    path = Path(workdir) / preset_table.TABLE_FILE
+    size = path.stat().st_size
+
+    def open_json():
+        with open(json_path, "r", encoding="utf-8") as f:
+            json.load(f)
+
+    def open_table():
+        preset_table.PresetTable(path).close()
+
+    table = preset_table.PresetTable(path)
+    sample = tracks[:LATENCY_SAMPLE]
+    id_samples, url_samples = [], []
+    for track in sample:
+        start = time.perf_counter_ns()
+        row = table.find_id(track["track_id"])
+        table.preset_of(row)
+        table.gains_of(row)
+        id_samples.append(time.perf_counter_ns() - start)
+        start = time.perf_counter_ns()
+        table.find_url(track["url"])
+        url_samples.append(time.perf_counter_ns() - start)
+    table.close()
+
+    return {
+        "build": build,
+        "bytes": size,
+        "bytes_per_1k_tracks": round(size / len(tracks) * 1000),
+        "json_bytes": json_path.stat().st_size,
+        "open": measure(open_table, 1, max(args.repeat, 100)),
+        "json_open": measure(open_json, 1, args.repeat),
+        "lookup_id": {"items": len(id_samples), **percentiles(id_samples)},
+        "lookup_url": {"items": len(url_samples), **percentiles(url_samples)},
+    }
+
+
+def bench_dedup(tracks, workdir, args):
+    """MinHash/LSH near-duplicate grouping (use --duplicate-rate for a library with re-uploads)."""
+    table = load_tracks(tracks)
+    result = measure(lambda: dedup.find_groups(table), len(table), args.repeat)
+    groups = dedup.find_groups(table)
+    result["groups"] = len(groups)
+    result["duplicates"] = sum(len(g) - 1 for g in groups)
+    result["peak_memory_bytes"] = peak_memory(lambda: dedup.find_groups(table))
+    return result
+
+
+def bench_prompt_packing(tracks, workdir, args):
+    """Discovery prompt size: indented JSON (previous encoding) vs packed rows."""
+    sample = tracks[:prompt_packing.MAX_BATCH_TRACKS]
+    legacy = json.dumps([
+        {
+            "title": t.get("title", "")[:100],
+            "artist": t.get("artist", "")[:50],
+            "genre": t.get("genre", ""),
+            "tags": t.get("tags", [])[:5] if isinstance(t.get("tags"), list) else [],
+        }
+        for t in sample
+    ], ensure_ascii=False, indent=2)
+    packed = prompt_packing.pack_tracks(sample)
+    legacy_tokens = prompt_packing.estimate_tokens(legacy)
+    packed_tokens = prompt_packing.estimate_tokens(packed)
+
+    sizer = prompt_packing.BatchSizer()
+    overhead = prompt_packing.estimate_tokens(groq_cluster.DISCOVERY_SYSTEM_PROMPT) + \
+        prompt_packing.estimate_tokens(groq_cluster.discovery_prompt([]))
+    result = measure(lambda: prompt_packing.pack_tracks(sample), len(sample), args.repeat)
+    result.update({
+        "legacy_tokens_per_track": round(legacy_tokens / len(sample), 1),
+        "packed_tokens_per_track": round(packed_tokens / len(sample), 1),
+        "token_reduction": round(1 - packed_tokens / legacy_tokens, 3),
+        "tracks_per_call": sizer.take(tracks, 0, overhead),
+        "budget_tokens": sizer.budget,
+    })
+    return result
+
+
+def bench_groq_stream(tracks, workdir, args):
+    """Discovery call: time to first cluster, streamed vs whole reply, and truncated replies."""
+    server, url = mock_groq.start_server(latency=args.groq_latency, token_rate=args.groq_token_rate)
+    os.environ.setdefault("GROQ_API_KEY", "benchmark")
+    groq_cluster.GROQ_API_URL = url
+    batch = tracks[:prompt_packing.MIN_BATCH_TRACKS * 5]
+    result = {"mock_latency_s": args.groq_latency, "token_rate": args.groq_token_rate}
+    saved_stream = groq_cluster.GROQ_STREAM
+    try:
+        for mode, streaming in (("whole", False), ("stream", True)):
+            groq_cluster.GROQ_STREAM = streaming
+            first, total, clusters = [], [], 0
+            for i in range(args.repeat):
+                # Fresh cache per call, or every call after the first is a cache hit
+                groq_cluster.GROQ_CACHE_DIR = os.path.join(workdir, f"groq_cache_{mode}_{i}")
+                arrivals = []
+                start = time.perf_counter_ns()
+                found = groq_cluster.analyze_track_batch(
+                    batch, i, on_cluster=lambda c: arrivals.append(time.perf_counter_ns()))
+                total.append(time.perf_counter_ns() - start)
+                first.append((arrivals[0] if arrivals else time.perf_counter_ns()) - start)
+                clusters += len(found["identified_clusters"])
+            result[mode] = {"first_cluster": percentiles(first), "complete": percentiles(total),
+                            "clusters": clusters}
+
+        # Replies cut off at max_tokens: clusters kept from the valid prefix
+        groq_cluster.GROQ_CACHE_DIR = os.path.join(workdir, "groq_cache_truncated")
+        kept = []
+        for max_tokens in (100, 200, 300):
+            prompt = groq_cluster.discovery_prompt(batch)
+            text = "".join(groq_cluster.stream_groq(prompt, groq_cluster.DISCOVERY_SYSTEM_PROMPT, max_tokens))
+            items, complete = json_stream.parse_items(text, "identified_clusters")
+            kept.append({"max_tokens": max_tokens, "clusters_kept": len(items), "complete": complete})
+        result["truncated"] = kept
+    finally:
+        groq_cluster.GROQ_STREAM = saved_stream
+        server.shutdown()
+    return result
+
+
+def bench_cluster_consolidation(tracks, workdir, args):
+    """Similarity consolidation of discovered clusters (mock replies with aliased ids).
+
+    false_merges counts merged clusters combining different canned clusters;
+    distinct_pairs_merged counts mock_groq.DISTINCT_CLUSTER_PAIRS that merged.
+    """
+    rng = random.Random(args.seed)
+    canonical = {alias: cid for cid, aliases in mock_groq.CLUSTER_ALIASES.items()
+                 for alias, _ in [(cid, None)] + aliases}
+    result = {"distinct_pairs_merged": sum(
+        len(cluster_consolidation.consolidate_clusters(list(pair))) < 2
+        for pair in mock_groq.DISTINCT_CLUSTER_PAIRS)}
+    for candidates in (50, 200, 800):
+        clusters = []
+        while len(clusters) < candidates:
+            reply = json.loads(mock_groq.respond("identified_clusters", rng))
+            clusters.extend(reply["identified_clusters"])
+        clusters = clusters[:candidates]
+        distinct_ids = len({c["cluster_id"] for c in clusters})
+        timing = measure(lambda: cluster_consolidation.consolidate_clusters(clusters), len(clusters), args.repeat)
+        merged = cluster_consolidation.consolidate_clusters(clusters)
+        false_merges = sum(len({canonical[cid] for cid in c.get("merged_from", [])}) > 1 for c in merged)
+        result[str(candidates)] = {**timing, "distinct_ids": distinct_ids, "clusters": len(merged),
+                                   "false_merges": false_merges}
+    return result
+
+
+def bench_llm_repair(tracks, workdir, args):
+    """Near-valid mock replies (fences, trailing commas, quoted numbers): plain json.loads vs repair + schema."""
+    rng = random.Random(args.seed)
+    kinds = ("identified_clusters", '"eq_settings"')
+    replies = [mock_groq.malformed(mock_groq.respond(kinds[i % 2], rng), rng) for i in range(LLM_REPLIES)]
+    cluster = {"name": "Benchmark"}
+
+    def plain(text):
+        try:
+            json.loads(text.split("```json")[1].split("```")[0] if "```json" in text else text)
+            return True
+        except ValueError:
+            return False
+
+    def repaired(text):
+        if "identified_clusters" in text:
+            items, complete = json_stream.parse_items(
+                text, "identified_clusters",
+                lambda t: groq_cluster.DISCOVERED_CLUSTER(llm_schema.loads_repaired(t)))
+            return complete and bool(items)
+        try:
+            return groq_cluster.validate_eq_preset(llm_schema.parse_reply(text), cluster) is not None
+        except ValueError:
+            return False
+
+    result = measure(lambda: [repaired(r) for r in replies], len(replies), args.repeat)
+    result["plain_parsed"] = round(sum(map(plain, replies)) / len(replies), 3)
+    result["repaired_valid"] = round(sum(map(repaired, replies)) / len(replies), 3)
+    return result
+
+
+BENCHMARKS = {
+    "classify_track": bench_classify_track,
+    "cluster_tracks": bench_cluster_tracks,
+    "json_files": bench_json_files,
+    "preset_generation": bench_preset_generation,
+    "groq_path": bench_groq_path,
+    "fetchers": bench_fetchers,
+    "accounts": bench_accounts,
+    "preset_lookup": bench_preset_lookup,
+    "preset_table": bench_preset_table,
+    "dedup": bench_dedup,
+    "prompt_packing": bench_prompt_packing,
+    "groq_stream": bench_groq_stream,
+    "cluster_consolidation": bench_cluster_consolidation,
+    "llm_repair": bench_llm_repair,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AutoEQ benchmark suite")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="Comma-separated library sizes (e.g. 1000,10000,1000000)")
+    parser.add_argument("--only", default=",".join(BENCHMARKS),
+                        help="Comma-separated benchmarks to run")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--duplicate-rate", type=float, default=0.0,
+                        help="Fraction of synthetic tracks that are re-uploads/versions of earlier ones")
+    parser.add_argument("--groq-latency", type=float, default=0.0,
+                        help="Seconds of simulated latency per mock Groq call")
+    parser.add_argument("--groq-token-rate", type=float, default=250.0,
+                        help="Mock Groq completion tokens per second (groq_stream benchmark)")
+    parser.add_argument("--fetch-latency", type=float, default=0.0,
+                        help="Seconds of simulated latency per fake SoundCloud response")
+    parser.add_argument("--accounts", type=int, default=16,
+                        help="Accounts fetched by the multi-account benchmark")
+    parser.add_argument("--accounts-rate-limit", type=float, default=50.0,
+                        help="Shared SoundCloud requests/s in the multi-account benchmark")
+    parser.add_argument("--output", help="Report path (default benchmarks/results/<time>_<commit>.json)")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    selected = [b for b in args.only.split(",") if b]
+
+    report = {
+        "commit": git_commit(),
+        "started_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "results": {},
+    }
+
+    for size in sizes:
+        print(f"\n=== {size} tracks ===")
+        tracks = generate_library(size, args.seed, args.duplicate_rate)
+        report["results"][str(size)] = {}
+
+        for name in selected:
+            print(f"  {name}...", flush=True)
+            with tempfile.TemporaryDirectory() as workdir:
+                result = BENCHMARKS[name](tracks, workdir, args)
+            report["results"][str(size)][name] = result
+            if "throughput_per_s" in result:
+                print(f"    {result['throughput_per_s']:,.1f} items/s, p50 {result.get('p50_ms')} ms, p99 {result.get('p99_ms')} ms")
+
+    output = Path(args.output) if args.output else (
+        RESULTS_DIR / f"{datetime.now():%Y%m%d_%H%M%S}_{report['commit'] or 'nogit'}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved to: {output}")
+
+
+if __name__ == "__main__":
+    main()
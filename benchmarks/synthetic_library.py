@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Synthetic Likes Library Generator
+Produces realistic soundcloud_likes.json-shaped libraries (1k to 1M tracks)
+for benchmarks: mixed Arabic/Latin titles, skewed artist and tag
+distributions, long descriptions and log-normal durations.
+"""
+
+import argparse
+import json
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ARABIC_WORDS = [
+    "يا", "حبيبي", "الله", "ليل", "قلبي", "عيون", "سلام", "نور", "حضرة", "ذكر",
+    "صوفي", "مدد", "طرب", "عود", "شوق", "الدنيا", "رسول", "مولد", "إنشاد", "حب",
+    "أنا", "وانت", "بحر", "سماع", "الهوى", "زمان", "غربة", "فرح", "ليالي", "مصر",
+]
+LATIN_WORDS = [
+    "night", "love", "deep", "house", "remix", "live", "session", "dream", "sufi",
+    "oud", "soul", "desert", "journey", "mix", "dub", "edit", "original", "light",
+    "ocean", "piano", "trance", "spirit", "echo", "rain", "sunset", "tribal", "beat",
+    "ambient", "orchestra", "groove", "moon", "fire", "dance", "version", "acoustic",
+]
+TITLE_SUFFIXES = [
+    "", "", "", "", " (Live)", " (Remix)", " (Original Mix)", " [Extended]",
+    " - Radio Edit", " (Acoustic Version)", " | مباشر", " (Official Audio)",
+]
+GENRES = [
+    ("Arabic", 20), ("Sufi", 12), ("Electronic", 14), ("Deep House", 10),
+    ("World", 8), ("Classical", 6), ("Ambient", 6), ("Hip-hop & Rap", 5),
+    ("Pop", 8), ("Rock", 4), ("طرب", 4), ("", 15),
+]
+TAGS = [
+    "sufi", "dhikr", "arabic", "oud", "tarab", "deep house", "organic house",
+    "downtempo", "world", "ethnic", "melodic techno", "chill", "ambient",
+    "ذكر", "صوفي", "إنشاد", "live", "remix", "egypt", "lebanon", "nasheed",
+    "trance", "oriental", "qanun", "ney", "meditation", "hip hop", "trap",
+]
+DESCRIPTION_SENTENCES = [
+    "Recorded live at the annual festival with the full ensemble.",
+    "Available on all platforms, link in bio.",
+    "تسجيل حي من الحضرة الصوفية في القاهرة.",
+    "Free download for a limited time, support the artist.",
+    "Mastered at Studio 7, mixed by the artist.",
+    "كلمات والحان الشيخ، توزيع موسيقي جديد.",
+    "Follow for more sets every week.",
+    "Taken from the upcoming album out next month.",
+    "This track blends traditional maqam with modern production.",
+    "All rights reserved to the original owners, no copyright infringement intended.",
+]
+
+
+def _weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights=weights, k=1)[0]
+
+
+def _base_title(rng):
+    arabic = rng.random() < 0.45
+    words = ARABIC_WORDS if arabic else LATIN_WORDS
+    title = " ".join(rng.choice(words) for _ in range(rng.randint(1, 5)))
+    return title if arabic else title.title()
+
+
+def _tag_list(rng):
+    # Zipf-like: early tags are far more common
+    count = min(len(TAGS), int(rng.paretovariate(1.5)))
+    tags = {TAGS[min(int(rng.paretovariate(1.1)) - 1, len(TAGS) - 1)] for _ in range(count)}
+    return " ".join(f'"{t}"' if " " in t else t for t in sorted(tags))
+
+
+def _description(rng):
+    if rng.random() < 0.3:
+        return ""
+    sentences = [rng.choice(DESCRIPTION_SENTENCES) for _ in range(rng.randint(1, 12))]
+    return " ".join(sentences)[:500]
+
+
+def format_duration(ms):
+    seconds = ms // 1000
+    minutes, secs = divmod(seconds, 60)
+    if minutes >= 60:
+        return f"{minutes // 60}:{minutes % 60:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
+
+
+def generate_library(n, seed=42, duplicate_rate=0.0):
+    """Generate n synthetic liked tracks (same fields as fetch_likes output).
+
+    With duplicate_rate > 0, that fraction of tracks are other versions of an
+    earlier track: same title with another suffix, by the same artist or
+    re-uploaded by another one as "Artist - Title".
+    """
+    rng = random.Random(seed)
+    artist_count = max(10, n // 8)
+    artists = [
+        (rng.choice(ARABIC_WORDS) + " " + rng.choice(ARABIC_WORDS)) if rng.random() < 0.4
+        else f"{rng.choice(LATIN_WORDS).title()} {rng.choice(LATIN_WORDS).title()} {i}"
+        for i in range(artist_count)
+    ]
+    base_time = datetime(2015, 1, 1)
+
+    # Zipf-distributed artist popularity
+    cum_weights = []
+    total = 0.0
+    for rank in range(artist_count):
+        total += 1.0 / (rank + 1)
+        cum_weights.append(total)
+    artist_picks = rng.choices(range(artist_count), cum_weights=cum_weights, k=n)
+
+    tracks = []
+    originals = []
+    for i in range(n):
+        artist_idx = artist_picks[i]
+        artist = artists[artist_idx]
+        duration_ms = int(min(rng.lognormvariate(12.5, 0.6), 4 * 3600 * 1000))
+        created = base_time + timedelta(seconds=rng.randint(0, 10 * 365 * 86400))
+        slug = f"track-{i}"
+
+        title = _base_title(rng)
+        if duplicate_rate and originals and rng.random() < duplicate_rate:
+            original_idx, title = originals[rng.randrange(len(originals))]
+            if rng.random() < 0.5:
+                artist_idx, artist = original_idx, artists[original_idx]
+            else:
+                title = f"{artists[original_idx]} - {title}"
+        else:
+            originals.append((artist_idx, title))
+
+        tracks.append({
+            "title": title + rng.choice(TITLE_SUFFIXES),
+            "artist": artist,
+            "artist_id": 100000 + artist_idx,
+            "url": f"https://soundcloud.com/artist-{artist_idx}/{slug}",
+            "duration_ms": duration_ms,
+            "duration": format_duration(duration_ms),
+            "plays": int(rng.paretovariate(1.2) * 100),
+            "likes": int(rng.paretovariate(1.3) * 10),
+            "reposts": rng.randint(0, 500),
+            "comments": rng.randint(0, 200),
+            "genre": _weighted(rng, GENRES),
+            "tag_list": _tag_list(rng),
+            "description": _description(rng),
+            "created_at": created.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "artwork_url": f"https://i1.sndcdn.com/artworks-{i:012d}-large.jpg",
+            "waveform_url": f"https://wave.sndcdn.com/{i:012d}_m.png",
+            "track_id": 1000000000 + i,
+            "liked_at": (created + timedelta(days=rng.randint(0, 365))).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        })
+    return tracks
+
+
+def library_document(tracks, username="benchmark-user"):
+    """Wrap tracks in the soundcloud_likes.json document shape."""
+    return {
+        "source": f"https://soundcloud.com/{username}/likes",
+        "user_id": 1,
+        "username": username,
+        "track_count": len(tracks),
+        "scraped_at": datetime.now().isoformat(),
+        "tracks": tracks,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic SoundCloud likes library")
+    parser.add_argument("--tracks", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--duplicate-rate", type=float, default=0.0,
+                        help="Fraction of tracks that are re-uploads/versions of earlier ones")
+    parser.add_argument("--output", default="soundcloud_likes.json")
+    args = parser.parse_args()
+
+    tracks = generate_library(args.tracks, args.seed, args.duplicate_rate)
+    output = Path(args.output)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(library_document(tracks), f, ensure_ascii=False, indent=2)
+    print(f"Wrote {len(tracks)} tracks to {output}")
+
+
+if __name__ == "__main__":
+    main()
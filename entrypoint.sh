@@ -10,15 +10,39 @@ if [ -z "$GROQ_API_KEY" ]; then
     echo "WARNING: GROQ_API_KEY not set. AI clustering will fail."
 fi
 
-# Run initial update if data is empty
+# Queue an initial update if data is empty (the workers pick it up first)
 if [ ! -f /app/data/soundcloud_likes.json ] || [ ! -s /app/data/soundcloud_likes.json ]; then
-    echo "No data found. Running initial fetch..."
-    python3 /app/src/daily_update.py || echo "Initial update failed, will retry on schedule"
+    echo "No data found. Queueing initial fetch..."
+    python3 /app/src/job_queue.py enqueue amr-farouk-10 || echo "Could not queue initial update"
 fi
 
-# Start cron daemon
-echo "Starting cron daemon..."
-cron
+# Optional HTTP broker so workers on other nodes can share this queue
+# (workers must send the same AUTOEQ_BROKER_TOKEN)
+if [ -n "$AUTOEQ_BROKER_PORT" ]; then
+    if [ -z "$AUTOEQ_BROKER_TOKEN" ]; then
+        echo "WARNING: AUTOEQ_BROKER_TOKEN not set. Job queue broker not started."
+    else
+        echo "Starting job queue broker on port $AUTOEQ_BROKER_PORT..."
+        python3 /app/src/job_queue.py serve --host "${AUTOEQ_BROKER_HOST:-0.0.0.0}" --port "$AUTOEQ_BROKER_PORT" \
+            >> /app/logs/broker.log 2>&1 &
+    fi
+fi
+
+# Preset lookup API behind nginx (restarted if it exits)
+echo "Starting preset service..."
+(while true; do
+    python3 /app/src/preset_service.py --port 8792 >> /app/logs/preset_service.log 2>&1
+    sleep 5
+done) &
+
+# Start pipeline workers (restarted if they exit); each also schedules daily runs
+for i in $(seq 1 "${AUTOEQ_WORKER_PROCESSES:-1}"); do
+    echo "Starting worker $i..."
+    (while true; do
+        python3 /app/src/worker.py --schedule >> "/app/logs/worker_$i.log" 2>&1
+        sleep 10
+    done) &
+done
 
 # Start nginx in foreground
 echo "Starting nginx..."
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Accounts
+Multi-account mode: which SoundCloud accounts to process and where each
+account's files live (data/users/<username>/, data/ itself for the default
+account). Caches that don't depend on the account (client_id, Groq
+responses, track metadata) stay in data/.
+"""
+
+import os
+import re
+
+from fetch_likes import DEFAULT_USERNAME
+
+USERS_SUBDIR = "users"
+
+# SoundCloud permalinks; also keeps usernames safe as directory names
+USERNAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+def validate_username(username):
+    """Return the username, or raise if it can't be an account permalink."""
+    if not USERNAME_PATTERN.match(username or ""):
+        raise Exception(f"Invalid SoundCloud username: {username!r}")
+    return username
+
+
+def user_data_dir(data_dir, username):
+    """Data namespace of one account (the default account keeps data/ itself)."""
+    if username == DEFAULT_USERNAME:
+        return data_dir
+    return os.path.join(data_dir, USERS_SUBDIR, validate_username(username))
+
+
+def parse_usernames(value):
+    """Usernames from a comma/whitespace separated string, in order, without repeats."""
+    usernames = []
+    for name in re.split(r'[\s,]+', value or ""):
+        if name and name not in usernames:
+            usernames.append(validate_username(name))
+    return usernames
+
+
+def load_usernames(path):
+    """Usernames from a file, one per line ('#' starts a comment)."""
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_usernames(" ".join(line.split("#", 1)[0] for line in f))
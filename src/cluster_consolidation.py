@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Cluster Consolidation
+Merges near-identical clusters discovered in different Groq batches
+("sufi_music", "sufi_devotional", "spiritual_sufi") so each piece of music
+gets one cluster and one EQ preset. Every pair of candidates is scored on
+id/name token Jaccard, keyword-set Jaccard and audio_characteristics
+agreement, all computed as matrix products over the whole candidate set,
+and pairs above the threshold are merged with union-find. A pair needs
+similar names or keywords to merge at all: audio characteristics only have
+a few values, so unrelated clusters (arabic_pop / western_pop) often agree.
+"""
+
+import numpy as np
+
+from instrumentation import incr, span
+from text_normalize import normalize, tokens
+
+# Score = weighted sum of the three similarities (weights sum to 1)
+NAME_WEIGHT = 0.4
+KEYWORD_WEIGHT = 0.4
+AUDIO_WEIGHT = 0.2
+MERGE_THRESHOLD = 0.4
+# Evidence a pair must have besides its score (either one is enough)
+MIN_NAME_SIMILARITY = 0.5
+MIN_KEYWORD_SIMILARITY = 0.5
+
+AUDIO_KEYS = ("bass_emphasis", "vocal_presence", "energy_level")
+
+# Words that say nothing about which cluster a name describes
+NAME_STOPWORDS = {"music", "songs", "tracks", "style", "and", "the", "of", "vibes", "موسيقي", "اغاني"}
+
+
+def name_tokens(cluster):
+    """Normalized tokens of a cluster's id and name."""
+    text = f"{cluster.get('cluster_id', '')} {cluster.get('name', '')}".replace("_", " ")
+    words = set(tokens(text))
+    return (words - NAME_STOPWORDS) or words
+
+
+def keyword_set(cluster):
+    keywords = cluster.get("keywords")
+    if not isinstance(keywords, list):
+        return set()
+    return {k for k in (normalize(keyword) for keyword in keywords) if k}
+
+
+def _incidence(sets):
+    """(sets x vocabulary) 0/1 float32 matrix of a list of sets."""
+    vocabulary = {}
+    coords = [(i, vocabulary.setdefault(item, len(vocabulary))) for i, s in enumerate(sets) for item in s]
+    matrix = np.zeros((len(sets), max(len(vocabulary), 1)), dtype=np.float32)
+    if coords:
+        rows, cols = zip(*coords)
+        matrix[list(rows), list(cols)] = 1
+    return matrix
+
+
+def jaccard_matrix(sets):
+    """Pairwise Jaccard similarity of a list of sets (0 where both are empty)."""
+    matrix = _incidence(sets)
+    intersection = matrix @ matrix.T
+    sizes = matrix.sum(axis=1)
+    union = sizes[:, None] + sizes[None, :] - intersection
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(union > 0, intersection / union, 0.0)
+
+
+def audio_agreement(clusters):
+    """Pairwise fraction of AUDIO_KEYS on which two clusters give the same value."""
+    agreement = np.zeros((len(clusters), len(clusters)), dtype=np.float32)
+    for key in AUDIO_KEYS:
+        values = {}
+        codes = np.array([
+            values.setdefault(str(v).lower(), len(values)) if v else -1
+            for v in ((c.get("audio_characteristics") or {}).get(key) for c in clusters)
+        ])
+        agreement += (codes[:, None] == codes[None, :]) & (codes[:, None] >= 0)
+    return agreement / len(AUDIO_KEYS)
+
+
+def similarity_matrix(clusters):
+    """Symmetric matrix of pairwise merge scores of candidate clusters
+    (0 for pairs whose names and keywords are both too different)."""
+    names = jaccard_matrix([name_tokens(c) for c in clusters])
+    keywords = jaccard_matrix([keyword_set(c) for c in clusters])
+    scores = NAME_WEIGHT * names + KEYWORD_WEIGHT * keywords + AUDIO_WEIGHT * audio_agreement(clusters)
+    evidence = (names >= MIN_NAME_SIMILARITY) | (keywords >= MIN_KEYWORD_SIMILARITY)
+    return np.where(evidence, scores, 0.0)
+
+
+def _merge(members):
+    """One cluster from a group: the first member's identity, the union of
+    keywords and the most common value of each audio characteristic."""
+    merged = dict(members[0])
+    keywords = []
+    for cluster in members:
+        for keyword in cluster.get("keywords") or []:
+            if keyword not in keywords:
+                keywords.append(keyword)
+    merged["keywords"] = keywords
+
+    audio = {}
+    for key in AUDIO_KEYS:
+        votes = {}
+        for cluster in members:
+            value = (cluster.get("audio_characteristics") or {}).get(key)
+            if value:
+                votes[value] = votes.get(value, 0) + 1
+        if votes:
+            audio[key] = max(votes, key=votes.get)
+    merged["audio_characteristics"] = {**(members[0].get("audio_characteristics") or {}), **audio}
+    # Batch-relative indices mean nothing once batches are combined
+    merged.pop("matching_track_indices", None)
+    merged["merged_from"] = [c.get("cluster_id") for c in members]
+    return merged
+
+
+def consolidate_clusters(clusters, threshold=MERGE_THRESHOLD):
+    """Merge candidates whose score reaches `threshold` (transitively).
+
+    Returns the consolidated list in order of first appearance; merged
+    clusters list their source ids in "merged_from".
+    """
+    if len(clusters) < 2:
+        return list(clusters)
+
+    with span("clusters.consolidate"):
+        scores = similarity_matrix(clusters)
+        a, b = np.nonzero(np.triu(scores >= threshold, k=1))
+
+        parent = list(range(len(clusters)))
+
+        def root(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for i, j in zip(a.tolist(), b.tolist()):
+            ri, rj = root(i), root(j)
+            if ri != rj:
+                # The earliest candidate names the group
+                parent[max(ri, rj)] = min(ri, rj)
+
+        groups = {}
+        for i in range(len(clusters)):
+            groups.setdefault(root(i), []).append(clusters[i])
+        consolidated = [_merge(members) if len(members) > 1 else members[0] for members in groups.values()]
+
+    incr("clusters.merged", len(clusters) - len(consolidated))
+    return consolidated
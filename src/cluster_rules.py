@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Cluster Rules
+Loads cluster definitions and EQ presets from config/cluster_rules.json and
+compiles them into matcher structures (normalized keywords, boost tables).
+The compiled form is cached on disk by rules-file hash and reloaded when the
+file changes.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+from text_normalize import normalize
+
+RULES_FILE = Path(os.environ.get(
+    "AUTOEQ_RULES_FILE", Path(__file__).parent.parent / "config" / "cluster_rules.json"))
+CACHE_DIR = Path(__file__).parent.parent / "data" / "rules_cache"
+
+# Bump when compile_rules() output changes shape or meaning, to invalidate
+# cached forms and re-score tracks classified under the old output
+COMPILED_FORMAT = 2
+
+# Rule keys that affect classification (a preset edit doesn't re-classify)
+MATCH_KEYS = ("keywords", "weight", "arabic_boost", "duration_boosts")
+
+_lock = threading.Lock()
+_current = {"path": None, "mtime": None, "rules": None}
+
+
+def file_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def rule_hash(rule):
+    """Hash of the parts of one cluster rule that affect its scores."""
+    match = {k: rule.get(k) for k in MATCH_KEYS}
+    match["format"] = COMPILED_FORMAT
+    return hashlib.sha256(json.dumps(match, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+def compile_keywords(keywords):
+    """Normalize keywords the same way track text is normalized (empty ones
+    dropped, and ones that normalize alike, e.g. "hip hop" / "hip-hop", kept once)."""
+    return list(dict.fromkeys(kw for kw in (normalize(k) for k in keywords) if kw))
+
+
+def _compile_preset(preset):
+    return {
+        "name": preset["name"],
+        "description": preset.get("description", ""),
+        "bands": {str(freq): gain for freq, gain in preset["bands"].items()},
+        "characteristics": preset.get("characteristics", []),
+    }
+
+
+def compile_rules(raw, digest):
+    """Compile a parsed rules document into matcher structures (JSON-ready)."""
+    if not raw.get("clusters"):
+        raise Exception("Rules file defines no clusters")
+
+    clusters = {}
+    presets = {}
+    for rule in raw["clusters"]:
+        cid = rule["id"]
+        clusters[cid] = {
+            "name": rule.get("name", cid.replace("_", " ").title()),
+            "weight": rule.get("weight", 1.0),
+            "keywords": compile_keywords(rule.get("keywords", [])),
+            "arabic_boost": rule.get("arabic_boost", 0),
+            # [above, upto, below, score]; None means unbounded
+            "duration_boosts": [[b.get("above"), b.get("upto"), b.get("below"), b["score"]]
+                                for b in rule.get("duration_boosts", [])],
+            "duration_hint": rule.get("duration_hint"),
+            "hash": rule_hash(rule),
+        }
+        if rule.get("preset"):
+            presets[cid] = _compile_preset(rule["preset"])
+
+    fallback = raw.get("fallback", {})
+    fallback_id = fallback.get("id", "uncategorized")
+    if fallback.get("preset"):
+        presets[fallback_id] = _compile_preset(fallback["preset"])
+
+    version = raw.get("version", 0)
+    return {
+        "format": COMPILED_FORMAT,
+        "version": version,
+        "hash": digest,
+        "stamp": f"v{version}-{digest[:12]}-f{COMPILED_FORMAT}",
+        "order": list(clusters),
+        "clusters": clusters,
+        "min_score": raw.get("min_score", 0.5),
+        "fallback": fallback_id,
+        "fallback_name": fallback.get("name", fallback_id.replace("_", " ").title()),
+        "eq_bands": raw.get("eq_bands", [32, 64, 125, 250, 500, 1000, 2000, 4000, 8000, 16000]),
+        "presets": presets,
+    }
+
+
+def _finalize(compiled):
+    """Restore int band keys (JSON object keys are strings)."""
+    for preset in compiled["presets"].values():
+        preset["bands"] = {int(freq): gain for freq, gain in preset["bands"].items()}
+    return compiled
+
+
+def load_rules(path=RULES_FILE, cache_dir=CACHE_DIR):
+    """Load and compile a rules file, using the on-disk compiled cache if present."""
+    with open(path, "rb") as f:
+        data = f.read()
+    digest = file_digest(data)
+
+    cache_path = Path(cache_dir) / f"rules_{digest[:16]}_f{COMPILED_FORMAT}.json"
+    if cache_path.exists():
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                return _finalize(json.load(f))
+        except (OSError, json.JSONDecodeError):
+            pass
+
+    compiled = compile_rules(json.loads(data.decode("utf-8")), digest)
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(f"{cache_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(compiled, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(f"{cache_path}.tmp", cache_path)
+    except OSError:
+        pass  # read-only data dir: just don't cache
+    return _finalize(compiled)
+
+
+def get_rules(path=RULES_FILE):
+    """Current compiled rules, reloaded whenever the rules file changes on disk."""
+    path = Path(path)
+    mtime = path.stat().st_mtime_ns
+    with _lock:
+        if _current["path"] != path or _current["mtime"] != mtime:
+            _current.update(path=path, mtime=mtime, rules=load_rules(path))
+        return _current["rules"]
+
+
+def rules_meta(rules):
+    """What an output file records about the rules it was classified with."""
+    return {
+        "version": rules["version"],
+        "hash": rules["hash"],
+        "stamp": rules["stamp"],
+        "cluster_hashes": {cid: c["hash"] for cid, c in rules["clusters"].items()},
+    }
+
+
+def changed_clusters(previous_meta, rules):
+    """Cluster ids whose matching rules differ from `previous_meta` (None = all)."""
+    if not previous_meta or "cluster_hashes" not in previous_meta:
+        return None
+    old = previous_meta["cluster_hashes"]
+    new = {cid: c["hash"] for cid, c in rules["clusters"].items()}
+    return {cid for cid in set(old) | set(new) if old.get(cid) != new.get(cid)}
+
+
+def cluster_definitions(rules):
+    """Rules in the old CLUSTER_DEFINITIONS shape (normalized keywords)."""
+    return {
+        cid: {
+            "name": c["name"],
+            "keywords": c["keywords"],
+            "duration_hint": c["duration_hint"],
+            "weight": c["weight"],
+        }
+        for cid, c in rules["clusters"].items()
+    }
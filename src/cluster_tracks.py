@@ -5,121 +5,25 @@ Groups tracks by audio characteristics using keyword analysis.
 """
 
 import json
-import re
 from datetime import datetime
 from pathlib import Path
 from collections import defaultdict
 
+from cluster_rules import changed_clusters, cluster_definitions, get_rules, rules_meta
+from instrumentation import incr, record_file_written, span
+from text_normalize import normalized
+from track import json_default, load_tracks
+
 DATA_DIR = Path(__file__).parent.parent / "data"
 OUTPUT_DIR = Path(__file__).parent.parent / "data"
 
 
-# Arabic detection pattern
-ARABIC_PATTERN = re.compile(r'[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF]+')
-
-# Cluster definitions with keywords and patterns
-CLUSTER_DEFINITIONS = {
-    "sufi_religious": {
-        "name": "Sufi / Religious",
-        "keywords": [
-            "sufi", "sufism", "dhikr", "zikr", "ذكر", "صوفي", "إنشاد", "inshad",
-            "qawwali", "nasheeds", "nasheed", "naat", "hamd", "allah", "الله",
-            "prophet", "رسول", "نبي", "sheikh", "شيخ", "mawlid", "مولد",
-            "hadra", "حضرة", "sama", "سماع", "whirling", "dervish", "درويش",
-            "spiritual", "روحاني", "meditation", "تأمل", "prayer", "صلاة",
-            "quran", "قرآن", "recitation", "تلاوة", "islamic", "إسلامي",
-            "masjid", "mosque", "مسجد", "tawhid", "توحيد"
-        ],
-        "duration_hint": "long",  # Often > 10 minutes
-        "weight": 1.5
-    },
-    "arabic_classical": {
-        "name": "Arabic Classical / Traditional",
-        "keywords": [
-            "classical", "كلاسيك", "tarab", "طرب", "oud", "عود", "qanun", "قانون",
-            "ney", "ناي", "maqam", "مقام", "oriental", "شرقي", "arabic", "عربي",
-            "egypt", "مصر", "lebanon", "لبنان", "syria", "سوريا", "umm kulthum",
-            "أم كلثوم", "farid", "فريد", "abdel halim", "عبد الحليم", "traditional",
-            "تراث", "heritage", "folkloric", "شعبي", "baladi", "بلدي", "saidi",
-            "صعيدي", "levantine", "khaleeji", "خليجي", "gulf"
-        ],
-        "duration_hint": "medium",
-        "weight": 1.3
-    },
-    "arabic_pop": {
-        "name": "Arabic Pop / Modern",
-        "keywords": [
-            "pop", "بوب", "modern", "حديث", "amr diab", "عمرو دياب", "nancy",
-            "نانسي", "elissa", "إليسا", "haifa", "هيفا", "rotana", "روتانا",
-            "arabic pop", "عربي", "mashup", "remix عربي", "arab", "egypt pop",
-            "lebanese", "لبناني"
-        ],
-        "duration_hint": "short",
-        "weight": 1.0
-    },
-    "electronic_edm": {
-        "name": "Electronic / EDM",
-        "keywords": [
-            "electronic", "edm", "house", "techno", "trance", "dubstep", "bass",
-            "remix", "dj", "club", "dance", "beat", "drop", "synth", "synthesizer",
-            "rave", "festival", "progressive", "deep house", "tech house",
-            "minimal", "ambient electronic", "breakbeat", "drum and bass", "dnb",
-            "future bass", "trap", "electro", "electronica"
-        ],
-        "duration_hint": "medium",
-        "weight": 1.0
-    },
-    "instrumental": {
-        "name": "Instrumental / Ambient",
-        "keywords": [
-            "instrumental", "piano", "guitar", "violin", "cello", "orchestra",
-            "ambient", "relaxing", "meditation music", "sleep", "study",
-            "concentration", "focus", "calm", "peaceful", "nature sounds",
-            "acoustic", "solo", "no vocals", "cinematic", "soundtrack", "score",
-            "film music", "epic", "strings", "woodwind", "brass"
-        ],
-        "duration_hint": None,
-        "weight": 1.0
-    },
-    "world_fusion": {
-        "name": "World Music / Fusion",
-        "keywords": [
-            "world", "fusion", "global", "ethnic", "tribal", "african", "indian",
-            "persian", "turkish", "flamenco", "latin", "brazilian", "reggae",
-            "dub", "world beat", "ethno", "multicultural", "cross-cultural",
-            "traditional fusion", "contemporary world"
-        ],
-        "duration_hint": None,
-        "weight": 0.9
-    },
-    "rock_alternative": {
-        "name": "Rock / Alternative",
-        "keywords": [
-            "rock", "alternative", "indie", "metal", "punk", "grunge", "hard rock",
-            "classic rock", "progressive rock", "post-rock", "shoegaze", "brit pop",
-            "garage", "blues rock", "psychedelic", "stoner", "doom"
-        ],
-        "duration_hint": None,
-        "weight": 0.8
-    },
-    "hip_hop_rap": {
-        "name": "Hip-Hop / Rap",
-        "keywords": [
-            "hip hop", "hip-hop", "rap", "rapper", "beats", "flow", "rhyme",
-            "mc", "emcee", "freestyle", "trap rap", "boom bap", "old school",
-            "new school", "conscious", "gangsta", "drill", "mumble"
-        ],
-        "duration_hint": None,
-        "weight": 0.8
-    }
-}
-
+# Cluster definitions and presets live in config/cluster_rules.json and are
+# compiled by cluster_rules; this is the snapshot taken at import time
+CLUSTER_DEFINITIONS = cluster_definitions(get_rules())
 
-def has_arabic(text):
-    """Check if text contains Arabic characters."""
-    if not text:
-        return False
-    return bool(ARABIC_PATTERN.search(str(text)))
+# Fields whose change means a previous assignment can't be reused
+CLASSIFIED_FIELDS = ('title', 'artist', 'genre', 'tag_list', 'description', 'duration_ms')
 
 
 def parse_duration_seconds(duration_str):
@@ -148,70 +52,135 @@ def get_duration_ms(track):
     return None
 
 
-def classify_track(track):
-    """Classify a single track into clusters."""
-    scores = defaultdict(float)
-
-    # Combine all text fields for keyword matching
-    text_fields = [
-        track.get('title', ''),
-        track.get('artist', ''),
-        track.get('genre', ''),
-        track.get('tag_list', ''),
-        track.get('description', ''),
-    ]
-    combined_text = ' '.join(str(f).lower() for f in text_fields if f)
-
-    # Check for Arabic content
-    is_arabic = any(has_arabic(f) for f in text_fields)
-    if is_arabic:
-        scores['sufi_religious'] += 0.3
-        scores['arabic_classical'] += 0.3
-        scores['arabic_pop'] += 0.2
-
-    # Duration analysis
+def score_clusters(track, norm, rules, cluster_ids):
+    """Score `track` against the given clusters only.
+
+    A cluster gets an entry when any of its rules fire (Arabic boost,
+    duration boost, keyword hit). Scores are independent per cluster, which
+    is what lets unchanged clusters keep their previous scores.
+    """
+    scores = {}
+    combined_text = norm.text
+
     duration_ms = get_duration_ms(track)
-    if duration_ms:
-        duration_min = duration_ms / 60000
-        if duration_min > 10:
-            scores['sufi_religious'] += 0.5
-            scores['arabic_classical'] += 0.3
-        elif duration_min > 6:
-            scores['arabic_classical'] += 0.2
-            scores['electronic_edm'] += 0.1
-        elif duration_min < 3:
-            scores['arabic_pop'] += 0.2
-            scores['hip_hop_rap'] += 0.1
-
-    # Keyword matching
-    for cluster_id, cluster_def in CLUSTER_DEFINITIONS.items():
-        keywords = cluster_def['keywords']
-        weight = cluster_def.get('weight', 1.0)
-
-        for keyword in keywords:
-            keyword_lower = keyword.lower()
-            if keyword_lower in combined_text:
+    duration_min = duration_ms / 60000 if duration_ms else None
+
+    for cluster_id in cluster_ids:
+        rule = rules['clusters'][cluster_id]
+        score = 0.0
+        hit = False
+
+        # Arabic content
+        if norm.is_arabic and rule['arabic_boost']:
+            score += rule['arabic_boost']
+            hit = True
+
+        # Duration analysis
+        if duration_min is not None:
+            for above, upto, below, boost in rule['duration_boosts']:
+                if ((above is None or duration_min > above)
+                        and (upto is None or duration_min <= upto)
+                        and (below is None or duration_min < below)):
+                    score += boost
+                    hit = True
+
+        # Keyword matching
+        weight = rule['weight']
+        for keyword in rule['keywords']:
+            if keyword in combined_text:
                 # More weight for title/artist matches
-                if keyword_lower in str(track.get('title', '')).lower():
-                    scores[cluster_id] += 1.5 * weight
-                elif keyword_lower in str(track.get('artist', '')).lower():
-                    scores[cluster_id] += 1.2 * weight
-                elif keyword_lower in str(track.get('genre', '')).lower():
-                    scores[cluster_id] += 1.0 * weight
+                if keyword in norm.title:
+                    score += 1.5 * weight
+                elif keyword in norm.artist:
+                    score += 1.2 * weight
+                elif keyword in norm.genre:
+                    score += 1.0 * weight
                 else:
-                    scores[cluster_id] += 0.5 * weight
+                    score += 0.5 * weight
+                hit = True
+
+        if hit:
+            scores[cluster_id] = score
+    return scores
+
+
+def pick_cluster(scores, rules):
+    """Best-scoring cluster (ties go to the earlier rule), or the fallback."""
+    best_id, best = None, None
+    for cluster_id in rules['order']:
+        if cluster_id in scores and (best is None or scores[cluster_id] > best):
+            best_id, best = cluster_id, scores[cluster_id]
+    if best is not None and best >= rules['min_score']:
+        return best_id, best
+    return rules['fallback'], 0
+
+
+def classify_track(track, rules=None):
+    """Classify a single track into clusters."""
+    rules = rules or get_rules()
+    # Normalized text fields are computed once at ingest (Track.norm)
+    scores = score_clusters(track, normalized(track), rules, rules['order'])
+    cluster_id, score = pick_cluster(scores, rules)
+    return cluster_id, score, scores
 
-    # Get the best matching cluster
-    if scores:
-        best_cluster = max(scores.items(), key=lambda x: x[1])
-        if best_cluster[1] >= 0.5:  # Minimum score threshold
-            return best_cluster[0], best_cluster[1], dict(scores)
 
-    return 'uncategorized', 0, dict(scores)
+def track_key(track):
+    """Same key as similarity_index.track_key (track_id, falling back to URL)."""
+    key = track.get('track_id')
+    if key is None or key == '':
+        key = track.get('url')
+    return None if key is None or key == '' else str(key)
 
 
-def cluster_tracks(tracks):
-    """Cluster all tracks."""
+def load_previous_assignments(path):
+    """Read a previous track_clusters.json as (rules meta, {track key: track dict})."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None, {}
+    previous = {}
+    for cluster in data.get('clusters', []):
+        for track in cluster.get('tracks', []):
+            key = track_key(track)
+            if key:
+                previous[key] = track
+    return data.get('rules'), previous
+
+
+def reclassify(track, prev, rules, changed):
+    """Reuse or partially re-score a previous assignment; None if it can't be reused."""
+    if prev is None or any((prev.get(f) or None) != (track.get(f) or None) for f in CLASSIFIED_FIELDS):
+        return None
+    if prev.get('rules_version') == rules['stamp']:
+        return prev.get('cluster'), prev.get('cluster_score', 0), prev.get('all_cluster_scores', {})
+    if changed is None:
+        return None
+
+    # Only clusters whose rules changed are re-scored
+    scores = {cid: s for cid, s in prev.get('all_cluster_scores', {}).items()
+              if cid in rules['clusters'] and cid not in changed}
+    scores.update(score_clusters(track, normalized(track), rules,
+                                 [cid for cid in rules['order'] if cid in changed]))
+    scores = {cid: scores[cid] for cid in rules['order'] if cid in scores}
+    cluster_id, score = pick_cluster(scores, rules)
+    return cluster_id, score, scores
+
+
+def cluster_tracks(tracks, rules=None, previous=None):
+    """Cluster all tracks.
+
+    `previous` is load_previous_assignments() output; tracks classified
+    under the same rules are reused, and after a rules edit only the
+    changed clusters are re-scored.
+    """
+    rules = rules or get_rules()
+    previous_meta, previous_tracks = previous or (None, {})
+    changed = changed_clusters(previous_meta, rules)
+    if previous_meta and previous_meta.get('stamp') != rules['stamp']:
+        print(f"Rules changed ({previous_meta.get('stamp')} -> {rules['stamp']}), "
+              f"re-scoring: {', '.join(sorted(changed)) if changed is not None else 'all clusters'}")
+
     clusters = defaultdict(list)
     cluster_stats = defaultdict(lambda: {
         'count': 0,
@@ -219,30 +188,40 @@ def cluster_tracks(tracks):
         'artists': set(),
         'sample_tracks': []
     })
-
-    for track in tracks:
-        cluster_id, score, all_scores = classify_track(track)
-
-        track_with_cluster = track.copy()
-        track_with_cluster['cluster'] = cluster_id
-        track_with_cluster['cluster_score'] = score
-        track_with_cluster['all_cluster_scores'] = all_scores
-
-        clusters[cluster_id].append(track_with_cluster)
-
-        # Update stats
-        stats = cluster_stats[cluster_id]
-        stats['count'] += 1
-        if track.get('duration_ms'):
-            stats['total_duration_ms'] += track['duration_ms']
-        if track.get('artist'):
-            stats['artists'].add(track['artist'])
-        if len(stats['sample_tracks']) < 5:
-            stats['sample_tracks'].append({
-                'title': track.get('title'),
-                'artist': track.get('artist'),
-                'url': track.get('url')
-            })
+    reused = 0
+
+    with span("classify"):
+        for track in tracks:
+            result = reclassify(track, previous_tracks.get(track_key(track)), rules, changed)
+            if result is None:
+                result = classify_track(track, rules)
+            else:
+                reused += 1
+            cluster_id, score, all_scores = result
+
+            track_with_cluster = track.copy()
+            track_with_cluster['cluster'] = cluster_id
+            track_with_cluster['cluster_score'] = score
+            track_with_cluster['all_cluster_scores'] = all_scores
+            track_with_cluster['rules_version'] = rules['stamp']
+
+            clusters[cluster_id].append(track_with_cluster)
+
+            # Update stats
+            stats = cluster_stats[cluster_id]
+            stats['count'] += 1
+            if track.get('duration_ms'):
+                stats['total_duration_ms'] += track['duration_ms']
+            if track.get('artist'):
+                stats['artists'].add(track['artist'])
+            if len(stats['sample_tracks']) < 5:
+                stats['sample_tracks'].append({
+                    'title': track.get('title'),
+                    'artist': track.get('artist'),
+                    'url': track.get('url')
+                })
+    incr("tracks.classified", len(tracks))
+    incr("tracks.reused", reused)
 
     return clusters, cluster_stats
 
@@ -261,12 +240,14 @@ def main():
     with open(input_file, 'r', encoding='utf-8') as f:
         data = json.load(f)
 
-    tracks = data.get('tracks', [])
+    tracks = load_tracks(data.get('tracks', []))
     print(f"Loaded {len(tracks)} tracks")
 
-    # Cluster tracks
+    # Cluster tracks (reusing assignments from the previous run where rules allow)
     print("\nClustering tracks...")
-    clusters, cluster_stats = cluster_tracks(tracks)
+    rules = get_rules()
+    output_file = OUTPUT_DIR / "track_clusters.json"
+    clusters, cluster_stats = cluster_tracks(tracks, rules, load_previous_assignments(output_file))
 
     # Build output
     output_clusters = []
@@ -274,7 +255,7 @@ def main():
         cluster_tracks_list = clusters[cluster_id]
         stats = cluster_stats[cluster_id]
 
-        cluster_def = CLUSTER_DEFINITIONS.get(cluster_id, {})
+        cluster_def = rules['clusters'].get(cluster_id, {})
         cluster_name = cluster_def.get('name', cluster_id.replace('_', ' ').title())
 
         avg_duration_ms = stats['total_duration_ms'] / stats['count'] if stats['count'] > 0 else 0
@@ -297,12 +278,13 @@ def main():
         'total_tracks': len(tracks),
         'cluster_count': len(output_clusters),
         'clustered_at': datetime.now().isoformat(),
+        'rules': rules_meta(rules),
         'clusters': output_clusters
     }
 
-    output_file = OUTPUT_DIR / "track_clusters.json"
     with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(output, f, ensure_ascii=False, indent=2)
+        json.dump(output, f, ensure_ascii=False, indent=2, default=json_default)
+    record_file_written(output_file)
 
     print(f"\nClusters saved to: {output_file}")
 
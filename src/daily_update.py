@@ -1,13 +1,19 @@
 #!/usr/bin/env python3
 """
 AutoEQ Daily Update Pipeline
-Runs once per day to refresh SoundCloud data and regenerate clusters/presets
+Runs once per day to refresh SoundCloud data and regenerate clusters/presets.
+With --users, runs the pipeline for many accounts concurrently, each in its
+own data/users/<username>/ namespace.
 """
 
 import os
 import sys
 import json
 import logging
+import argparse
+import cProfile
+import pstats
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
 # Configure logging
@@ -24,12 +30,44 @@ logger = logging.getLogger(__name__)
 # Add src to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from fetch_likes import fetch_all_likes
+import instrumentation
+from instrumentation import span, span_seconds
+from metrics import write_metrics
+from accounts import load_usernames, parse_usernames, user_data_dir
+from fetch_likes import DEFAULT_USERNAME, fetch_all_likes
 from groq_cluster import dynamic_cluster_tracks
+from similarity_index import build_index, load_preset_gains, tracks_from_clusters
+from preset_table import build_table
 
+# Accounts processed in parallel in multi-account mode
+DEFAULT_WORKERS = int(os.environ.get("AUTOEQ_WORKERS", "4"))
 
-def run_daily_update():
-    """Execute the complete daily update pipeline"""
+
+class AccountLogger(logging.LoggerAdapter):
+    """Prefix log lines with the account, so interleaved runs stay readable."""
+
+    def process(self, msg, kwargs):
+        return f"[{self.extra['username']}] {msg}", kwargs
+
+
+def resolve_dirs():
+    """(data_dir, logs_dir) for the container or a local checkout."""
+    if os.path.exists('/app/data'):
+        return '/app/data', '/app/logs'
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(base_dir, 'data'), os.path.join(base_dir, 'logs')
+
+
+def run_daily_update(username=DEFAULT_USERNAME, data_dir=None, profile=False, cancel=None):
+    """Execute the complete daily update pipeline for one account
+
+    Outputs go to `data_dir` (default: the top-level data directory).
+    With profile=True the run is wrapped in cProfile and the stats are
+    dumped to logs/profile_<username>_<timestamp>.pstats (plus a text summary).
+    `cancel` (a threading.Event) is checked between stages; once it is set
+    the run stops there and fails.
+    """
+    logger = AccountLogger(logging.getLogger(__name__), {"username": username})
 
     start_time = datetime.now()
     logger.info("="*60)
@@ -38,85 +76,126 @@ def run_daily_update():
     logger.info("="*60)
 
     # Determine paths
-    if os.path.exists('/app/data'):
-        data_dir = '/app/data'
-        logs_dir = '/app/logs'
-    else:
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        data_dir = os.path.join(base_dir, 'data')
-        logs_dir = os.path.join(base_dir, 'logs')
+    default_data_dir, logs_dir = resolve_dirs()
+    data_dir = data_dir or default_data_dir
 
     os.makedirs(data_dir, exist_ok=True)
     os.makedirs(logs_dir, exist_ok=True)
 
     status = {
+        "username": username,
         "started_at": start_time.isoformat(),
         "stages": {},
         "success": False
     }
 
+    def check_cancelled(next_stage):
+        if cancel is not None and cancel.is_set():
+            status["cancelled"] = True
+            raise Exception(f"Cancelled before {next_stage}")
+
+    instrumentation.reset()
+    profiler = cProfile.Profile() if profile else None
+    if profiler:
+        profiler.enable()
+
     try:
         # Stage 1: Fetch SoundCloud Likes
-        logger.info("\n[STAGE 1/3] Fetching SoundCloud likes...")
-        stage1_start = datetime.now()
+        logger.info("\n[STAGE 1/4] Fetching SoundCloud likes...")
+        previous_ids = load_previous_track_ids(data_dir)
 
-        likes_data = fetch_all_likes(
-            username="amr-farouk-10",
-            max_tracks=10000,
-            output_dir=data_dir
-        )
+        with span("stage.fetch"):
+            likes_data = fetch_all_likes(
+                username=username,
+                max_tracks=10000,
+                output_dir=data_dir
+            )
 
         track_count = likes_data.get("track_count", 0)
+        new_count = sum(1 for t in likes_data.get("tracks", []) if t.get("track_id") not in previous_ids)
         status["stages"]["fetch"] = {
             "success": track_count > 0,
             "tracks_fetched": track_count,
-            "duration_seconds": (datetime.now() - stage1_start).total_seconds()
+            "tracks_new": new_count,
+            "duration_seconds": span_seconds("stage.fetch")
         }
-        logger.info(f"  Fetched {track_count} tracks")
+        logger.info(f"  Fetched {track_count} tracks ({new_count} new)")
 
         if track_count == 0:
             raise Exception("No tracks fetched from SoundCloud")
 
         # Stage 2: Dynamic AI Clustering
-        logger.info("\n[STAGE 2/3] Running AI-powered clustering...")
-        stage2_start = datetime.now()
+        check_cancelled("clustering")
+        logger.info("\n[STAGE 2/4] Running AI-powered clustering...")
 
         tracks = likes_data.get("tracks", [])
-        cluster_result = dynamic_cluster_tracks(tracks, data_dir)
+        with span("stage.clustering"):
+            cluster_result = dynamic_cluster_tracks(tracks, data_dir)
 
         cluster_count = cluster_result.get("cluster_count", 0)
         status["stages"]["clustering"] = {
             "success": cluster_count > 0,
             "clusters_generated": cluster_count,
-            "duration_seconds": (datetime.now() - stage2_start).total_seconds()
+            "duration_seconds": span_seconds("stage.clustering")
         }
         logger.info(f"  Generated {cluster_count} clusters")
 
-        # Stage 3: Validate outputs
-        logger.info("\n[STAGE 3/3] Validating outputs...")
-        stage3_start = datetime.now()
+        # Stage 3: Similar-tracks index
+        check_cancelled("similarity index")
+        logger.info("\n[STAGE 3/4] Building similarity index and preset table...")
+
+        with span("stage.similarity_index"):
+            index_tracks, index_clusters = tracks_from_clusters(cluster_result)
+            manifest = build_index(index_tracks, index_clusters, data_dir)
+
+        status["stages"]["similarity_index"] = {
+            "success": manifest["count"] > 0,
+            "tracks_indexed": manifest["count"],
+            "neighbors_per_track": manifest["k"],
+            "duration_seconds": span_seconds("stage.similarity_index")
+        }
+        logger.info(f"  Indexed {manifest['count']} tracks (k={manifest['k']})")
+
+        # Binary track -> preset table for player-side lookups
+        check_cancelled("preset table")
+        with span("stage.preset_table"):
+            table = build_table(cluster_result, load_preset_gains(data_dir), data_dir)
+
+        status["stages"]["preset_table"] = {
+            "success": table["rows"] > 0,
+            "tracks": table["rows"],
+            "bytes": table["bytes"],
+            "duration_seconds": span_seconds("stage.preset_table")
+        }
+        logger.info(f"  Preset table: {table['rows']} tracks in {table['bytes']} bytes")
+
+        # Stage 4: Validate outputs
+        check_cancelled("validation")
+        logger.info("\n[STAGE 4/4] Validating outputs...")
 
         required_files = [
             "soundcloud_likes.json",
             "track_clusters.json",
             "eq_presets.json",
-            "eq_presets_detailed.json"
+            "eq_presets_detailed.json",
+            "track_neighbors.json"
         ]
 
         validation_results = {}
-        for fname in required_files:
-            fpath = os.path.join(data_dir, fname)
-            exists = os.path.exists(fpath)
-            size = os.path.getsize(fpath) if exists else 0
-            valid = exists and size > 100
-            validation_results[fname] = {"exists": exists, "size": size, "valid": valid}
-            logger.info(f"  {fname}: {'OK' if valid else 'MISSING'} ({size} bytes)")
+        with span("stage.validation"):
+            for fname in required_files:
+                fpath = os.path.join(data_dir, fname)
+                exists = os.path.exists(fpath)
+                size = os.path.getsize(fpath) if exists else 0
+                valid = exists and size > 100
+                validation_results[fname] = {"exists": exists, "size": size, "valid": valid}
+                logger.info(f"  {fname}: {'OK' if valid else 'MISSING'} ({size} bytes)")
 
         all_valid = all(v["valid"] for v in validation_results.values())
         status["stages"]["validation"] = {
             "success": all_valid,
             "files": validation_results,
-            "duration_seconds": (datetime.now() - stage3_start).total_seconds()
+            "duration_seconds": span_seconds("stage.validation")
         }
 
         if not all_valid:
@@ -138,15 +217,126 @@ def run_daily_update():
         status["failed_at"] = datetime.now().isoformat()
 
     finally:
+        if profiler:
+            profiler.disable()
+            status["profile"] = dump_profile(profiler, logs_dir, start_time, username)
+
+        status["instrumentation"] = instrumentation.snapshot()
+
         # Save status
         status_path = os.path.join(data_dir, "last_update_status.json")
         with open(status_path, "w") as f:
             json.dump(status, f, indent=2)
         logger.info(f"\nStatus saved to {status_path}")
 
+        try:
+            metrics_path = write_metrics(status, data_dir, default_data_dir)
+            logger.info(f"Metrics saved to {metrics_path}")
+        except Exception as e:
+            logger.error(f"Failed to write metrics: {e}")
+
     return status["success"]
 
 
+def load_previous_track_ids(data_dir):
+    """Track IDs from the previous run's soundcloud_likes.json (empty if none)."""
+    path = os.path.join(data_dir, "soundcloud_likes.json")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return {t.get("track_id") for t in json.load(f).get("tracks", [])}
+    except (OSError, json.JSONDecodeError):
+        return set()
+
+
+def run_accounts(usernames, workers=DEFAULT_WORKERS, profile=False):
+    """Run the pipeline for many accounts on a pool of `workers` threads.
+
+    Each account gets its own data namespace, status, metrics and
+    instrumentation. The SoundCloud and Groq rate limits are process-wide,
+    as are the client_id, Groq response and track metadata caches, so
+    throughput grows with workers until the shared limits are reached.
+    Writes a summary to data/accounts_status.json.
+    """
+    data_dir, _ = resolve_dirs()
+    start_time = datetime.now()
+    logger.info(f"Running {len(usernames)} accounts with {workers} workers")
+    if profile and workers > 1:
+        # Only one profiler can be active per process on Python 3.12+
+        logger.warning("Profiling needs --workers 1 in multi-account mode; disabled")
+        profile = False
+
+    def run(username):
+        with instrumentation.run_scope():
+            return run_daily_update(username, user_data_dir(data_dir, username), profile)
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="account") as pool:
+        futures = {pool.submit(run, username): username for username in usernames}
+        for future in as_completed(futures):
+            username = futures[future]
+            try:
+                results[username] = future.result()
+            except Exception as e:
+                logger.error(f"[{username}] Run crashed: {e}")
+                results[username] = False
+
+    summary = {
+        "started_at": start_time.isoformat(),
+        "completed_at": datetime.now().isoformat(),
+        "total_duration_seconds": (datetime.now() - start_time).total_seconds(),
+        "workers": workers,
+        "accounts": {
+            username: {
+                "success": results[username],
+                "data_dir": os.path.relpath(user_data_dir(data_dir, username), data_dir),
+            }
+            for username in usernames
+        },
+        "succeeded": sum(1 for ok in results.values() if ok),
+        "failed": sum(1 for ok in results.values() if not ok),
+    }
+    summary_path = os.path.join(data_dir, "accounts_status.json")
+    with open(summary_path, "w") as f:
+        json.dump(summary, f, indent=2)
+
+    logger.info(f"Accounts done: {summary['succeeded']} succeeded, {summary['failed']} failed "
+                f"in {summary['total_duration_seconds']:.1f}s (summary: {summary_path})")
+    return summary["failed"] == 0
+
+
+def dump_profile(profiler, logs_dir, start_time, username=DEFAULT_USERNAME):
+    """Write cProfile stats (binary + top-50 text summary) and return the paths."""
+    stamp = f"{username}_{start_time.strftime('%Y%m%d_%H%M%S')}"
+    stats_path = os.path.join(logs_dir, f"profile_{stamp}.pstats")
+    text_path = os.path.join(logs_dir, f"profile_{stamp}.txt")
+
+    profiler.dump_stats(stats_path)
+    with open(text_path, "w") as f:
+        pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(50)
+
+    logger.info(f"Profile saved to {stats_path}")
+    return {"stats": stats_path, "summary": text_path}
+
+
 if __name__ == "__main__":
-    success = run_daily_update()
+    parser = argparse.ArgumentParser(description="AutoEQ daily update pipeline")
+    parser.add_argument("--profile", action="store_true",
+                        default=os.environ.get("AUTOEQ_PROFILE") == "1",
+                        help="Profile the run with cProfile (also AUTOEQ_PROFILE=1)")
+    parser.add_argument("--users", default=os.environ.get("AUTOEQ_USERS", ""),
+                        help="Comma-separated accounts to process concurrently (also AUTOEQ_USERS)")
+    parser.add_argument("--users-file", default=os.environ.get("AUTOEQ_USERS_FILE"),
+                        help="File with one account per line (also AUTOEQ_USERS_FILE)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Accounts processed in parallel (also AUTOEQ_WORKERS)")
+    args = parser.parse_args()
+
+    usernames = parse_usernames(args.users)
+    if args.users_file:
+        usernames += [u for u in load_usernames(args.users_file) if u not in usernames]
+
+    if usernames:
+        success = run_accounts(usernames, workers=args.workers, profile=args.profile)
+    else:
+        success = run_daily_update(profile=args.profile)
     sys.exit(0 if success else 1)
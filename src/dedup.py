@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Near-Duplicate Detection
+Groups re-uploads, live versions and remixes of the same piece: MinHash
+signatures over character shingles of the normalized title (with version
+markers like "remix"/"live" dropped and an "Artist - " prefix split off),
+LSH banding to find candidate pairs in near-linear time, then a check of
+signature agreement and artist before merging groups. Clustering classifies
+one representative per group and copies the result to the rest.
+"""
+
+import json
+import os
+import sys
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from instrumentation import incr, record_file_written, span
+from text_normalize import normalize, normalized
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+
+GROUPS_FILE = "duplicate_groups.json"
+
+# Tokens that mark a version of a piece rather than a different piece
+VERSION_WORDS = {
+    "remix", "rmx", "mix", "edit", "radio", "extended", "original", "version", "live",
+    "acoustic", "remastered", "remaster", "official", "audio", "video", "lyric", "lyrics",
+    "cover", "rework", "bootleg", "vip", "dub", "instrumental", "slowed", "reverb", "sped",
+    "feat", "ft", "hd", "hq", "full", "مباشر", "ريمكس", "حفله", "فيديو", "كليب", "بدون", "موسيقي",
+}
+
+SHINGLE_SIZE = 3
+NUM_PERM = 128
+BANDS = 32                      # BANDS x ROWS = NUM_PERM; candidate threshold ~(1/32)^(1/4) = 0.42
+ROWS = NUM_PERM // BANDS
+DEFAULT_THRESHOLD = 0.7         # estimated title Jaccard needed to merge two tracks
+# Across artists (covers, remixes credited to the remixer) titles must be at
+# least this long (characters) and agree more closely
+DISTINCT_TITLE_LENGTH = 16
+CROSS_ARTIST_THRESHOLD = 0.9
+BUCKET_WINDOW = 16              # bucket neighbours each member is compared with
+SEED = 2024
+
+# MinHash permutations: multiply-shift hashes h(x) = ((a*x + b) mod 2^64) >> 32
+# over 32-bit shingle hashes (a odd); _MIX folds signature slices into one key
+_rng = np.random.RandomState(SEED)
+_A = _rng.randint(0, 2 ** 63, size=NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_B = _rng.randint(0, 2 ** 63, size=NUM_PERM, dtype=np.uint64)
+_MIX = _rng.randint(0, 2 ** 63, size=NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_SHIFT = np.uint64(32)
+
+# Shingles hashed / candidate pairs checked per block (bounds memory)
+CHUNK_SHINGLES = 1 << 15
+CHUNK_PAIRS = 1 << 15
+
+
+def _strip_versions(text):
+    return " ".join(w for w in text.split() if w not in VERSION_WORDS)
+
+
+def canonical(track, norm=None):
+    """(artist, title) a track is compared by, normalized and without version markers.
+
+    Re-uploads titled "Artist - Title" are credited to the artist in the title.
+    The title is empty when it consists only of version words.
+    """
+    title = track.get("title") or ""
+    if " - " in title:
+        artist, rest = title.split(" - ", 1)
+        rest = _strip_versions(normalize(rest))
+        if rest:  # not just "Title - Radio Edit"
+            return normalize(artist), rest
+    norm = norm or normalized(track)
+    return norm.artist, _strip_versions(norm.title)
+
+
+def shingle_hashes(text, size=SHINGLE_SIZE):
+    """Set of crc32 hashes of the character shingles of `text`."""
+    if len(text) <= size:
+        return {zlib.crc32(text.encode("utf-8"))} if text else set()
+    return {zlib.crc32(text[i:i + size].encode("utf-8")) for i in range(len(text) - size + 1)}
+
+
+def minhash_signatures(titles):
+    """(titles x NUM_PERM) uint32 MinHash signatures and the rows that have any shingles."""
+    shingles = [shingle_hashes(title) for title in titles]
+    rows = np.array([i for i, s in enumerate(shingles) if s], dtype=np.int64)
+    signatures = np.full((len(titles), NUM_PERM), np.iinfo(np.uint32).max, dtype=np.uint32)
+
+    start = 0
+    while start < len(rows):
+        # Take whole tracks until the block holds CHUNK_SHINGLES shingles
+        end, count = start, 0
+        while end < len(rows) and (count == 0 or count + len(shingles[rows[end]]) <= CHUNK_SHINGLES):
+            count += len(shingles[rows[end]])
+            end += 1
+        block = rows[start:end]
+        values = np.fromiter((h for r in block for h in shingles[r]), dtype=np.uint64, count=count)
+        lengths = np.array([len(shingles[r]) for r in block])
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+        hashed = _A[:, None] * values[None, :]
+        hashed += _B[:, None]
+        hashed >>= _SHIFT
+        signatures[block] = np.minimum.reduceat(hashed, offsets, axis=1).T.astype(np.uint32)
+        start = end
+
+    return signatures, rows
+
+
+def _mix(values):
+    """64-bit key per row of a uint64 matrix (equal rows get equal keys)."""
+    with np.errstate(over="ignore"):
+        return (values * _MIX[:values.shape[1]]).sum(axis=1, dtype=np.uint64)
+
+
+def candidate_pairs(signatures, rows, groups, window=BUCKET_WINDOW):
+    """Yield (a, b) row arrays sharing an LSH band bucket, one batch per band step.
+
+    Members of a bucket are ordered by full signature, then by `groups` (e.g.
+    artist), so identical signatures of the same artist end up adjacent; each
+    is paired with the next `window` members, which is every pair in all but
+    very large buckets. Pairs repeat across bands.
+    """
+    selected = signatures[rows].astype(np.uint64)
+    full_keys = _mix(selected)
+    for band in range(BANDS):
+        labels = _mix(selected[:, band * ROWS:(band + 1) * ROWS])
+        order = np.lexsort((groups[rows], full_keys, labels))
+        sorted_labels = labels[order]
+        for step in range(1, window + 1):
+            same = sorted_labels[step:] == sorted_labels[:-step]
+            if not same.any():
+                break
+            yield rows[order[:-step][same]], rows[order[step:][same]]
+
+
+def find_groups(tracks, threshold=DEFAULT_THRESHOLD):
+    """Groups (lists of track indices, size >= 2, representative first) of near-duplicates."""
+    with span("dedup"):
+        norms = [normalized(t) for t in tracks]
+        keys = [canonical(t, norm) for t, norm in zip(tracks, norms)]
+        artist_ids = {}
+        artists = np.array([artist_ids.setdefault(artist, len(artist_ids)) for artist, _ in keys])
+        distinct = np.array([len(title) >= DISTINCT_TITLE_LENGTH for _, title in keys], dtype=bool)
+
+        # Titles made only of version words ("Original Mix") are compared unstripped
+        titles = [title or norm.title for norm, (_, title) in zip(norms, keys)]
+        signatures, rows = minhash_signatures(titles)
+
+        # Cheap artist/length filter per band, then each distinct pair is
+        # checked once for signature agreement, in bounded blocks
+        n = max(len(tracks), 1)
+        candidates = []
+        for a, b in candidate_pairs(signatures, rows, artists):
+            keep = (artists[a] == artists[b]) | (distinct[a] & distinct[b])
+            candidates.append(np.minimum(a[keep], b[keep]) * n + np.maximum(a[keep], b[keep]))
+        codes = np.sort(np.concatenate(candidates)) if candidates else np.zeros(0, dtype=np.int64)
+        codes = codes[np.r_[True, codes[1:] != codes[:-1]]] if len(codes) else codes
+
+        verified = []
+        for i in range(0, len(codes), CHUNK_PAIRS):
+            a, b = np.divmod(codes[i:i + CHUNK_PAIRS], n)
+            agreement = (signatures[a] == signatures[b]).mean(axis=1)
+            needed = np.where(artists[a] == artists[b], threshold, max(threshold, CROSS_ARTIST_THRESHOLD))
+            ok = agreement >= needed
+            verified.append(np.stack([a[ok], b[ok]], axis=1))
+        pairs = np.concatenate(verified) if verified else np.zeros((0, 2), dtype=np.int64)
+
+        parent = list(range(len(tracks)))
+
+        def root(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for a, b in pairs.tolist():
+            ra, rb = root(a), root(b)
+            if ra != rb:
+                # The earliest track (most recent like) represents the group
+                parent[max(ra, rb)] = min(ra, rb)
+
+        members = {}
+        for i in range(len(tracks)):
+            members.setdefault(root(i), []).append(i)
+        groups = sorted((m for m in members.values() if len(m) > 1), key=lambda m: (-len(m), m[0]))
+
+    incr("dedup.groups", len(groups))
+    incr("dedup.duplicates", sum(len(g) - 1 for g in groups))
+    return groups
+
+
+def representative_of(count, groups):
+    """List mapping each track index to its group representative (itself if unique)."""
+    rep = list(range(count))
+    for group in groups:
+        for i in group[1:]:
+            rep[i] = group[0]
+    return rep
+
+
+def _summary(track):
+    return {
+        "track_id": track.get("track_id"),
+        "title": track.get("title", ""),
+        "artist": track.get("artist", ""),
+        "url": track.get("url", ""),
+        "cluster": track.get("cluster"),
+    }
+
+
+def save_duplicate_groups(tracks, groups, data_dir=DATA_DIR, threshold=DEFAULT_THRESHOLD):
+    """Write duplicate_groups.json for the dashboard."""
+    document = {
+        "generated_at": datetime.now().isoformat(),
+        "total_tracks": len(tracks),
+        "group_count": len(groups),
+        "duplicate_tracks": sum(len(g) - 1 for g in groups),
+        "threshold": threshold,
+        "groups": [
+            {
+                "size": len(group),
+                "representative": _summary(tracks[group[0]]),
+                "duplicates": [_summary(tracks[i]) for i in group[1:]],
+            }
+            for group in groups
+        ],
+    }
+    path = Path(data_dir) / GROUPS_FILE
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(document, f, ensure_ascii=False, indent=2)
+    os.replace(f"{path}.tmp", path)
+    record_file_written(path)
+    return document
+
+
+def main():
+    print("=" * 60)
+    print("Near-Duplicate Detection")
+    print("=" * 60)
+
+    likes_file = DATA_DIR / "soundcloud_likes.json"
+    if not likes_file.exists():
+        print(f"Error: {likes_file} not found")
+        return
+
+    with open(likes_file, "r", encoding="utf-8") as f:
+        tracks = json.load(f).get("tracks", [])
+
+    threshold = float(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_THRESHOLD
+    groups = find_groups(tracks, threshold)
+    document = save_duplicate_groups(tracks, groups, DATA_DIR, threshold)
+    print(f"{document['group_count']} groups, {document['duplicate_tracks']} duplicates "
+          f"in {len(tracks)} tracks")
+    for group in document["groups"][:10]:
+        rep = group["representative"]
+        print(f"  {group['size']:>3}x {rep['artist']} - {rep['title']}")
+    return document
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Track Enrichment
+Fills in genre, tags, description and duration for scraped tracks that only
+have a title/URL, using batched /tracks?ids= lookups and an on-disk cache.
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from fetch_likes import API_V2, get_client_id, get_page, make_session
+from instrumentation import bind, incr, record_file_written, span
+from track import FIELDS, Track, json_default, load_tracks
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+
+CACHE_FILE = "track_cache.json"
+CACHE_MAX_AGE = 30 * 86400  # metadata rarely changes; refresh monthly
+
+# /tracks?ids= accepts up to 50 ids per call
+BATCH_SIZE = 50
+MAX_WORKERS = 4
+
+# The cache is shared by every account in the process; saves merge under this
+_cache_lock = threading.Lock()
+
+
+def needs_enrichment(track):
+    """Scraped tracks lack an id or duration; API tracks have both."""
+    return track.get("track_id") is None or track.get("duration_ms") is None
+
+
+def load_cache(data_dir):
+    """Load the per-track metadata cache ({"tracks": {id: ...}, "urls": {url: id}})."""
+    path = Path(data_dir) / CACHE_FILE
+    if path.exists():
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+            cutoff = time.time() - CACHE_MAX_AGE
+            cache["tracks"] = {k: v for k, v in cache.get("tracks", {}).items()
+                               if v.get("fetched_at", 0) >= cutoff}
+            cache.setdefault("urls", {})
+            return cache
+        except (OSError, json.JSONDecodeError):
+            pass
+    return {"tracks": {}, "urls": {}}
+
+
+def save_cache(cache, data_dir):
+    """Merge `cache` into the on-disk cache (other runs may have saved since it was loaded)."""
+    path = Path(data_dir) / CACHE_FILE
+    with _cache_lock:
+        merged = load_cache(data_dir)
+        merged["tracks"].update(cache["tracks"])
+        merged["urls"].update(cache["urls"])
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(merged, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(f"{path}.tmp", path)
+
+
+def cache_entry(api_track):
+    """Cache the normalized fields of an API track (no per-like fields)."""
+    entry = Track.from_api(api_track).to_dict()
+    entry.pop("liked_at", None)
+    entry["fetched_at"] = time.time()
+    return entry
+
+
+def resolve_urls(urls, client_id, session, cache):
+    """Resolve track URLs without a known id (one /resolve call each, cached)."""
+    def resolve(url):
+        return url, get_page(session, f"{API_V2}/resolve", {"url": url, "client_id": client_id})
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        for url, api_track in pool.map(bind(resolve), urls):
+            incr("enrich.resolve_calls")
+            if api_track and api_track.get("kind") == "track" and api_track.get("id"):
+                track_id = str(api_track["id"])
+                cache["urls"][url] = track_id
+                # /resolve already returns the full track
+                cache["tracks"][track_id] = cache_entry(api_track)
+
+
+def fetch_batches(track_ids, client_id, session, cache):
+    """Fetch metadata for track_ids in /tracks?ids= batches on a bounded pool."""
+    batches = [track_ids[i:i + BATCH_SIZE] for i in range(0, len(track_ids), BATCH_SIZE)]
+
+    def fetch(batch):
+        params = {"ids": ",".join(batch), "client_id": client_id}
+        return get_page(session, f"{API_V2}/tracks", params) or []
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        for api_tracks in pool.map(bind(fetch), batches):
+            incr("enrich.batch_calls")
+            for api_track in api_tracks:
+                if api_track.get("id"):
+                    cache["tracks"][str(api_track["id"])] = cache_entry(api_track)
+
+
+def merge(track, entry):
+    """Fill fields the track is missing from a cache entry; scraped values win."""
+    for name in FIELDS:
+        if track.get(name) in (None, "") and entry.get(name) not in (None, ""):
+            track[name] = entry[name]
+
+
+def enrich_tracks(tracks, client_id=None, data_dir=DATA_DIR):
+    """Enrich tracks in place. Returns the number of tracks that gained metadata."""
+    targets = [t for t in tracks if needs_enrichment(t)]
+    if not targets:
+        return 0
+
+    cache = load_cache(data_dir)
+    unresolved = sorted({t["url"] for t in targets
+                         if t.get("track_id") is None and t.get("url") and t["url"] not in cache["urls"]})
+    # Ids to fetch: the tracks' own, plus those of URLs resolved earlier
+    # whose cached entry has since expired
+    known_ids = {str(t["track_id"]) if t.get("track_id") is not None else cache["urls"].get(t.get("url"))
+                 for t in targets}
+    missing = sorted(str(k) for k in known_ids if k is not None and str(k) not in cache["tracks"])
+
+    if unresolved or missing:
+        client_id = client_id or get_client_id()
+        session = make_session()
+        with span("enrich.fetch"):
+            if unresolved:
+                print(f"Resolving {len(unresolved)} track URLs...")
+                resolve_urls(unresolved, client_id, session, cache)
+            if missing:
+                print(f"Fetching {len(missing)} tracks in batches of {BATCH_SIZE}...")
+                fetch_batches(missing, client_id, session, cache)
+        save_cache(cache, data_dir)
+
+    enriched = 0
+    for track in targets:
+        track_id = track.get("track_id")
+        key = str(track_id) if track_id is not None else cache["urls"].get(track.get("url"))
+        entry = cache["tracks"].get(key) if key else None
+        if entry:
+            merge(track, entry)
+            enriched += 1
+    incr("tracks.enriched", enriched)
+    print(f"Enriched {enriched}/{len(targets)} tracks "
+          f"({len(unresolved)} resolved, {len(missing)} fetched, rest from cache)")
+    return enriched
+
+
+def main():
+    print("=" * 60)
+    print("Track Enrichment")
+    print("=" * 60)
+
+    input_file = DATA_DIR / "soundcloud_likes.json"
+    if not input_file.exists():
+        print(f"Error: {input_file} not found")
+        return
+
+    with open(input_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    tracks = load_tracks(data.get('tracks', []))
+    print(f"Loaded {len(tracks)} tracks")
+
+    enrich_tracks(tracks)
+
+    data['tracks'] = tracks
+    data['enriched_at'] = datetime.now().isoformat()
+    with open(input_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, default=json_default)
+    record_file_written(input_file)
+
+    print(f"Saved to: {input_file}")
+    return data
+
+
+if __name__ == "__main__":
+    main()
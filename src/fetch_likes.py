@@ -5,22 +5,51 @@ Uses the discovered user ID to fetch likes via API v2.
 """
 
 import json
+import os
 import re
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
+from urllib.parse import parse_qs, urlencode, urlparse
 import requests
 
+from instrumentation import HTTP_HOOKS, bind, incr, record_file_written, span
+from rate_limit import get_limiter
+from track import Track, json_default
+
 OUTPUT_DIR = Path(__file__).parent.parent / "data"
 OUTPUT_DIR.mkdir(exist_ok=True)
 
-# User data from hydration
+# User data from hydration (the default account; other accounts must resolve)
+DEFAULT_USERNAME = "amr-farouk-10"
 USER_ID = 57658459
 USERNAME = "amrfarouk75"
 LIKES_COUNT = 316
 
-# API endpoints
-API_V2 = "https://api-v2.soundcloud.com"
+# Endpoints (overridable to point at a local stand-in, see benchmarks/fake_soundcloud.py)
+SOUNDCLOUD_URL = os.environ.get("SOUNDCLOUD_URL", "https://soundcloud.com")
+API_V2 = os.environ.get("SOUNDCLOUD_API_URL", "https://api-v2.soundcloud.com")
+
+# Likes paging: requests per second (burst = concurrency) and parallel windows
+RATE_LIMIT = float(os.environ.get("SOUNDCLOUD_RATE_LIMIT", "4"))
+MAX_CONCURRENCY = int(os.environ.get("SOUNDCLOUD_CONCURRENCY", "4"))
+MAX_RETRIES = 4
+# Shared by every fetch in the process (all accounts in multi-account mode)
+SOUNDCLOUD_LIMITER = get_limiter("soundcloud", RATE_LIMIT, MAX_CONCURRENCY)
+
+# client_id discovery costs ~10 requests; one is shared process-wide
+CLIENT_ID_MAX_AGE = 6 * 3600
+_client_id = {"value": None, "fetched_at": 0.0}
+_client_id_lock = threading.Lock()
+
+# Crawl checkpoint: cursor + client_id, with the tracks collected so far
+# appended page by page to a JSONL file next to it
+CHECKPOINT_FILE = "fetch_checkpoint.json"
+CHECKPOINT_TRACKS_FILE = "fetch_checkpoint.tracks.jsonl"
+CHECKPOINT_MAX_AGE = 12 * 3600  # older crawls restart so new likes aren't missed
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
@@ -31,23 +60,23 @@ HEADERS = {
 }
 
 
-def get_client_id():
+def discover_client_id():
     """Extract client_id from SoundCloud page scripts."""
     print("Extracting client_id...")
 
     # Fetch the main page
-    response = requests.get("https://soundcloud.com", headers=HEADERS)
+    response = requests.get(SOUNDCLOUD_URL, headers=HEADERS, hooks=HTTP_HOOKS)
     html = response.text
 
     # Find script URLs
-    script_pattern = r'src="(https://a-v2\.sndcdn\.com/assets/[^"]+\.js)"'
+    script_pattern = r'src="(https?://[^"]+/assets/[^"]+\.js)"'
     scripts = re.findall(script_pattern, html)
 
     print(f"Found {len(scripts)} script files to check...")
 
     for script_url in scripts[:10]:  # Check first 10 scripts
         try:
-            script_response = requests.get(script_url, headers=HEADERS, timeout=10)
+            script_response = requests.get(script_url, headers=HEADERS, timeout=10, hooks=HTTP_HOOKS)
             script_content = script_response.text
 
             # Look for client_id patterns
@@ -64,7 +93,7 @@ def get_client_id():
                     client_id = match.group(1)
                     # Validate by making a test request
                     test_url = f"{API_V2}/resolve?url=https://soundcloud.com/soundcloud&client_id={client_id}"
-                    test_response = requests.get(test_url, headers=HEADERS, timeout=5)
+                    test_response = requests.get(test_url, headers=HEADERS, timeout=5, hooks=HTTP_HOOKS)
                     if test_response.status_code == 200:
                         print(f"Found valid client_id: {client_id[:8]}...")
                         return client_id
@@ -74,104 +103,286 @@ def get_client_id():
     raise Exception("Could not find valid client_id")
 
 
-def fetch_likes(user_id, client_id, limit=200, max_tracks=5000):
-    """Fetch liked tracks for a user, up to max_tracks."""
-    all_tracks = []
-    offset = 0
-    page = 1
+def get_client_id(stale=None):
+    """Process-wide cached client_id.
+
+    Pass a client_id that just stopped working as `stale` to force a new
+    discovery; if another worker already replaced it, that one is returned.
+    """
+    with _client_id_lock:
+        value = _client_id["value"]
+        if value and value != stale and time.time() - _client_id["fetched_at"] < CLIENT_ID_MAX_AGE:
+            incr("fetch.client_id_cache_hits")
+            return value
+        _client_id.update(value=discover_client_id(), fetched_at=time.time())
+        return _client_id["value"]
+
+
+def make_session():
+    """HTTP session with a connection pool sized for concurrent page fetches."""
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=MAX_CONCURRENCY * 2)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.hooks["response"].extend(HTTP_HOOKS["response"])
+    return session
+
+
+def with_client_id(href, client_id):
+    """next_href values don't always carry the client_id; add it if missing."""
+    if "client_id=" in href:
+        return href
+    return f"{href}{'&' if '?' in href else '?'}client_id={client_id}"
+
+
+def replace_client_id(href, client_id):
+    """Swap the client_id of a saved cursor (e.g. after the old one expired)."""
+    parsed = urlparse(href)
+    query = [(k, v) for k, vs in parse_qs(parsed.query).items() for v in vs if k != "client_id"]
+    query.append(("client_id", client_id))
+    return parsed._replace(query=urlencode(query)).geturl()
+
+
+def numeric_offset(href):
+    """Return the offset of a next_href if it is a plain integer, else None."""
+    values = parse_qs(urlparse(href).query).get("offset")
+    if values and values[0].isdigit():
+        return int(values[0])
+    return None
 
-    while len(all_tracks) < max_tracks:
-        url = f"{API_V2}/users/{user_id}/likes"
-        params = {
-            "client_id": client_id,
-            "limit": limit,
-            "offset": offset,
-            "linked_partitioning": 1,
-        }
 
-        print(f"Fetching page {page} (offset {offset})...")
+def get_page(session, url, params=None):
+    """Fetch one likes page under the rate limit.
 
-        response = requests.get(url, params=params, headers=HEADERS)
+    Retries 429/5xx and truncated bodies with backoff. Returns the decoded
+    page, or None when the server refuses (e.g. 401) or keeps failing.
+    """
+    for attempt in range(MAX_RETRIES):
+        SOUNDCLOUD_LIMITER.acquire()
+        try:
+            response = session.get(url, params=params, timeout=30)
+        except requests.RequestException as e:
+            print(f"  Request failed: {e}")
+            time.sleep(2 ** attempt)
+            continue
 
         if response.status_code == 401:
             print("Unauthorized - client_id may be invalid")
-            break
-        elif response.status_code != 200:
+            return None
+        if response.status_code == 429 or response.status_code >= 500:
+            retry_after = response.headers.get("Retry-After", "")
+            wait = float(retry_after) if retry_after.isdigit() else 2 ** attempt
+            print(f"  HTTP {response.status_code}, retrying in {wait:.0f}s")
+            time.sleep(wait)
+            continue
+        if response.status_code != 200:
             print(f"Error: HTTP {response.status_code}")
             print(response.text[:500])
-            break
-
-        data = response.json()
-        collection = data.get("collection", [])
-
-        if not collection:
-            print("No more items in collection")
-            break
-
-        for item in collection:
-            track = item.get("track")
-            if track:
-                all_tracks.append({
-                    "title": track.get("title", "Unknown"),
-                    "artist": track.get("user", {}).get("username", "Unknown"),
-                    "artist_id": track.get("user", {}).get("id"),
-                    "url": track.get("permalink_url"),
-                    "duration_ms": track.get("duration"),
-                    "duration": format_duration(track.get("duration")),
-                    "plays": track.get("playback_count"),
-                    "likes": track.get("likes_count"),
-                    "reposts": track.get("reposts_count"),
-                    "comments": track.get("comment_count"),
-                    "genre": track.get("genre"),
-                    "tag_list": track.get("tag_list", ""),
-                    "description": (track.get("description") or "")[:500],
-                    "created_at": track.get("created_at"),
-                    "artwork_url": track.get("artwork_url"),
-                    "waveform_url": track.get("waveform_url"),
-                    "track_id": track.get("id"),
-                    "liked_at": item.get("created_at"),
-                })
+            return None
 
-        print(f"  Collected {len(all_tracks)} tracks total")
+        try:
+            return response.json()
+        except ValueError:
+            print("  Truncated page, retrying")
+            time.sleep(2 ** attempt)
 
-        # Check for next page
-        next_href = data.get("next_href")
-        if not next_href:
-            print("No more pages")
-            break
+    print(f"Giving up on {url} after {MAX_RETRIES} attempts")
+    return None
 
-        offset += limit
-        page += 1
-        time.sleep(0.5)  # Rate limiting
 
-    return all_tracks
+def iter_like_pages(user_id, client_id, limit=200, max_tracks=5000, start_href=None,
+                    concurrency=MAX_CONCURRENCY, session=None):
+    """Yield (collection, next_href) for each likes page, in order.
 
+    Pages are pipelined: the request for the next page is in flight while
+    the caller processes the current one. next_href cursors are followed as
+    returned; when the API hands out plain numeric offsets, up to
+    `concurrency` offset windows are fetched in parallel. All requests go
+    through SOUNDCLOUD_LIMITER. `next_href` is the cursor to resume after
+    the yielded page (None on the last page).
 
-def format_duration(ms):
-    """Convert milliseconds to MM:SS format."""
-    if not ms:
+    Raises if a page can't be fetched, so callers can tell a failed crawl
+    from a finished one.
+    """
+    session = session or make_session()
+    if start_href:
+        first_url, first_params = with_client_id(start_href, client_id), None
+    else:
+        first_url = f"{API_V2}/users/{user_id}/likes"
+        first_params = {"client_id": client_id, "limit": limit, "offset": 0, "linked_partitioning": 1}
+
+    fetch_page = bind(get_page)
+    fetched = 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        pending = deque([pool.submit(fetch_page, session, first_url, first_params)])
+        next_offset = None
+        windowed = False
+
+        while pending:
+            data = pending.popleft().result()
+            if data is None:
+                for future in pending:
+                    future.cancel()
+                raise Exception(f"Likes page failed after {fetched} tracks")
+            collection = data.get("collection", [])
+            next_href = data.get("next_href")
+            fetched += len(collection)
+
+            if not collection:
+                return
+
+            more = bool(next_href) and fetched < max_tracks
+            if more and not windowed and not pending:
+                offset = numeric_offset(next_href)
+                if offset is not None and concurrency > 1:
+                    # Offset windows: the page boundaries are known up front
+                    windowed = True
+                    next_offset = offset
+                else:
+                    pending.append(pool.submit(fetch_page, session, with_client_id(next_href, client_id)))
+
+            if windowed:
+                in_flight = fetched + len(pending) * limit
+                while len(pending) < concurrency and in_flight < max_tracks:
+                    params = {"client_id": client_id, "limit": limit, "offset": next_offset,
+                              "linked_partitioning": 1}
+                    pending.append(pool.submit(fetch_page, session, f"{API_V2}/users/{user_id}/likes", params))
+                    next_offset += limit
+                    in_flight += limit
+                if not next_href:
+                    for future in pending:
+                        future.cancel()
+                    pending.clear()
+
+            yield collection, (next_href if more else None)
+            if not more:
+                return
+
+
+def load_checkpoint(out_dir, username):
+    """Return a resumable checkpoint for `username` (with its tracks), or None."""
+    path = Path(out_dir) / CHECKPOINT_FILE
+    if not path.exists():
         return None
-    seconds = ms // 1000
-    minutes = seconds // 60
-    secs = seconds % 60
-    if minutes >= 60:
-        hours = minutes // 60
-        mins = minutes % 60
-        return f"{hours}:{mins:02d}:{secs:02d}"
-    return f"{minutes}:{secs:02d}"
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+    if checkpoint.get("username") != username or not checkpoint.get("next_href"):
+        return None
+    if time.time() - checkpoint.get("updated_at", 0) > CHECKPOINT_MAX_AGE:
+        print("Discarding stale fetch checkpoint")
+        clear_checkpoint(out_dir)
+        return None
+
+    # Lines past track_count belong to a page whose checkpoint never landed
+    # (possibly cut off mid-line); they are truncated away so the next page
+    # is appended after the last checkpointed track
+    tracks = []
+    tracks_path = Path(out_dir) / CHECKPOINT_TRACKS_FILE
+    try:
+        if tracks_path.exists():
+            with open(tracks_path, 'r+b') as f:
+                end = 0
+                while len(tracks) < checkpoint["track_count"]:
+                    line = f.readline()
+                    if not line.endswith(b"\n"):
+                        break
+                    tracks.append(Track.from_dict(json.loads(line.decode('utf-8'))))
+                    end = f.tell()
+                f.truncate(end)
+    except (OSError, ValueError):
+        tracks = []
+    if len(tracks) != checkpoint["track_count"]:
+        print("Fetch checkpoint is incomplete, starting over")
+        clear_checkpoint(out_dir)
+        return None
+
+    checkpoint["tracks"] = tracks
+    return checkpoint
+
+
+def save_checkpoint(out_dir, checkpoint, page_tracks):
+    """Append one page of tracks, then atomically advance the cursor."""
+    out_dir = Path(out_dir)
+    with open(out_dir / CHECKPOINT_TRACKS_FILE, 'a', encoding='utf-8') as f:
+        for track in page_tracks:
+            f.write(json.dumps(track.to_dict(), ensure_ascii=False) + "\n")
+
+    state = {k: v for k, v in checkpoint.items() if k != "tracks"}
+    state["updated_at"] = time.time()
+    path = out_dir / CHECKPOINT_FILE
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def clear_checkpoint(out_dir):
+    """Remove the checkpoint after a finished (or abandoned) crawl."""
+    for name in (CHECKPOINT_FILE, CHECKPOINT_TRACKS_FILE):
+        path = Path(out_dir) / name
+        if path.exists():
+            path.unlink()
+
+
+def fetch_likes(user_id, client_id, limit=200, max_tracks=5000, concurrency=MAX_CONCURRENCY,
+                checkpoint_dir=None, resume=None, checkpoint_meta=None):
+    """Fetch liked tracks for a user, up to max_tracks.
+
+    With `checkpoint_dir`, progress is saved after every page (plus the
+    fields in `checkpoint_meta`); pass the checkpoint from load_checkpoint
+    as `resume` to continue a failed crawl.
+    """
+    all_tracks = list(resume["tracks"]) if resume else []
+    start_href = replace_client_id(resume["next_href"], client_id) if resume else None
+    page = resume.get("page", 0) if resume else 0
+    if resume:
+        print(f"Resuming from checkpoint: {len(all_tracks)} tracks, page {page}")
+    elif checkpoint_dir:
+        clear_checkpoint(checkpoint_dir)
+
+    if len(all_tracks) >= max_tracks:
+        return all_tracks[:max_tracks]
+
+    pages = iter_like_pages(user_id, client_id, limit, max_tracks - len(all_tracks),
+                            start_href=start_href, concurrency=concurrency)
+    for collection, next_href in pages:
+        page += 1
+        print(f"Fetched page {page} ({len(collection)} items)")
+
+        page_tracks = [t for t in map(Track.from_api, collection) if t]
+        all_tracks.extend(page_tracks)
+
+        if checkpoint_dir and next_href:
+            save_checkpoint(checkpoint_dir, {
+                **(checkpoint_meta or {}),
+                "user_id": user_id,
+                "client_id": client_id,
+                "next_href": next_href,
+                "page": page,
+                "track_count": len(all_tracks),
+            }, page_tracks)
+
+        print(f"  Collected {len(all_tracks)} tracks total")
+
+    return all_tracks[:max_tracks]
 
 
 def resolve_user(username, client_id):
     """Resolve username to user ID"""
     url = f"{API_V2}/resolve"
     params = {"url": f"https://soundcloud.com/{username}", "client_id": client_id}
-    response = requests.get(url, params=params, headers=HEADERS)
+    SOUNDCLOUD_LIMITER.acquire()
+    response = requests.get(url, params=params, headers=HEADERS, hooks=HTTP_HOOKS)
     if response.status_code == 200:
         return response.json()
     return None
 
 
-def fetch_all_likes(username="amr-farouk-10", max_tracks=10000, output_dir=None):
+def fetch_all_likes(username=DEFAULT_USERNAME, max_tracks=10000, output_dir=None):
     """Main function to fetch all likes for a username"""
     print("=" * 60)
     print("SoundCloud Likes Fetcher")
@@ -181,28 +392,54 @@ def fetch_all_likes(username="amr-farouk-10", max_tracks=10000, output_dir=None)
         out_dir = Path(output_dir)
     else:
         out_dir = OUTPUT_DIR
-    out_dir.mkdir(exist_ok=True)
+    out_dir.mkdir(parents=True, exist_ok=True)
 
     try:
-        # Get client_id
-        client_id = get_client_id()
-
-        # Resolve username to user ID
-        print(f"\nResolving user: {username}")
-        user_data = resolve_user(username, client_id)
-        if not user_data:
-            # Fallback to known user
-            user_id = USER_ID
-            resolved_username = USERNAME
-        else:
-            user_id = user_data.get("id", USER_ID)
-            resolved_username = user_data.get("username", username)
-
-        print(f"User ID: {user_id}")
-
-        # Fetch likes
-        print(f"\nFetching liked tracks (max {max_tracks})...")
-        tracks = fetch_likes(user_id, client_id, max_tracks=max_tracks)
+        checkpoint = load_checkpoint(out_dir, username)
+        stale_client_id = None
+        for attempt in range(2):
+            if checkpoint and attempt == 0:
+                # Reuse the crawl's client_id and user; refreshed below on failure
+                client_id = checkpoint["client_id"]
+                user_id = checkpoint["user_id"]
+                resolved_username = checkpoint.get("resolved_username", username)
+            else:
+                # Get client_id
+                with span("fetch.client_id"):
+                    client_id = get_client_id(stale=stale_client_id)
+
+                # Resolve username to user ID
+                print(f"\nResolving user: {username}")
+                with span("fetch.resolve"):
+                    user_data = resolve_user(username, client_id)
+                if not user_data and username != DEFAULT_USERNAME:
+                    raise Exception(f"Could not resolve user {username}")
+                if not user_data:
+                    # Fallback to known user
+                    user_id = USER_ID
+                    resolved_username = USERNAME
+                else:
+                    user_id = user_data.get("id", USER_ID)
+                    resolved_username = user_data.get("username", username)
+
+            print(f"User ID: {user_id}")
+
+            # Fetch likes
+            print(f"\nFetching liked tracks (max {max_tracks})...")
+            try:
+                with span("fetch.likes"):
+                    tracks = fetch_likes(user_id, client_id, max_tracks=max_tracks,
+                                         checkpoint_dir=out_dir, resume=checkpoint,
+                                         checkpoint_meta={"username": username,
+                                                          "resolved_username": resolved_username})
+                break
+            except Exception as e:
+                checkpoint = load_checkpoint(out_dir, username)
+                if attempt or not checkpoint:
+                    raise
+                # Pages so far are on disk; retry the rest with a fresh client_id
+                stale_client_id = client_id
+                print(f"\nFetch failed ({e}), resuming with a new client_id...")
 
         # Save results
         output = {
@@ -216,7 +453,9 @@ def fetch_all_likes(username="amr-farouk-10", max_tracks=10000, output_dir=None)
 
         output_file = out_dir / "soundcloud_likes.json"
         with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(output, f, ensure_ascii=False, indent=2)
+            json.dump(output, f, ensure_ascii=False, indent=2, default=json_default)
+        record_file_written(output_file)
+        clear_checkpoint(out_dir)
 
         print("\n" + "=" * 60)
         print(f"SUCCESS: Collected {len(tracks)} liked tracks")
@@ -8,14 +8,92 @@ import os
 import json
 import time
 import hashlib
+import threading
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable
 import requests
 
+from instrumentation import HTTP_HOOKS, incr, record_file_written, record_groq, record_span, span
+from preset_export import export_bundle
+from cluster_consolidation import consolidate_clusters
+from cluster_rules import compile_keywords
+from dedup import find_groups, representative_of, save_duplicate_groups
+from json_stream import ArrayItems
+from llm_schema import compile_schema, loads_repaired, parse_reply
+from prompt_packing import BatchSizer, MIN_BATCH_TRACKS, estimate_tokens, pack_tracks
+from rate_limit import get_limiter
+from text_normalize import normalized
+from track import json_default, load_tracks
+from track_gains import GAINS_FILE, save_track_gains
+
 # Groq API configuration
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+GROQ_API_URL = os.environ.get("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
 GROQ_MODEL = "llama-3.1-70b-versatile"
 
+# Requests per second across every worker in the process
+GROQ_RATE_LIMIT = float(os.environ.get("GROQ_RATE_LIMIT", "2"))
+GROQ_LIMITER = get_limiter("groq", GROQ_RATE_LIMIT)
+
+# Completions cached by request hash, shared by all accounts
+GROQ_CACHE_DIR = os.environ.get("GROQ_CACHE_DIR", os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "groq_cache"))
+GROQ_CACHE_MAX_AGE = 7 * 86400
+
+# EQ presets: bands, allowed gain (dB) and clusters per preset request
+EQ_BANDS = [32, 64, 125, 250, 500, 1000, 2000, 4000, 8000, 16000]
+MAX_GAIN_DB = 6
+PRESETS_PER_CALL = 20
+
+# Stream discovery replies (server-sent events) and use clusters as they complete
+GROQ_STREAM = os.environ.get("GROQ_STREAM", "1") != "0"
+
+# Reply schemas (see llm_schema): coerced and checked locally before use
+_LEVEL = {"type": "string", "enum": ["low", "medium", "high"], "default": "medium"}
+DISCOVERED_CLUSTER = compile_schema({
+    "type": "object",
+    "properties": {
+        "cluster_id": {"type": "string"},
+        "name": {"type": "string"},
+        "description": {"type": "string", "default": ""},
+        "keywords": {"type": "array", "items": {"type": "string"}, "default": []},
+        "audio_characteristics": {
+            "type": "object",
+            "properties": {
+                "bass_emphasis": _LEVEL,
+                "vocal_presence": _LEVEL,
+                "energy_level": {"type": "string", "enum": ["calm", "moderate", "energetic"], "default": "moderate"},
+            },
+            "default": {},
+        },
+        "matching_track_indices": {"type": "array", "items": {"type": "integer"}, "default": []},
+    },
+    "required": ["cluster_id", "name"],
+})
+EQ_PRESET = compile_schema({
+    "type": "object",
+    "properties": {
+        "preset_name": {"type": "string", "default": ""},
+        "eq_settings": {
+            "type": "object",
+            "properties": {str(f): {"type": "number", "minimum": -MAX_GAIN_DB, "maximum": MAX_GAIN_DB}
+                           for f in EQ_BANDS},
+            "required": [str(f) for f in EQ_BANDS],
+            "additionalProperties": False,
+        },
+        "description": {"type": "string", "default": ""},
+        "characteristics": {"type": "array", "items": {"type": "string"}, "default": []},
+    },
+    "required": ["eq_settings"],
+})
+PRESET_BATCH = compile_schema({
+    "type": "object",
+    "properties": {"presets": {"type": "object"}},
+    "required": ["presets"],
+})
+
+# Discovery calls per run (each packs as many tracks as its token budget allows)
+MAX_DISCOVERY_BATCHES = 10
+
 def get_groq_api_key() -> str:
     """Get Groq API key from environment or file"""
     key = os.environ.get("GROQ_API_KEY")
@@ -34,63 +112,185 @@ def get_groq_api_key() -> str:
     raise ValueError("GROQ_API_KEY not found in environment or .env file")
 
 
-def call_groq(prompt: str, system_prompt: str = None, max_tokens: int = 4096) -> str:
-    """Call Groq API with retry logic"""
-    api_key = get_groq_api_key()
+def _cache_path(payload: Dict) -> str:
+    key = hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+    return os.path.join(GROQ_CACHE_DIR, key[:2], f"{key}.json")
+
+
+def load_cached_completion(payload: Dict):
+    """Cached completion text for an identical request, or None."""
+    path = _cache_path(payload)
+    try:
+        if time.time() - os.path.getmtime(path) > GROQ_CACHE_MAX_AGE:
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)["content"]
+    except (OSError, ValueError, KeyError):
+        return None
+
 
+def save_cached_completion(payload: Dict, content: str):
+    path = _cache_path(payload)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"model": payload["model"], "content": content}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"  Could not cache Groq response: {e}")
+
+
+def _groq_payload(prompt: str, system_prompt: str = None, max_tokens: int = 4096, json_mode: bool = False) -> Dict:
     messages = []
     if system_prompt:
         messages.append({"role": "system", "content": system_prompt})
     messages.append({"role": "user", "content": prompt})
 
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-
     payload = {
         "model": GROQ_MODEL,
         "messages": messages,
         "max_tokens": max_tokens,
         "temperature": 0.3
     }
+    if json_mode:
+        # The API then only returns a syntactically valid JSON object
+        payload["response_format"] = {"type": "json_object"}
+    return payload
+
+
+def _groq_headers() -> Dict:
+    return {
+        "Authorization": f"Bearer {get_groq_api_key()}",
+        "Content-Type": "application/json"
+    }
+
+
+def call_groq(prompt: str, system_prompt: str = None, max_tokens: int = 4096, meta: Dict = None,
+              json_mode: bool = False) -> str:
+    """Call Groq API with retry logic (identical requests are served from cache)
+
+    `meta`, if given, is filled with the reply's finish_reason, latency (s)
+    and prompt_tokens. json_mode requests a JSON object reply.
+    """
+
+    payload = _groq_payload(prompt, system_prompt, max_tokens, json_mode)
+
+    cached = load_cached_completion(payload)
+    if cached is not None:
+        incr("groq.cache_hits")
+        if meta is not None:
+            meta.update(finish_reason="stop", latency=0.0)
+        return cached
+
+    headers = _groq_headers()
 
     for attempt in range(3):
         try:
-            response = requests.post(GROQ_API_URL, headers=headers, json=payload, timeout=60)
+            GROQ_LIMITER.acquire()
+            start = time.perf_counter_ns()
+            response = requests.post(GROQ_API_URL, headers=headers, json=payload, timeout=60, hooks=HTTP_HOOKS)
             response.raise_for_status()
-            return response.json()["choices"][0]["message"]["content"]
+            data = response.json()
+            elapsed = time.perf_counter_ns() - start
+            record_groq(data.get("usage"), elapsed)
+            choice = data["choices"][0]
+            content = choice["message"]["content"]
+            if meta is not None:
+                meta.update(finish_reason=choice.get("finish_reason"), latency=elapsed / 1e9,
+                            prompt_tokens=(data.get("usage") or {}).get("prompt_tokens"))
+            # A reply cut off at max_tokens is not worth replaying
+            if choice.get("finish_reason") != "length":
+                save_cached_completion(payload, content)
+            return content
         except Exception as e:
             print(f"  Groq API attempt {attempt + 1} failed: {e}")
+            incr("groq.errors")
             if attempt < 2:
                 time.sleep(2 ** attempt)
 
     raise Exception("Groq API failed after 3 attempts")
 
 
-def analyze_track_batch(tracks: List[Dict], batch_num: int) -> Dict[str, Any]:
-    """Analyze a batch of tracks using Groq to identify genre/mood patterns"""
+def stream_groq(prompt: str, system_prompt: str = None, max_tokens: int = 4096, meta: Dict = None):
+    """Yield the completion text as it is generated (server-sent events)
+
+    Shares call_groq's cache: a cached completion is yielded in one piece.
+    Failed attempts are retried until text has been yielded; a stream that
+    breaks after that just ends with finish_reason "error" in `meta`, and the
+    caller keeps what arrived.
+    """
+
+    payload = _groq_payload(prompt, system_prompt, max_tokens)
+
+    cached = load_cached_completion(payload)
+    if cached is not None:
+        incr("groq.cache_hits")
+        if meta is not None:
+            meta.update(finish_reason="stop", latency=0.0)
+        yield cached
+        return
+
+    headers = _groq_headers()
+
+    for attempt in range(3):
+        received = []
+        finish_reason = usage = None
+        try:
+            GROQ_LIMITER.acquire()
+            start = time.perf_counter_ns()
+            with requests.post(GROQ_API_URL, headers=headers, json=dict(payload, stream=True), timeout=60,
+                               stream=True, hooks=HTTP_HOOKS) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line.startswith(b"data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == b"[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    # Groq reports usage on the last chunk under x_groq
+                    usage = chunk.get("usage") or (chunk.get("x_groq") or {}).get("usage") or usage
+                    choice = (chunk.get("choices") or [{}])[0]
+                    finish_reason = choice.get("finish_reason") or finish_reason
+                    text = (choice.get("delta") or {}).get("content")
+                    if text:
+                        if not received:
+                            record_span("groq.first_token", time.perf_counter_ns() - start)
+                        received.append(text)
+                        yield text
+        except Exception as e:
+            print(f"  Groq API attempt {attempt + 1} failed: {e}")
+            incr("groq.errors")
+            if not received:
+                if attempt < 2:
+                    time.sleep(2 ** attempt)
+                continue
+            finish_reason = "error"
+
+        elapsed = time.perf_counter_ns() - start
+        record_groq(usage, elapsed)
+        if meta is not None:
+            meta.update(finish_reason=finish_reason, latency=elapsed / 1e9,
+                        prompt_tokens=(usage or {}).get("prompt_tokens"))
+        if finish_reason == "stop":
+            save_cached_completion(payload, "".join(received))
+        return
+
+    raise Exception("Groq API failed after 3 attempts")
 
-    # Prepare track summaries for analysis
-    track_summaries = []
-    for t in tracks[:50]:  # Limit batch size for API
-        summary = {
-            "title": t.get("title", "")[:100],
-            "artist": t.get("artist", "")[:50],
-            "genre": t.get("genre", ""),
-            "tags": t.get("tags", [])[:5] if isinstance(t.get("tags"), list) else []
-        }
-        track_summaries.append(summary)
 
-    system_prompt = """You are a music classification expert specializing in Arabic, Middle Eastern, and world music.
+DISCOVERY_SYSTEM_PROMPT = """You are a music classification expert specializing in Arabic, Middle Eastern, and world music.
 Analyze the provided tracks and identify distinct musical clusters/categories.
 Focus on: genre, mood, instrumentation, cultural origin, and audio characteristics.
 Return valid JSON only, no markdown."""
 
-    prompt = f"""Analyze these {len(track_summaries)} tracks and identify 2-4 distinct clusters they might belong to.
 
-Tracks:
-{json.dumps(track_summaries, ensure_ascii=False, indent=2)}
+def discovery_prompt(tracks: List[Dict]) -> str:
+    """Cluster discovery prompt for a batch (tracks packed as tab-separated rows)"""
+    return f"""Analyze these {len(tracks)} tracks and identify 2-4 distinct clusters they might belong to.
+
+{pack_tracks(tracks)}
 
 Return a JSON object with this structure:
 {{
@@ -110,17 +310,73 @@ Return a JSON object with this structure:
   ]
 }}"""
 
+
+def analyze_track_batch(tracks: List[Dict], batch_num: int, meta: Dict = None,
+                        on_cluster: Callable[[Dict], None] = None) -> Dict[str, Any]:
+    """Analyze a batch of tracks using Groq to identify genre/mood patterns
+
+    The reply is parsed as it streams in: each identified cluster is passed
+    to `on_cluster` as soon as it is complete, and a reply cut off early
+    still yields the clusters before the cut. `meta` receives the call's
+    details (see call_groq), its estimated_tokens and failed=True when a
+    reply arrived but was incomplete.
+
+    Each cluster is repaired and checked against DISCOVERED_CLUSTER; ones
+    that don't fit are dropped. Whole replies are requested in JSON mode
+    (the API doesn't combine it with streaming).
+    """
+    meta = {} if meta is None else meta
+    prompt = discovery_prompt(tracks)
+    meta["estimated_tokens"] = estimate_tokens(DISCOVERY_SYSTEM_PROMPT) + estimate_tokens(prompt)
+    parser = ArrayItems("identified_clusters", lambda text: DISCOVERED_CLUSTER(loads_repaired(text)))
+    clusters = []
+
     try:
-        response = call_groq(prompt, system_prompt)
-        # Extract JSON from response
-        if "```json" in response:
-            response = response.split("```json")[1].split("```")[0]
-        elif "```" in response:
-            response = response.split("```")[1].split("```")[0]
-        return json.loads(response.strip())
+        if GROQ_STREAM:
+            pieces = stream_groq(prompt, DISCOVERY_SYSTEM_PROMPT, meta=meta)
+        else:
+            pieces = [call_groq(prompt, DISCOVERY_SYSTEM_PROMPT, meta=meta, json_mode=True)]
+        for text in pieces:
+            for cluster in parser.feed(text):
+                clusters.append(cluster)
+                if on_cluster:
+                    on_cluster(cluster)
     except Exception as e:
         print(f"  Batch {batch_num} analysis failed: {e}")
-        return {"identified_clusters": []}
+
+    if parser.invalid:
+        print(f"  Batch {batch_num}: dropped {parser.invalid} malformed clusters")
+        incr("llm.invalid", parser.invalid)
+    if not parser.complete:
+        meta["failed"] = True
+        if clusters:
+            print(f"  Batch {batch_num} reply incomplete, kept {len(clusters)} clusters")
+            incr("groq.partial_replies")
+    return {"identified_clusters": clusters}
+
+
+def flat_eq_preset(cluster: Dict) -> Dict:
+    return {
+        "preset_name": f"{cluster['name']} EQ",
+        "eq_settings": {str(f): 0 for f in EQ_BANDS},
+        "description": "Default flat EQ preset",
+        "characteristics": ["Flat response", "Reference quality"]
+    }
+
+
+def validate_eq_preset(preset: Any, cluster: Dict) -> Dict:
+    """Preset checked against EQ_PRESET (all EQ_BANDS, gains within +/-MAX_GAIN_DB), or None
+
+    Numbers sent as strings and "1000Hz"-style band keys are coerced;
+    missing name/description/characteristics are filled in.
+    """
+    try:
+        preset = EQ_PRESET(preset)
+    except ValueError:
+        return None
+    preset["preset_name"] = preset["preset_name"] or f"{cluster['name']} EQ"
+    preset["eq_settings"] = {str(f): preset["eq_settings"][str(f)] for f in EQ_BANDS}
+    return preset
 
 
 def generate_eq_preset_with_ai(cluster: Dict) -> Dict:
@@ -158,21 +414,77 @@ Return JSON with this exact structure:
 }}"""
 
     try:
-        response = call_groq(prompt, system_prompt, max_tokens=1024)
-        if "```json" in response:
-            response = response.split("```json")[1].split("```")[0]
-        elif "```" in response:
-            response = response.split("```")[1].split("```")[0]
-        return json.loads(response.strip())
+        response = call_groq(prompt, system_prompt, max_tokens=1024, json_mode=True)
+        preset = validate_eq_preset(parse_reply(response), cluster)
+        if preset is None:
+            incr("llm.invalid")
+            raise ValueError("eq_settings missing bands or outside the gain range")
+        return preset
     except Exception as e:
         print(f"  EQ generation failed for {cluster['name']}: {e}")
+        incr("groq.preset_fallbacks")
         # Return default flat EQ
-        return {
-            "preset_name": f"{cluster['name']} EQ",
-            "eq_settings": {str(f): 0 for f in [32, 64, 125, 250, 500, 1000, 2000, 4000, 8000, 16000]},
-            "description": "Default flat EQ preset",
-            "characteristics": ["Flat response", "Reference quality"]
-        }
+        return flat_eq_preset(cluster)
+
+
+def generate_eq_presets_batch(clusters: List[Dict]) -> Dict[str, Dict]:
+    """EQ presets for many clusters from one Groq request per PRESETS_PER_CALL clusters
+
+    Returns {cluster_id: preset}. Each preset in the keyed reply is
+    validated; clusters whose preset is missing or invalid are retried
+    one at a time with generate_eq_preset_with_ai.
+    """
+
+    system_prompt = f"""You are an audio engineer specializing in EQ optimization.
+Generate optimal 10-band parametric EQ settings for each described music type.
+Frequencies: {", ".join(str(f) for f in EQ_BANDS)} Hz
+Gain range: -{MAX_GAIN_DB} to +{MAX_GAIN_DB} dB
+Return valid JSON only."""
+
+    presets = {}
+    for start in range(0, len(clusters), PRESETS_PER_CALL):
+        chunk = clusters[start:start + PRESETS_PER_CALL]
+        rows = "\n".join(
+            "\t".join([c["cluster_id"], " ".join(str(c.get("name", "")).split()),
+                       " ".join(str(c.get("description", "")).split())]
+                      + [str((c.get("audio_characteristics") or {}).get(k, ""))
+                         for k in ("bass_emphasis", "vocal_presence", "energy_level")])
+            for c in chunk
+        )
+        prompt = f"""Generate an optimal EQ preset for each of these {len(chunk)} music clusters.
+
+Clusters (cluster_id\tname\tdescription\tbass_emphasis\tvocal_presence\tenergy_level):
+{rows}
+
+Return a JSON object keyed by cluster_id, one entry per cluster:
+{{
+  "presets": {{
+    "<cluster_id>": {{
+      "preset_name": "Name EQ",
+      "eq_settings": {{{", ".join(f'"{f}": 0' for f in EQ_BANDS)}}},
+      "description": "Technical description of why these settings work",
+      "characteristics": ["char1", "char2", "char3"]
+    }}
+  }}
+}}"""
+
+        try:
+            response = call_groq(prompt, system_prompt, max_tokens=min(8192, 256 + 200 * len(chunk)),
+                                 json_mode=True)
+            returned = parse_reply(response, PRESET_BATCH)["presets"]
+        except Exception as e:
+            print(f"  Batched EQ generation failed: {e}")
+            returned = {}
+
+        for cluster in chunk:
+            preset = validate_eq_preset(returned.get(cluster["cluster_id"]), cluster)
+            if preset is None:
+                print(f"  Retrying preset for {cluster['name']} on its own...")
+                incr("groq.preset_retries")
+                preset = generate_eq_preset_with_ai(cluster)
+            presets[cluster["cluster_id"]] = preset
+
+    return presets
 
 
 def classify_track_with_ai(track: Dict, clusters: List[Dict]) -> str:
@@ -193,24 +505,36 @@ Track:
 Clusters:
 {cluster_options}
 
-Return ONLY the cluster_id (e.g., "arabic_classical"), nothing else."""
+Return a JSON object with the chosen cluster_id, e.g. {{"cluster_id": "arabic_classical"}}"""
 
+    # Only a known id (matched ignoring case and separators) is accepted
+    schema = compile_schema({
+        "type": "object",
+        "properties": {"cluster_id": {"type": "string", "enum": [c["cluster_id"] for c in clusters]}},
+        "required": ["cluster_id"],
+    })
     try:
-        response = call_groq(prompt, max_tokens=50)
-        cluster_id = response.strip().strip('"').lower().replace(" ", "_")
-        # Validate it's a known cluster
-        known_ids = [c['cluster_id'] for c in clusters]
-        if cluster_id in known_ids:
-            return cluster_id
-        # Fuzzy match
-        for cid in known_ids:
-            if cid in cluster_id or cluster_id in cid:
-                return cid
-        return "uncategorized"
-    except:
+        response = call_groq(prompt, max_tokens=50, json_mode=True)
+        return parse_reply(response, schema)["cluster_id"]
+    except Exception:
         return "uncategorized"
 
 
+def cluster_key(cluster: Dict) -> str:
+    return str(cluster.get("cluster_id", "")).lower().replace(" ", "_")
+
+
+def consolidate_cluster(cluster_map: Dict[str, Dict], cluster: Dict):
+    """Add an identified cluster to cluster_map, merging keywords into a known id"""
+    cid = cluster_key(cluster)
+    if cid and cid not in cluster_map:
+        cluster_map[cid] = cluster
+    elif cid in cluster_map:
+        # Merge keywords
+        existing = cluster_map[cid]
+        existing["keywords"] = list(set(existing.get("keywords", []) + cluster.get("keywords", [])))
+
+
 def dynamic_cluster_tracks(tracks: List[Dict], data_dir: str = "data") -> Dict:
     """Main function: Dynamically cluster tracks using Groq AI"""
 
@@ -219,31 +543,42 @@ def dynamic_cluster_tracks(tracks: List[Dict], data_dir: str = "data") -> Dict:
     print(f"{'='*60}")
     print(f"Total tracks to analyze: {len(tracks)}")
 
-    # Step 1: Analyze sample batches to identify clusters
-    print("\n[1/4] Analyzing track samples to identify clusters...")
-    all_identified = []
-    batch_size = 50
-    num_batches = min(10, len(tracks) // batch_size)  # Analyze up to 10 batches
-
-    for i in range(num_batches):
-        start_idx = i * batch_size
-        batch = tracks[start_idx:start_idx + batch_size]
-        print(f"  Analyzing batch {i+1}/{num_batches}...")
-        result = analyze_track_batch(batch, i+1)
-        all_identified.extend(result.get("identified_clusters", []))
-        time.sleep(0.5)  # Rate limiting
-
-    # Step 2: Consolidate clusters
-    print("\n[2/4] Consolidating cluster definitions...")
+    # Step 1: Group re-uploads/versions; only one track per group is analyzed and classified
+    print("\n[1/5] Grouping near-duplicate tracks...")
+    duplicate_groups = find_groups(tracks)
+    representative = representative_of(len(tracks), duplicate_groups)
+    unique_tracks = [t for idx, t in enumerate(tracks) if representative[idx] == idx]
+    print(f"  {len(duplicate_groups)} groups, {len(tracks) - len(unique_tracks)} duplicates; "
+          f"{len(unique_tracks)} distinct tracks")
+
+    # Step 2: Analyze sample batches to identify clusters
+    print("\n[2/5] Analyzing track samples to identify clusters...")
     cluster_map = {}
-    for cluster in all_identified:
-        cid = cluster.get("cluster_id", "").lower().replace(" ", "_")
-        if cid and cid not in cluster_map:
-            cluster_map[cid] = cluster
-        elif cid in cluster_map:
-            # Merge keywords
-            existing = cluster_map[cid]
-            existing["keywords"] = list(set(existing.get("keywords", []) + cluster.get("keywords", [])))
+    sizer = BatchSizer()
+    overhead = estimate_tokens(DISCOVERY_SYSTEM_PROMPT) + estimate_tokens(discovery_prompt([]))
+    start_idx = 0
+
+    with span("groq.discover"):
+        for i in range(MAX_DISCOVERY_BATCHES):
+            count = sizer.take(unique_tracks, start_idx, overhead)
+            if count < MIN_BATCH_TRACKS:
+                break
+            batch = unique_tracks[start_idx:start_idx + count]
+            start_idx += count
+            print(f"  Analyzing batch {i+1} ({count} tracks)...")
+            meta = {}
+            # Clusters are consolidated as they stream in
+            analyze_track_batch(batch, i+1, meta, lambda cluster: consolidate_cluster(cluster_map, cluster))
+            sizer.observe(meta)
+            incr("groq.discovery_tracks", count)
+
+    # Step 3: Consolidate clusters
+    print("\n[3/5] Consolidating cluster definitions...")
+    # Batches name the same music differently (sufi_music / spiritual_sufi);
+    # merge look-alikes so each gets one preset call
+    candidates = [c for cid, c in cluster_map.items() if cid != "uncategorized"]
+    cluster_map = {cluster_key(c): c for c in consolidate_clusters(candidates)}
+    print(f"  {len(candidates)} candidate clusters merged into {len(cluster_map)}")
 
     # Add uncategorized cluster
     cluster_map["uncategorized"] = {
@@ -257,47 +592,63 @@ def dynamic_cluster_tracks(tracks: List[Dict], data_dir: str = "data") -> Dict:
     clusters = list(cluster_map.values())
     print(f"  Identified {len(clusters)} unique clusters")
 
-    # Step 3: Classify all tracks (using keywords first, AI for ambiguous)
-    print("\n[3/4] Classifying tracks into clusters...")
+    # Step 4: Classify all tracks (using keywords first, AI for ambiguous)
+    print("\n[4/5] Classifying tracks into clusters...")
     clustered_tracks = {c["cluster_id"]: [] for c in clusters}
-
-    for idx, track in enumerate(tracks):
-        if idx % 500 == 0:
-            print(f"  Processing track {idx+1}/{len(tracks)}...")
-
-        # Try keyword matching first (faster)
-        title = (track.get("title", "") + " " + track.get("artist", "") + " " + track.get("genre", "")).lower()
-        matched = False
-
-        for cluster in clusters:
-            if cluster["cluster_id"] == "uncategorized":
-                continue
-            keywords = cluster.get("keywords", [])
-            for kw in keywords:
-                if kw.lower() in title:
-                    clustered_tracks[cluster["cluster_id"]].append(track)
-                    matched = True
-                    break
-            if matched:
-                break
-
-        if not matched:
-            clustered_tracks["uncategorized"].append(track)
-
-    # Step 4: Generate EQ presets for each cluster
-    print("\n[4/4] Generating AI-powered EQ presets...")
+    # AI-discovered definitions go through the same keyword compiler as the
+    # rules file; the stamp identifies this run's definitions on each track
+    cluster_keywords = {c["cluster_id"]: compile_keywords(c.get("keywords", [])) for c in clusters}
+    rules_stamp = "groq-" + hashlib.sha256(
+        json.dumps(cluster_keywords, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:12]
+
+    assigned = [None] * len(tracks)
+    with span("classify"):
+        for idx, track in enumerate(tracks):
+            if idx % 500 == 0:
+                print(f"  Processing track {idx+1}/{len(tracks)}...")
+
+            rep = representative[idx]
+            if rep != idx:
+                # Duplicates take their representative's cluster (classified earlier)
+                cid = assigned[rep]
+                scores = tracks[rep]["all_cluster_scores"]
+                track["duplicate_of"] = tracks[rep].get("track_id") or tracks[rep].get("url")
+            else:
+                # Score = keyword hits per cluster; the most hits wins (ties go
+                # to the earlier cluster), no hits leaves the track uncategorized
+                norm = normalized(track)
+                scores = {}
+                for cluster in clusters:
+                    if cluster["cluster_id"] == "uncategorized":
+                        continue
+                    hits = sum(1 for kw in cluster_keywords[cluster["cluster_id"]]
+                               if kw in norm.title or kw in norm.artist or kw in norm.genre)
+                    if hits:
+                        scores[cluster["cluster_id"]] = float(hits)
+                cid = max(scores, key=scores.get) if scores else "uncategorized"
+
+            assigned[idx] = cid
+            track["cluster"] = cid
+            track["cluster_score"] = scores.get(cid, 0)
+            track["all_cluster_scores"] = scores
+            track["rules_version"] = rules_stamp
+            clustered_tracks[cid].append(track)
+    incr("tracks.classified", len(tracks))
+
+    # Step 5: Generate EQ presets for each cluster
+    print("\n[5/5] Generating AI-powered EQ presets...")
     presets = []
     final_clusters = []
 
-    for cluster in clusters:
-        cid = cluster["cluster_id"]
-        track_count = len(clustered_tracks.get(cid, []))
-        if track_count == 0:
-            continue
+    active = [c for c in clusters if clustered_tracks.get(c["cluster_id"])]
+    print(f"  Generating presets for {len(active)} clusters in one request...")
+    with span("groq.preset"):
+        eq_presets = generate_eq_presets_batch(active)
 
-        print(f"  Generating preset for {cluster['name']} ({track_count} tracks)...")
-        eq_preset = generate_eq_preset_with_ai(cluster)
-        time.sleep(0.3)
+    for cluster in active:
+        cid = cluster["cluster_id"]
+        track_count = len(clustered_tracks[cid])
+        eq_preset = eq_presets[cid]
 
         # Build final cluster data
         cluster_tracks = clustered_tracks[cid]
@@ -344,6 +695,7 @@ def dynamic_cluster_tracks(tracks: List[Dict], data_dir: str = "data") -> Dict:
         "total_tracks": len(tracks),
         "cluster_count": len(final_clusters),
         "clustered_at": datetime.now().isoformat(),
+        "rules": {"stamp": rules_stamp, "source": "groq"},
         "clusters": final_clusters
     }
 
@@ -356,10 +708,12 @@ def dynamic_cluster_tracks(tracks: List[Dict], data_dir: str = "data") -> Dict:
     }
 
     with open(os.path.join(data_dir, "track_clusters.json"), "w", encoding="utf-8") as f:
-        json.dump(clusters_output, f, ensure_ascii=False, indent=2)
+        json.dump(clusters_output, f, ensure_ascii=False, indent=2, default=json_default)
+    record_file_written(os.path.join(data_dir, "track_clusters.json"))
 
     with open(os.path.join(data_dir, "eq_presets_detailed.json"), "w", encoding="utf-8") as f:
         json.dump(presets_output, f, ensure_ascii=False, indent=2)
+    record_file_written(os.path.join(data_dir, "eq_presets_detailed.json"))
 
     # Generate eqMac compatible format
     eqmac_presets = {
@@ -377,6 +731,22 @@ def dynamic_cluster_tracks(tracks: List[Dict], data_dir: str = "data") -> Dict:
 
     with open(os.path.join(data_dir, "eq_presets.json"), "w", encoding="utf-8") as f:
         json.dump(eqmac_presets, f, ensure_ascii=False, indent=2)
+    record_file_written(os.path.join(data_dir, "eq_presets.json"))
+
+    save_duplicate_groups(tracks, duplicate_groups, data_dir)
+
+    # Per-track gains: softmax blend of presets over each track's keyword hits
+    with span("presets.track_gains"):
+        gains_manifest = save_track_gains(
+            tracks, {p["cluster_id"]: {f: p["eq_settings"][str(f)] for f in EQ_BANDS} for p in presets},
+            EQ_BANDS, data_dir)
+    record_file_written(os.path.join(data_dir, GAINS_FILE))
+    print(f"  Per-track gains saved for {gains_manifest['count']} tracks")
+
+    # Export bundle (EqualizerAPO, AutoEq, eqMac, Wavelet, Poweramp)
+    bundle = export_bundle(presets, data_dir)
+    record_file_written(bundle["path"])
+    print(f"  Export bundle: {bundle['rendered']} presets rendered, {bundle['reused']} reused")
 
     print(f"\n{'='*60}")
     print("CLUSTERING COMPLETE")
@@ -402,7 +772,7 @@ if __name__ == "__main__":
     with open(likes_path, "r", encoding="utf-8") as f:
         likes_data = json.load(f)
 
-    tracks = likes_data.get("tracks", [])
+    tracks = load_tracks(likes_data.get("tracks", []))
     if not tracks:
         print("ERROR: No tracks found in soundcloud_likes.json")
         exit(1)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Pipeline Instrumentation
+Lightweight per-run timing spans and counters (HTTP, Groq, throughput,
+bytes written, peak RSS) collected into a snapshot for last_update_status.json.
+"""
+
+import os
+import resource
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+
+class Recorder:
+    """Spans and counters of one pipeline run."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.spans = defaultdict(lambda: {"count": 0, "total_ns": 0, "max_ns": 0})
+        self.counters = defaultdict(float)
+
+
+# Process-wide recorder, replaced per run by run_scope() when several
+# pipeline runs share the process (multi-account mode)
+_default = Recorder()
+_current = ContextVar("instrumentation_recorder", default=None)
+
+
+def _recorder():
+    return _current.get() or _default
+
+
+def reset():
+    """Clear all spans and counters (call at the start of a run)."""
+    rec = _recorder()
+    with rec.lock:
+        rec.spans.clear()
+        rec.counters.clear()
+
+
+@contextmanager
+def run_scope():
+    """Record into a fresh Recorder for the duration of the block (this thread only)."""
+    token = _current.set(Recorder())
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def bind(fn):
+    """Wrap `fn` so it records into the caller's run scope from pool threads."""
+    rec = _recorder()
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _current.set(rec)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return wrapper
+
+
+def record_span(name, elapsed_ns):
+    """Add one timing sample to a named span."""
+    rec = _recorder()
+    with rec.lock:
+        stats = rec.spans[name]
+        stats["count"] += 1
+        stats["total_ns"] += elapsed_ns
+        stats["max_ns"] = max(stats["max_ns"], elapsed_ns)
+
+
+@contextmanager
+def span(name):
+    """Time a block with perf_counter_ns and record it under `name`."""
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter_ns() - start)
+
+
+def incr(name, value=1):
+    """Increment a named counter."""
+    rec = _recorder()
+    with rec.lock:
+        rec.counters[name] += value
+
+
+def get(name):
+    """Current value of a counter."""
+    rec = _recorder()
+    with rec.lock:
+        return rec.counters.get(name, 0)
+
+
+def span_seconds(name):
+    """Total seconds recorded under a span."""
+    rec = _recorder()
+    with rec.lock:
+        stats = rec.spans.get(name)
+        return stats["total_ns"] / 1e9 if stats else 0.0
+
+
+def http_hook(response, *args, **kwargs):
+    """requests response hook: count requests, latency, bytes and errors."""
+    record_span("http.request", int(response.elapsed.total_seconds() * 1e9))
+    incr("http.requests")
+    if kwargs.get("stream"):
+        # Don't consume a streamed body; count what the server announced
+        incr("http.bytes", int(response.headers.get("Content-Length") or 0))
+    else:
+        incr("http.bytes", len(response.content or b""))
+    if response.status_code >= 400:
+        incr("http.errors")
+        incr(f"http.status.{response.status_code}")
+    return response
+
+
+# Pass as `hooks=HTTP_HOOKS` to requests calls (or update a Session's hooks)
+HTTP_HOOKS = {"response": [http_hook]}
+
+
+def record_groq(usage, elapsed_ns):
+    """Record one Groq completion (usage block from the API response)."""
+    record_span("groq.request", elapsed_ns)
+    incr("groq.calls")
+    usage = usage or {}
+    incr("groq.prompt_tokens", usage.get("prompt_tokens", 0))
+    incr("groq.completion_tokens", usage.get("completion_tokens", 0))
+    incr("groq.total_tokens", usage.get("total_tokens", 0))
+
+
+def record_file_written(path):
+    """Count bytes of an output file after it has been written."""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return
+    incr("output.files")
+    incr("output.bytes", size)
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def snapshot():
+    """Return all spans, counters and derived rates as a JSON-ready dict."""
+    rec = _recorder()
+    with rec.lock:
+        spans = {
+            name: {
+                "count": s["count"],
+                "total_ms": round(s["total_ns"] / 1e6, 3),
+                "avg_ms": round(s["total_ns"] / s["count"] / 1e6, 3) if s["count"] else 0,
+                "max_ms": round(s["max_ns"] / 1e6, 3),
+            }
+            for name, s in rec.spans.items()
+        }
+        counters = {name: (int(v) if float(v).is_integer() else v) for name, v in rec.counters.items()}
+
+    derived = {}
+    classify_seconds = spans.get("classify", {}).get("total_ms", 0) / 1000
+    if classify_seconds and counters.get("tracks.classified"):
+        derived["tracks_per_second"] = round(counters["tracks.classified"] / classify_seconds, 1)
+
+    return {
+        "spans": spans,
+        "counters": counters,
+        "derived": derived,
+        "peak_rss_bytes": peak_rss_bytes(),
+    }
@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""
+Job Queue
+Persistent SQLite-backed queue for pipeline jobs: leases (a crashed worker's
+job is picked up again once its lease expires), retries with exponential
+backoff, deduplication keys, priorities and a per-resource guard so two
+runs for the same account never overlap.
+
+Workers on one machine share data/jobs.db directly. Workers on other nodes
+either share the file (only on a filesystem with working locks) or talk to
+a broker started with `job_queue.py serve`, which exposes the same queue
+over HTTP (RemoteQueue is the client). The broker binds to 127.0.0.1
+unless told otherwise and requires AUTOEQ_BROKER_TOKEN on every request.
+
+    python3 src/job_queue.py enqueue alice --priority 10   # run now
+    python3 src/job_queue.py stats
+    AUTOEQ_BROKER_TOKEN=secret python3 src/job_queue.py serve --port 8791
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+
+from accounts import validate_username
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+QUEUE_FILE = os.environ.get("AUTOEQ_QUEUE_FILE", str(DATA_DIR / "jobs.db"))
+
+# Shared secret between the broker and its workers (sent as TOKEN_HEADER)
+BROKER_TOKEN = os.environ.get("AUTOEQ_BROKER_TOKEN", "")
+TOKEN_HEADER = "X-AutoEQ-Token"
+
+LEASE_SECONDS = 600
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 60       # seconds before the first retry, doubled per attempt
+BACKOFF_MAX = 3600
+BACKOFF_JITTER = 0.2    # +/- fraction, so retries from one outage don't line up
+
+# Priorities: on-demand runs go ahead of scheduled ones
+PRIORITY_SCHEDULED = 0
+PRIORITY_ON_DEMAND = 10
+
+# Daily runs are spread over this window by a hash of the account name
+SCHEDULE_WINDOW = int(os.environ.get("AUTOEQ_SCHEDULE_WINDOW", str(24 * 3600)))
+
+ACTIVE = ("queued", "running")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    dedup_key TEXT,
+    resource TEXT,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'queued',
+    run_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    lease_owner TEXT,
+    lease_expires REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS jobs_active_dedup
+    ON jobs (dedup_key) WHERE dedup_key IS NOT NULL AND status IN ('queued', 'running');
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, run_at, priority);
+"""
+
+
+def backoff_seconds(attempts):
+    """Delay before retry number `attempts` (1-based), with jitter."""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** max(0, attempts - 1))
+    return delay * (1 + random.uniform(-BACKOFF_JITTER, BACKOFF_JITTER))
+
+
+def stagger_offset(key, window=SCHEDULE_WINDOW):
+    """Stable offset (seconds into the window) for a key, e.g. an account."""
+    digest = hashlib.sha256(key.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % max(1, window)
+
+
+def _row_to_job(row):
+    if row is None:
+        return None
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    return job
+
+
+class JobQueue:
+    """SQLite job queue. Safe to use from several threads and processes."""
+
+    def __init__(self, path=QUEUE_FILE):
+        self.path = str(path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        # One connection per call: sqlite3 connections can't be shared across threads
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA busy_timeout=30000")
+        return _Connection(conn)
+
+    def enqueue(self, kind, payload, dedup_key=None, resource=None, priority=PRIORITY_SCHEDULED,
+                run_at=None, max_attempts=MAX_ATTEMPTS, once=False):
+        """Add a job; returns (job_id, created).
+
+        A job whose dedup_key matches a queued/running job is not added
+        (the existing id is returned; a higher priority or earlier run_at is
+        applied to it). With once=True any earlier job with the key counts,
+        finished or not (e.g. one daily run per account per day).
+        """
+        now = time.time()
+        run_at = now if run_at is None else run_at
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if dedup_key is not None:
+                statuses = "" if once else f"AND status IN {ACTIVE}"
+                existing = conn.execute(
+                    f"SELECT id, status FROM jobs WHERE dedup_key = ? {statuses} ORDER BY id DESC LIMIT 1",
+                    (dedup_key,)).fetchone()
+                if existing:
+                    if existing["status"] == "queued":
+                        conn.execute(
+                            "UPDATE jobs SET priority = MAX(priority, ?), run_at = MIN(run_at, ?), updated_at = ? "
+                            "WHERE id = ?", (priority, run_at, now, existing["id"]))
+                    conn.execute("COMMIT")
+                    return existing["id"], False
+            cursor = conn.execute(
+                "INSERT INTO jobs (kind, payload, dedup_key, resource, priority, run_at, max_attempts, "
+                "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, json.dumps(payload, ensure_ascii=False), dedup_key, resource, priority, run_at,
+                 max_attempts, now, now))
+            conn.execute("COMMIT")
+            return cursor.lastrowid, True
+
+    def _expire_leases(self, conn, now):
+        """Requeue (or fail) running jobs whose worker stopped renewing the lease."""
+        for row in conn.execute("SELECT id, attempts, max_attempts FROM jobs "
+                                "WHERE status = 'running' AND lease_expires < ?", (now,)).fetchall():
+            if row["attempts"] >= row["max_attempts"]:
+                conn.execute("UPDATE jobs SET status = 'failed', lease_owner = NULL, finished_at = ?, "
+                             "last_error = 'lease expired', updated_at = ? WHERE id = ?", (now, now, row["id"]))
+            else:
+                conn.execute("UPDATE jobs SET status = 'queued', lease_owner = NULL, run_at = ?, "
+                             "last_error = 'lease expired', updated_at = ? WHERE id = ?",
+                             (now + backoff_seconds(row["attempts"]), now, row["id"]))
+
+    def claim(self, worker_id, kinds=None, lease_seconds=LEASE_SECONDS):
+        """Lease the most urgent ready job (highest priority, then oldest run_at), or None.
+
+        Jobs whose resource already has a running job are skipped.
+        """
+        now = time.time()
+        kind_filter = ""
+        params = [now]
+        if kinds:
+            kind_filter = f"AND kind IN ({','.join('?' * len(kinds))})"
+            params.extend(kinds)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._expire_leases(conn, now)
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' AND run_at <= ? "
+                f"{kind_filter} "
+                "AND (resource IS NULL OR resource NOT IN "
+                "     (SELECT resource FROM jobs WHERE status = 'running' AND resource IS NOT NULL)) "
+                "ORDER BY priority DESC, run_at ASC, id ASC LIMIT 1", params).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_owner = ?, "
+                         "lease_expires = ?, updated_at = ? WHERE id = ?",
+                         (worker_id, now + lease_seconds, now, row["id"]))
+            job = _row_to_job(conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+            conn.execute("COMMIT")
+            return job
+
+    def heartbeat(self, job_id, worker_id, lease_seconds=LEASE_SECONDS):
+        """Extend a lease; False if the job is no longer ours (it expired and was reclaimed)."""
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute("UPDATE jobs SET lease_expires = ?, updated_at = ? "
+                                  "WHERE id = ? AND lease_owner = ? AND status = 'running'",
+                                  (now + lease_seconds, now, job_id, worker_id))
+            return cursor.rowcount == 1
+
+    def complete(self, job_id, worker_id):
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute("UPDATE jobs SET status = 'done', lease_owner = NULL, finished_at = ?, "
+                                  "updated_at = ? WHERE id = ? AND lease_owner = ? AND status = 'running'",
+                                  (now, now, job_id, worker_id))
+            return cursor.rowcount == 1
+
+    def fail(self, job_id, worker_id, error):
+        """Record a failed attempt: retried with backoff until max_attempts, then 'failed'."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT attempts, max_attempts FROM jobs "
+                               "WHERE id = ? AND lease_owner = ? AND status = 'running'",
+                               (job_id, worker_id)).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return False
+            if row["attempts"] >= row["max_attempts"]:
+                conn.execute("UPDATE jobs SET status = 'failed', lease_owner = NULL, finished_at = ?, "
+                             "last_error = ?, updated_at = ? WHERE id = ?", (now, str(error), now, job_id))
+            else:
+                conn.execute("UPDATE jobs SET status = 'queued', lease_owner = NULL, run_at = ?, "
+                             "last_error = ?, updated_at = ? WHERE id = ?",
+                             (now + backoff_seconds(row["attempts"]), str(error), now, job_id))
+            conn.execute("COMMIT")
+            return True
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            return _row_to_job(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def stats(self):
+        """Job counts by status, plus the next scheduled run."""
+        with self._connect() as conn:
+            counts = {row["status"]: row["n"] for row in
+                      conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+            next_run = conn.execute("SELECT MIN(run_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        return {
+            "counts": counts,
+            "next_run_at": datetime.fromtimestamp(next_run).isoformat() if next_run else None,
+        }
+
+    def purge(self, older_than=7 * 86400):
+        """Delete finished jobs older than `older_than` seconds."""
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                                  (time.time() - older_than,))
+            return cursor.rowcount
+
+
+class _Connection:
+    """sqlite3 connection as a context manager that closes (not commits) on exit."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and self.conn.in_transaction:
+            self.conn.execute("ROLLBACK")
+        self.conn.close()
+
+
+def enqueue_update(queue, username, priority=PRIORITY_ON_DEMAND, run_at=None):
+    """Queue an on-demand pipeline run for one account (merged with a pending one)."""
+    validate_username(username)
+    return queue.enqueue("daily_update", {"username": username}, dedup_key=f"update:{username}",
+                         resource=f"user:{username}", priority=priority, run_at=run_at)
+
+
+def schedule_daily(queue, usernames, now=None, window=SCHEDULE_WINDOW):
+    """Queue today's run for each account at its staggered slot.
+
+    Each account has a fixed slot in the window (hash of the name), so runs
+    are spread over the day instead of all starting together. A slot that
+    already passed today without a run (e.g. the container was down) is
+    queued to run now. Returns the number of jobs added.
+    """
+    now = now or datetime.now()
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    added = 0
+    for username in usernames:
+        slot = midnight + timedelta(seconds=stagger_offset(username, window))
+        _, created = queue.enqueue(
+            "daily_update", {"username": username},
+            dedup_key=f"daily:{username}:{midnight.date().isoformat()}",
+            resource=f"user:{username}", priority=PRIORITY_SCHEDULED,
+            run_at=max(slot, now).timestamp(), once=True)
+        added += created
+    return added
+
+
+class RemoteQueue:
+    """JobQueue client for a broker started with `job_queue.py serve`."""
+
+    def __init__(self, url, token=BROKER_TOKEN):
+        self.url = url.rstrip("/")
+        self.session = requests.Session()
+        self.session.headers[TOKEN_HEADER] = token
+        self._lock = threading.Lock()
+
+    def _call(self, method, **params):
+        with self._lock:
+            response = self.session.post(f"{self.url}/{method}", json=params, timeout=60)
+        if response.status_code != 200:
+            raise Exception(f"Queue broker {method} failed: HTTP {response.status_code} {response.text[:200]}")
+        return response.json()["result"]
+
+    def enqueue(self, kind, payload, **options):
+        job_id, created = self._call("enqueue", kind=kind, payload=payload, **options)
+        return job_id, created
+
+    def claim(self, worker_id, kinds=None, lease_seconds=LEASE_SECONDS):
+        return self._call("claim", worker_id=worker_id, kinds=kinds, lease_seconds=lease_seconds)
+
+    def heartbeat(self, job_id, worker_id, lease_seconds=LEASE_SECONDS):
+        return self._call("heartbeat", job_id=job_id, worker_id=worker_id, lease_seconds=lease_seconds)
+
+    def complete(self, job_id, worker_id):
+        return self._call("complete", job_id=job_id, worker_id=worker_id)
+
+    def fail(self, job_id, worker_id, error):
+        return self._call("fail", job_id=job_id, worker_id=worker_id, error=error)
+
+    def get(self, job_id):
+        return self._call("get", job_id=job_id)
+
+    def stats(self):
+        return self._call("stats")
+
+    def purge(self, older_than=7 * 86400):
+        return self._call("purge", older_than=older_than)
+
+
+# Broker methods callable over HTTP
+BROKER_METHODS = ("enqueue", "claim", "heartbeat", "complete", "fail", "get", "stats", "purge")
+
+
+class BrokerHandler(BaseHTTPRequestHandler):
+    queue = None
+    token = ""
+
+    def do_POST(self):
+        if not hmac.compare_digest(self.headers.get(TOKEN_HEADER, "").encode("utf-8"),
+                                   self.token.encode("utf-8")):
+            return self.send_json({"error": "Unauthorized"}, 401)
+        method = self.path.strip("/")
+        if method not in BROKER_METHODS:
+            return self.send_json({"error": "Not Found"}, 404)
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            params = json.loads(self.rfile.read(length) or b"{}")
+            result = getattr(self.queue, method)(**params)
+        except (TypeError, ValueError) as e:
+            return self.send_json({"error": str(e)}, 400)
+        except sqlite3.Error as e:
+            # e.g. "database is locked": the client may retry
+            return self.send_json({"error": str(e)}, 503)
+        self.send_json({"result": result})
+
+    def send_json(self, obj, status=200):
+        data = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_broker(queue, host="127.0.0.1", port=8791, token=BROKER_TOKEN):
+    """Serve `queue` over HTTP in a background thread; returns the server.
+
+    Every request must carry `token` in TOKEN_HEADER.
+    """
+    if not token:
+        raise Exception("The queue broker needs a shared token (set AUTOEQ_BROKER_TOKEN)")
+    handler = type("Handler", (BrokerHandler,), {"queue": queue, "token": token})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def open_queue(broker=None, path=QUEUE_FILE):
+    """RemoteQueue for a broker URL, else the local SQLite queue."""
+    return RemoteQueue(broker) if broker else JobQueue(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AutoEQ job queue")
+    parser.add_argument("--queue", default=QUEUE_FILE, help="SQLite queue file")
+    parser.add_argument("--broker", default=os.environ.get("AUTOEQ_BROKER_URL"),
+                        help="Use a remote broker instead of the local file (also AUTOEQ_BROKER_URL)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="Queue an on-demand run for accounts")
+    enqueue.add_argument("usernames", nargs="+")
+    enqueue.add_argument("--priority", type=int, default=PRIORITY_ON_DEMAND)
+    enqueue.add_argument("--delay", type=float, default=0, help="Seconds from now")
+
+    commands.add_parser("stats", help="Job counts by status")
+    purge = commands.add_parser("purge", help="Delete finished jobs")
+    purge.add_argument("--days", type=float, default=7)
+
+    serve = commands.add_parser("serve", help="Serve the queue file to remote workers over HTTP")
+    serve.add_argument("--host", default="127.0.0.1",
+                       help="Interface to bind (0.0.0.0 to accept workers on other nodes)")
+    serve.add_argument("--port", type=int, default=8791)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        server = start_broker(JobQueue(args.queue), args.host, args.port)
+        print(f"Job queue broker for {args.queue} on http://{args.host}:{server.server_address[1]}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+        return
+
+    queue = open_queue(args.broker, args.queue)
+    if args.command == "enqueue":
+        for username in args.usernames:
+            job_id, created = enqueue_update(queue, username, args.priority, time.time() + args.delay)
+            print(f"{username}: job {job_id} ({'queued' if created else 'already pending'})")
+    elif args.command == "stats":
+        print(json.dumps(queue.stats(), indent=2))
+    elif args.command == "purge":
+        print(f"Deleted {queue.purge(args.days * 86400)} finished jobs")
+
+
+if __name__ == "__main__":
+    main()
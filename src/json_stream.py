@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Incremental JSON Array Parsing
+Pulls the elements of one JSON array out of text that arrives in pieces (a
+streamed LLM reply), returning each element as soon as its closing bracket
+or comma has arrived. Text around the document (```json fences, prose) is
+skipped, and when the text stops early the elements completed so far are
+kept. When looking for a key, a bracketed aside before the real object
+("Sure [here]: {...}") is skipped too.
+"""
+
+import json
+
+WHITESPACE = " \t\r\n"
+
+
+class ArrayItems:
+    """Elements of the array under `key` in the top-level object, as they complete.
+
+    With key=None the top-level value itself is the array. feed() returns the
+    elements completed by that piece of text; `items` holds all of them and
+    `complete` is True once the whole document has been read (with a key, an
+    object that has it; objects without it are skipped). Each element's
+    text goes through `loads`; elements it rejects (ValueError) are skipped
+    and counted in `invalid`.
+    """
+
+    def __init__(self, key=None, loads=json.loads):
+        self.key = key
+        self.loads = loads
+        self.item_depth = 1 if key is None else 2
+        self.items = []
+        self.invalid = 0
+        self.complete = False
+
+        self._buf = ""
+        self._pos = 0
+        self._stack = []
+        self._started = False
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._pending_key = None
+        self._current_key = None
+        self._in_array = False
+        self._item_start = None
+        self._found = False
+
+    def _emit(self, end, out):
+        text = self._buf[self._item_start:end].strip()
+        self._item_start = None
+        try:
+            item = self.loads(text)
+        except ValueError:
+            self.invalid += 1
+            return
+        self.items.append(item)
+        out.append(item)
+
+    def feed(self, text):
+        """Scan more text; returns the elements it completed."""
+        out = []
+        if self.complete:
+            return out
+        self._buf += text
+        buf = self._buf
+        stack = self._stack
+
+        for i in range(self._pos, len(buf)):
+            c = buf[i]
+            if not self._started:
+                # With a key the document has to be an object
+                if c == "{" or (c == "[" and self.key is None):
+                    self._started = True
+                    stack.append(c)
+                    self._in_array = self.key is None
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if len(stack) == 1 and stack[0] == "{":
+                        self._pending_key = buf[self._string_start:i + 1]
+                continue
+
+            depth = len(stack)
+            if self._in_array and depth == self.item_depth and self._item_start is None \
+                    and c not in WHITESPACE and c not in ",]":
+                self._item_start = i
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+            elif c in "{[":
+                if depth == 1 and c == "[" and self.key is not None and self._current_key == self.key:
+                    self._in_array = self._found = True
+                stack.append(c)
+            elif c in "}]":
+                stack.pop()
+                depth = len(stack)
+                if self._in_array and depth == self.item_depth and self._item_start is not None:
+                    self._emit(i + 1, out)
+                elif self._in_array and depth == self.item_depth - 1:
+                    if self._item_start is not None:
+                        self._emit(i, out)
+                    self._in_array = False
+                if not stack:
+                    if self.key is not None and not self._found:
+                        # An object without the key (prose in braces): look further on
+                        self._started = False
+                        self._pending_key = self._current_key = None
+                        continue
+                    self.complete = True
+                    self._pos = i + 1
+                    return out
+            elif c == ",":
+                if self._in_array and depth == self.item_depth and self._item_start is not None:
+                    self._emit(i, out)
+            elif c == ":" and depth == 1 and self._pending_key is not None:
+                try:
+                    self._current_key = json.loads(self._pending_key)
+                except ValueError:
+                    self._current_key = None
+                self._pending_key = None
+
+        self._pos = len(buf)
+        return out
+
+
+def parse_items(text, key=None, loads=json.loads):
+    """(elements, complete) of the array under `key` in a whole or truncated reply."""
+    parser = ArrayItems(key, loads)
+    parser.feed(text)
+    return parser.items, parser.complete
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+LLM Reply Schemas
+Local validation of JSON replies from the model. Schemas are a small JSON
+Schema subset (type, properties, required, default, additionalProperties,
+items, enum, minimum/maximum) compiled once into validator functions that
+also coerce near-misses: numbers sent as strings ("3", "+2.5 dB"), enum
+values differing in case or spacing, band keys like "1000Hz". Replies that
+are not quite JSON (``` fences, prose around the object, trailing commas,
+Python literals) are repaired before parsing, so a sloppy reply is used
+instead of costing a retry.
+"""
+
+import json
+import math
+import re
+
+from instrumentation import incr
+
+_NUMBER_PATTERN = re.compile(r"^[+]?(-?\d+(?:\.\d+)?)\s*(?:db|hz)?$", re.IGNORECASE)
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+# Openings of the expected top-level bracket tried when repairing a reply
+MAX_REPAIR_STARTS = 5
+
+
+def _key_form(key):
+    """Property name compared ignoring case, separators and a trailing unit."""
+    key = re.sub(r"[\s_-]", "", str(key).lower())
+    return re.sub(r"(hz|db)$", "", key) or key
+
+
+def _enum_form(value):
+    return " ".join(str(value).lower().replace("_", " ").replace("-", " ").split())
+
+
+def compile_schema(schema, path="$"):
+    """Validator for `schema`: fn(value) -> coerced copy, raising ValueError."""
+    kind = schema.get("type")
+
+    if "enum" in schema:
+        choices = {_enum_form(v): v for v in schema["enum"]}
+        has_default = "default" in schema
+
+        def check_enum(value):
+            if value in schema["enum"]:
+                return value
+            match = choices.get(_enum_form(value))
+            if match is not None:
+                return match
+            if has_default:
+                # An unknown choice falls back rather than sinking the whole reply
+                return schema["default"]
+            raise ValueError(f"{path}: {value!r} not one of {list(schema['enum'])}")
+    else:
+        def check_enum(value):
+            return value
+
+    if kind in ("number", "integer"):
+        low, high = schema.get("minimum"), schema.get("maximum")
+
+        def validate(value):
+            if isinstance(value, str):
+                match = _NUMBER_PATTERN.match(value.strip())
+                if not match:
+                    raise ValueError(f"{path}: expected {kind}, got {value!r}")
+                value = float(match.group(1))
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                raise ValueError(f"{path}: expected {kind}, got {value!r}")
+            if kind == "integer":
+                if value != int(value):
+                    raise ValueError(f"{path}: expected integer, got {value}")
+                value = int(value)
+            elif isinstance(value, float) and value == int(value):
+                value = int(value)
+            if (low is not None and value < low) or (high is not None and value > high):
+                raise ValueError(f"{path}: {value} outside [{low}, {high}]")
+            return check_enum(value)
+
+    elif kind == "string":
+        def validate(value):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                value = str(value)
+            if not isinstance(value, str):
+                raise ValueError(f"{path}: expected string, got {type(value).__name__}")
+            return check_enum(value)
+
+    elif kind == "boolean":
+        def validate(value):
+            if isinstance(value, str) and value.strip().lower() in ("true", "false"):
+                value = value.strip().lower() == "true"
+            if not isinstance(value, bool):
+                raise ValueError(f"{path}: expected boolean, got {type(value).__name__}")
+            return value
+
+    elif kind == "array":
+        item = compile_schema(schema.get("items", {}), f"{path}[]")
+        min_items = schema.get("minItems", 0)
+
+        def validate(value):
+            if not isinstance(value, list):
+                raise ValueError(f"{path}: expected array, got {type(value).__name__}")
+            if len(value) < min_items:
+                raise ValueError(f"{path}: expected at least {min_items} items")
+            return [item(v) for v in value]
+
+    elif kind == "object":
+        properties = {name: compile_schema(sub, f"{path}.{name}")
+                      for name, sub in schema.get("properties", {}).items()}
+        by_form = {_key_form(name): name for name in properties}
+        defaults = {name: sub["default"] for name, sub in schema.get("properties", {}).items()
+                    if "default" in sub}
+        required = schema.get("required", [])
+        extra = schema.get("additionalProperties", True)
+        extra_validator = compile_schema(extra, f"{path}.*") if isinstance(extra, dict) else None
+
+        def validate(value):
+            if not isinstance(value, dict):
+                raise ValueError(f"{path}: expected object, got {type(value).__name__}")
+            result = {}
+            for key, v in value.items():
+                name = key if key in properties else by_form.get(_key_form(key))
+                if name is not None:
+                    result[name] = properties[name](v)
+                elif extra_validator is not None:
+                    result[key] = extra_validator(v)
+                elif extra is not False:
+                    result[key] = v
+            for name in required:
+                if name not in result:
+                    raise ValueError(f"{path}: missing {name!r}")
+            for name, default in defaults.items():
+                result.setdefault(name, json.loads(json.dumps(default)))
+            return result
+
+    else:
+        def validate(value):
+            return check_enum(value)
+
+    return validate
+
+
+def _json_span(text):
+    """The first top-level {...} / [...] in text (fences and prose dropped)."""
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return text
+    start = min(starts)
+    end = text.rfind("}" if text[start] == "{" else "]")
+    return text[start:end + 1] if end > start else text[start:]
+
+
+def repair_json(text):
+    """Near-valid JSON text made parseable: surrounding text, trailing commas
+    and Python True/False/None outside strings are fixed."""
+    text = _json_span(text)
+    out = []
+    in_string = escape = False
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if in_string:
+            out.append(c)
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+            out.append(c)
+        elif c == ",":
+            j = i + 1
+            while j < len(text) and text[j] in " \t\r\n":
+                j += 1
+            if j >= len(text) or text[j] not in "}]":
+                out.append(c)
+        elif c.isalpha():
+            j = i
+            while j < len(text) and text[j].isalnum():
+                j += 1
+            word = text[i:j]
+            out.append(_LITERALS.get(word, word))
+            i = j
+            continue
+        else:
+            out.append(c)
+        i += 1
+    return "".join(out)
+
+
+def _parse_repaired(text, top):
+    """Repaired JSON starting at an opening `top` bracket; prose with brackets
+    of its own before the value ("Sure [see below]: {...}") is skipped."""
+    start = text.find(top)
+    for _ in range(MAX_REPAIR_STARTS):
+        if start < 0:
+            break
+        try:
+            return json.loads(repair_json(text[start:]))
+        except ValueError:
+            start = text.find(top, start + 1)
+    return json.loads(repair_json(text))
+
+
+def parse_reply(text, validator=None, top="{"):
+    """Parsed and validated JSON from a model reply, repaired first if needed.
+
+    `top` is the bracket the expected value opens with ("[" for an array).
+    Raises ValueError when the reply can't be parsed or doesn't fit.
+    """
+    try:
+        value = json.loads(text)
+    except ValueError:
+        value = _parse_repaired(text, top)
+        incr("llm.repaired")
+    try:
+        return validator(value) if validator else value
+    except ValueError:
+        incr("llm.invalid")
+        raise
+
+
+def loads_repaired(text):
+    """json.loads that repairs near-valid text first (for json_stream items)."""
+    try:
+        return json.loads(text)
+    except ValueError:
+        incr("llm.repaired")
+        return json.loads(repair_json(text))
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Pipeline Metrics Exporter
+Writes a Prometheus text-format metrics file after each pipeline run
+(served by nginx at /metrics). Counters and histograms accumulate across
+runs in a small JSON state file in each account's data directory; the
+metrics file in the top-level data directory covers every account, with a
+`user` label on each sample.
+"""
+
+import json
+import os
+import threading
+import time
+
+from accounts import USERS_SUBDIR
+from fetch_likes import DEFAULT_USERNAME
+
+METRICS_FILE = "metrics.prom"
+STATE_FILE = "metrics_state.json"
+
+# Stage duration histogram buckets (seconds)
+DURATION_BUCKETS = [1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600]
+
+# Serializes rewrites of the combined file between accounts run in threads
+_write_lock = threading.Lock()
+
+# Output files whose sizes are exported
+OUTPUT_FILES = [
+    "soundcloud_likes.json",
+    "track_clusters.json",
+    "eq_presets.json",
+    "eq_presets_detailed.json",
+    "eq_presets_bundle.zip",
+    "track_neighbors.bin",
+    "track_gains.bin",
+    "track_presets.bin",
+    "duplicate_groups.json",
+]
+
+
+def load_state(data_dir):
+    """Load accumulated counters/histograms from previous runs."""
+    path = os.path.join(data_dir, STATE_FILE)
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            pass
+    return {"histograms": {}, "counters": {}, "last_success_timestamp": 0}
+
+
+def _observe(state, stage, seconds):
+    """Add one observation to a stage duration histogram."""
+    hist = state["histograms"].setdefault(stage, {
+        "buckets": [0] * len(DURATION_BUCKETS), "sum": 0.0, "count": 0
+    })
+    for i, bound in enumerate(DURATION_BUCKETS):
+        if seconds <= bound:
+            hist["buckets"][i] += 1
+    hist["sum"] += seconds
+    hist["count"] += 1
+
+
+def _add(state, name, value):
+    state["counters"][name] = state["counters"].get(name, 0) + value
+
+
+def _labels(**labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+def update_state(state, status):
+    """Fold one run's status (last_update_status.json) into the state."""
+    for stage, info in status.get("stages", {}).items():
+        if "duration_seconds" in info:
+            _observe(state, stage, info["duration_seconds"])
+    if "total_duration_seconds" in status:
+        _observe(state, "total", status["total_duration_seconds"])
+
+    result = "success" if status.get("success") else "failure"
+    _add(state, f"runs.{result}", 1)
+
+    counters = status.get("instrumentation", {}).get("counters", {})
+    for name in ("groq.calls", "groq.errors", "groq.cache_hits", "groq.prompt_tokens",
+                 "groq.completion_tokens", "http.requests", "http.errors", "http.bytes"):
+        _add(state, name, counters.get(name, 0))
+    for name, value in counters.items():
+        if name.startswith("http.status."):
+            _add(state, name, value)
+
+    # Gauges of the last run, kept so any account's run can render all of them
+    fetch = status.get("stages", {}).get("fetch", {})
+    state["username"] = status.get("username")
+    state["last_run"] = {
+        "tracks_fetched": fetch.get("tracks_fetched", 0),
+        "tracks_new": fetch.get("tracks_new", 0),
+        "tracks_duplicate": counters.get("dedup.duplicates", 0),
+        "peak_rss_bytes": status.get("instrumentation", {}).get("peak_rss_bytes", 0),
+    }
+
+    now = time.time()
+    state["last_run_timestamp"] = now
+    state["last_run_success"] = bool(status.get("success"))
+    if status.get("success"):
+        state["last_success_timestamp"] = now
+    return state
+
+
+def render(accounts):
+    """Render the Prometheus text exposition format.
+
+    `accounts` is a list of (user, state, data_dir); every sample carries
+    its account's `user` label.
+    """
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        """`samples` maps (state, data_dir) to a list of (labels, value)."""
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for user, state, data_dir in accounts:
+            for labels, value in samples(state, data_dir):
+                lines.append(f"{name}{_labels(user=user, **labels)} {value}")
+
+    # Stage duration histograms
+    lines.append("# HELP autoeq_stage_duration_seconds Pipeline stage duration")
+    lines.append("# TYPE autoeq_stage_duration_seconds histogram")
+    for user, state, _ in accounts:
+        for stage, hist in sorted(state["histograms"].items()):
+            labels = f'user="{user}",stage="{stage}"'
+            for bound, count in zip(DURATION_BUCKETS, hist["buckets"]):
+                lines.append(f'autoeq_stage_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'autoeq_stage_duration_seconds_bucket{{{labels},le="+Inf"}} {hist["count"]}')
+            lines.append(f'autoeq_stage_duration_seconds_sum{{{labels}}} {round(hist["sum"], 3)}')
+            lines.append(f'autoeq_stage_duration_seconds_count{{{labels}}} {hist["count"]}')
+
+    def counter(name):
+        return lambda state, _: [({}, state["counters"].get(name, 0))]
+
+    def last_run(key):
+        return lambda state, _: [({}, state.get("last_run", {}).get(key, 0))]
+
+    metric("autoeq_runs_total", "counter", "Pipeline runs by result",
+           lambda state, _: [({"result": r}, state["counters"].get(f"runs.{r}", 0))
+                             for r in ("success", "failure")])
+
+    metric("autoeq_tracks_fetched", "gauge", "Tracks fetched in the last run", last_run("tracks_fetched"))
+    metric("autoeq_tracks_new", "gauge", "Tracks not present in the previous run", last_run("tracks_new"))
+    metric("autoeq_tracks_duplicate", "gauge", "Near-duplicate tracks (re-uploads, versions) in the last run",
+           last_run("tracks_duplicate"))
+
+    metric("autoeq_groq_calls_total", "counter", "Groq API completions", counter("groq.calls"))
+    metric("autoeq_groq_errors_total", "counter", "Failed Groq API attempts", counter("groq.errors"))
+    metric("autoeq_groq_cache_hits_total", "counter", "Groq responses served from cache",
+           counter("groq.cache_hits"))
+    metric("autoeq_groq_tokens_total", "counter", "Groq tokens by kind",
+           lambda state, _: [({"kind": "prompt"}, state["counters"].get("groq.prompt_tokens", 0)),
+                             ({"kind": "completion"}, state["counters"].get("groq.completion_tokens", 0))])
+
+    metric("autoeq_http_requests_total", "counter", "Outgoing HTTP requests", counter("http.requests"))
+    metric("autoeq_http_response_bytes_total", "counter", "Outgoing HTTP response bytes",
+           counter("http.bytes"))
+    metric("autoeq_http_errors_total", "counter", "Outgoing HTTP responses with status >= 400",
+           lambda state, _: [({"status": name.rsplit(".", 1)[1]}, value)
+                             for name, value in sorted(state["counters"].items())
+                             if name.startswith("http.status.")]
+           or [({"status": "none"}, 0)])
+
+    def sizes(_, data_dir):
+        return [({"file": fname}, os.path.getsize(os.path.join(data_dir, fname)))
+                for fname in OUTPUT_FILES if os.path.exists(os.path.join(data_dir, fname))]
+    metric("autoeq_output_file_bytes", "gauge", "Size of pipeline output files", sizes)
+
+    metric("autoeq_last_run_timestamp_seconds", "gauge", "Unix time of the last run",
+           lambda state, _: [({}, round(state.get("last_run_timestamp", 0), 3))])
+    metric("autoeq_last_run_success", "gauge", "1 if the last run succeeded",
+           lambda state, _: [({}, int(state.get("last_run_success", False)))])
+    metric("autoeq_last_success_timestamp_seconds", "gauge", "Unix time of the last successful run",
+           lambda state, _: [({}, round(state.get("last_success_timestamp", 0), 3))])
+    metric("autoeq_peak_rss_bytes", "gauge", "Peak resident memory of the last run",
+           last_run("peak_rss_bytes"))
+
+    return "\n".join(lines) + "\n"
+
+
+def load_accounts(root_dir):
+    """(user, state, data_dir) of every account with metrics under root_dir:
+    the top-level account first, then data/users/<username>/ in name order."""
+    accounts = []
+    if os.path.exists(os.path.join(root_dir, STATE_FILE)):
+        state = load_state(root_dir)
+        accounts.append((state.get("username") or "default", state, root_dir))
+    users_dir = os.path.join(root_dir, USERS_SUBDIR)
+    if os.path.isdir(users_dir):
+        for username in sorted(os.listdir(users_dir)):
+            data_dir = os.path.join(users_dir, username)
+            if username == DEFAULT_USERNAME:
+                continue  # left over from before the default account moved to data/
+            if os.path.exists(os.path.join(data_dir, STATE_FILE)):
+                accounts.append((username, load_state(data_dir), data_dir))
+    return accounts
+
+
+def _write_atomic(path, text):
+    # Write-then-rename so a reader never sees a half-written file (the pid
+    # keeps worker processes sharing data/ off each other's temp files)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def write_metrics(status, data_dir, root_dir=None):
+    """Fold this run into the account's state in data_dir, then rewrite the
+    combined metrics.prom in root_dir (default: data_dir) from every account."""
+    root_dir = root_dir or data_dir
+    with _write_lock:
+        state = update_state(load_state(data_dir), status)
+        _write_atomic(os.path.join(data_dir, STATE_FILE), json.dumps(state, indent=2))
+
+        path = os.path.join(root_dir, METRICS_FILE)
+        _write_atomic(path, render(load_accounts(root_dir)))
+    return path
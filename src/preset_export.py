@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+EQ Preset Exporter
+Renders presets to EqualizerAPO/Peace, AutoEq CSV, eqMac, Wavelet and Poweramp
+formats and packs them into a single zip bundle.
+"""
+
+import hashlib
+import io
+import json
+import os
+import re
+import zipfile
+from datetime import datetime
+from pathlib import Path
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+
+BUNDLE_FILE = "eq_presets_bundle.zip"
+MANIFEST_NAME = "manifest.json"
+BUNDLE_VERSION = 2
+
+# EQ frequency bands (must match generate_eq_presets.EQ_BANDS)
+EQ_BANDS = [32, 64, 125, 250, 500, 1000, 2000, 4000, 8000, 16000]
+
+# Q of the peaking filters used for the 10-band graphic EQ (one octave)
+BAND_Q = 1.41
+
+# Poweramp Equalizer band type for a peaking filter
+POWERAMP_PEAKING = 3
+
+
+def normalize_preset(preset, preset_id=None):
+    """Convert any of the repo's preset shapes to {id, name, gains}.
+
+    Accepts eqMac entries (gains.bands list), groq_cluster eq_presets.json
+    entries (bands dict), eq_presets_detailed.json entries (eq_settings dict)
+    and generate_eq_presets.EQ_PRESETS values (bands dict with int keys).
+    """
+    if isinstance(preset.get('gains'), dict):
+        by_freq = {b['frequency']: b['gain'] for b in preset['gains'].get('bands', [])}
+    else:
+        by_freq = preset.get('eq_settings') or preset.get('bands') or {}
+
+    gains = [float(by_freq.get(freq, by_freq.get(str(freq), 0))) for freq in EQ_BANDS]
+    return {
+        'id': preset_id or preset.get('cluster_id') or preset.get('cluster') or preset.get('id'),
+        'name': preset.get('preset_name') or preset.get('name'),
+        'gains': gains,
+    }
+
+
+def file_slug(preset_id):
+    """File name stem for a preset id: [A-Za-z0-9_-] only, never a path.
+
+    Ids that needed changing get a short hash of the raw id appended, so
+    "a/b" and "a_b" don't share a file.
+    """
+    raw = str(preset_id)
+    slug = re.sub(r"[^A-Za-z0-9_-]+", "_", raw).strip("_")[:64]
+    if slug == raw:
+        return slug
+    digest = hashlib.sha256(raw.encode('utf-8')).hexdigest()[:8]
+    return f"{slug}-{digest}" if slug else f"preset-{digest}"
+
+
+def preamp(gains):
+    """Negative of the largest boost, to prevent clipping."""
+    return -max([g for g in gains if g > 0], default=0)
+
+
+def _fmt(value):
+    return f"{value:g}"
+
+
+def render_graphic_eq(preset):
+    """EqualizerAPO/Peace GraphicEQ line (also read by Wavelet)."""
+    points = "; ".join(f"{freq} {_fmt(g)}" for freq, g in zip(EQ_BANDS, preset['gains']))
+    return f"GraphicEQ: {points}\n"
+
+
+def render_apo_filters(preset):
+    """EqualizerAPO/Peace parametric Preamp/Filter lines."""
+    gains = preset['gains']
+    lines = [f"Preamp: {preamp(gains):.2f} dB"]
+    for i, (freq, gain) in enumerate(zip(EQ_BANDS, gains)):
+        lines.append(f"Filter {i + 1}: ON PK Fc {freq} Hz Gain {gain:.1f} dB Q {BAND_Q}")
+    return "\n".join(lines) + "\n"
+
+
+def render_parametric_csv(preset):
+    """AutoEq-style parametric EQ table."""
+    lines = ["type,frequency,gain,q"]
+    for freq, gain in zip(EQ_BANDS, preset['gains']):
+        lines.append(f"PK,{freq},{gain:.1f},{BAND_Q}")
+    return "\n".join(lines) + "\n"
+
+
+def render_eqmac(preset):
+    """eqMac preset JSON."""
+    return json.dumps({
+        "id": preset['id'],
+        "name": preset['name'],
+        "isDefault": False,
+        "gains": {
+            "global": 0,
+            "bands": [{"frequency": freq, "gain": gain} for freq, gain in zip(EQ_BANDS, preset['gains'])]
+        }
+    }, ensure_ascii=False, indent=2)
+
+
+def render_poweramp(preset):
+    """Poweramp Equalizer preset JSON."""
+    return json.dumps([{
+        "name": preset['name'],
+        "preamp": preamp(preset['gains']),
+        "parametric": True,
+        "bands": [
+            {"type": POWERAMP_PEAKING, "channels": 0, "frequency": freq, "q": BAND_Q, "gain": gain, "color": 0}
+            for freq, gain in zip(EQ_BANDS, preset['gains'])
+        ]
+    }], ensure_ascii=False, indent=2)
+
+
+# Bundle layout: format directory -> (file extension, renderer)
+FORMATS = {
+    "equalizerapo/graphiceq": ("txt", render_graphic_eq),
+    "equalizerapo/parametric": ("txt", render_apo_filters),
+    "autoeq": ("csv", render_parametric_csv),
+    "eqmac": ("json", render_eqmac),
+    "wavelet": ("txt", render_graphic_eq),
+    "poweramp": ("json", render_poweramp),
+}
+
+
+def preset_hash(preset):
+    """Content hash of everything the renderers read from a preset."""
+    key = json.dumps([preset['name'], preset['gains']], ensure_ascii=False)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+
+
+def _read_previous(bundle_path):
+    """Open an existing bundle and return (zipfile, manifest), or (None, {})."""
+    if not bundle_path.exists():
+        return None, {}
+    try:
+        previous = zipfile.ZipFile(bundle_path)
+        return previous, json.loads(previous.read(MANIFEST_NAME))
+    except (zipfile.BadZipFile, KeyError, json.JSONDecodeError):
+        return None, {}
+
+
+def export_bundle(presets, data_dir=DATA_DIR, bundle_name=BUNDLE_FILE):
+    """Render all presets into a zip bundle, reusing unchanged entries.
+
+    Presets whose name and gains hash match the previous bundle's manifest
+    are copied over as-is; only changed presets are re-rendered. Files are
+    named by file_slug(id); the manifest maps each raw id to its "file".
+    """
+    bundle_path = Path(data_dir) / bundle_name
+    normalized = [normalize_preset(p) for p in presets]
+
+    previous, previous_manifest = _read_previous(bundle_path)
+    previous_hashes = {pid: info.get('hash') for pid, info in previous_manifest.get('presets', {}).items()}
+
+    buffer = io.BytesIO()
+    manifest = {
+        "version": BUNDLE_VERSION,
+        "generated_at": datetime.now().isoformat(),
+        "bands": EQ_BANDS,
+        "formats": list(FORMATS.keys()),
+        "presets": {},
+    }
+    rendered = reused = 0
+
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as bundle:
+        for preset in normalized:
+            digest = preset_hash(preset)
+            slug = file_slug(preset['id'])
+            manifest["presets"][preset['id']] = {"name": preset['name'], "hash": digest, "file": slug}
+            unchanged = previous is not None and previous_hashes.get(preset['id']) == digest
+
+            for directory, (ext, render) in FORMATS.items():
+                arcname = f"{directory}/{slug}.{ext}"
+                if unchanged:
+                    try:
+                        bundle.writestr(previous.getinfo(arcname), previous.read(arcname))
+                        continue
+                    except KeyError:
+                        pass
+                bundle.writestr(arcname, render(preset))
+
+            if unchanged:
+                reused += 1
+            else:
+                rendered += 1
+
+        bundle.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=2))
+
+    if previous is not None:
+        previous.close()
+
+    # Stream the in-memory bundle to disk and swap it in atomically
+    tmp_path = bundle_path.with_suffix('.zip.tmp')
+    with open(tmp_path, 'wb') as f:
+        buffer.seek(0)
+        while chunk := buffer.read(64 * 1024):
+            f.write(chunk)
+    os.replace(tmp_path, bundle_path)
+
+    return {"path": str(bundle_path), "presets": len(normalized), "rendered": rendered, "reused": reused}
+
+
+def main():
+    print("=" * 60)
+    print("EQ Preset Exporter")
+    print("=" * 60)
+
+    detailed_file = DATA_DIR / "eq_presets_detailed.json"
+    if not detailed_file.exists():
+        print(f"Error: {detailed_file} not found")
+        return
+
+    with open(detailed_file, 'r', encoding='utf-8') as f:
+        presets = json.load(f).get('presets', [])
+
+    result = export_bundle(presets)
+    print(f"Bundle saved to: {result['path']}")
+    print(f"  {result['rendered']} presets rendered, {result['reused']} reused")
+
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Preset Lookup Service
+Small asyncio HTTP service (behind nginx) that answers preset lookups from
+an in-memory index instead of clients downloading track_clusters.json:
+
+    GET /api/eq?track_id=123         cluster + EQ preset (+ per-track gains) of a track
+    GET /api/eq?url=https://...      same, by SoundCloud URL
+    GET /api/tracks?cluster=<id>     tracks in a cluster (offset/limit paging)
+    GET /api/clusters                clusters with their presets
+    GET /api/health                  index version
+
+Every endpoint takes an optional user=<username> for multi-account data.
+The index is built once per data directory and rebuilt in the background
+when a pipeline run rewrites its files; the new index replaces the old one
+in a single reference swap, so requests never see a half-built index.
+Responses carry ETags (If-None-Match gives 304) and a Server-Timing header.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from accounts import USERNAME_PATTERN, user_data_dir
+from preset_table import normalize_url
+from track_gains import MANIFEST_FILE as GAINS_MANIFEST_FILE, TrackGainTable
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+
+DEFAULT_PORT = int(os.environ.get("AUTOEQ_SERVICE_PORT", "8792"))
+RELOAD_INTERVAL = 2.0       # seconds between checks for a new pipeline run
+KEEPALIVE_TIMEOUT = 30.0
+MAX_INDEXES = 64            # per-account indexes kept in memory (LRU)
+DEFAULT_PAGE = 100
+MAX_PAGE = 1000
+
+# Files the index is built from; any change triggers a rebuild
+SOURCE_FILES = ("track_clusters.json", "eq_presets_detailed.json", GAINS_MANIFEST_FILE, "track_gains.bin")
+
+# Track fields returned by the API
+TRACK_FIELDS = ("track_id", "title", "artist", "url", "duration", "genre")
+
+STATUS_TEXT = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+               405: "Method Not Allowed", 503: "Service Unavailable"}
+
+
+def source_signature(data_dir):
+    """(name, mtime_ns, size) of each source file that exists."""
+    signature = []
+    for name in SOURCE_FILES:
+        try:
+            stat = os.stat(Path(data_dir) / name)
+        except OSError:
+            continue
+        signature.append((name, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+class PresetIndex:
+    """Immutable lookup tables built from one pipeline run's output files."""
+
+    def __init__(self, data_dir):
+        data_dir = Path(data_dir)
+        self.signature = source_signature(data_dir)
+        if not any(name == "track_clusters.json" for name, _, _ in self.signature):
+            raise FileNotFoundError(data_dir / "track_clusters.json")
+
+        with open(data_dir / "track_clusters.json", "r", encoding="utf-8") as f:
+            clusters_doc = json.load(f)
+        detailed = {}
+        if (data_dir / "eq_presets_detailed.json").exists():
+            with open(data_dir / "eq_presets_detailed.json", "r", encoding="utf-8") as f:
+                detailed = json.load(f)
+
+        self.version = hashlib.blake2b(repr(self.signature).encode(), digest_size=8).hexdigest()
+        self.rules_version = (clusters_doc.get("rules") or {}).get("stamp") or detailed.get("rules_version")
+        self.built_at = time.time()
+
+        self.presets = {
+            p["cluster_id"]: {
+                "name": p.get("preset_name"),
+                "description": p.get("description"),
+                "characteristics": p.get("characteristics", []),
+                "bands": p.get("eq_settings", {}),
+            }
+            for p in detailed.get("presets", [])
+        }
+
+        self.clusters = {}
+        self.by_id = {}
+        self.by_url = {}
+        for cluster in clusters_doc.get("clusters", []):
+            cluster_id = cluster["id"]
+            tracks = [{name: track.get(name) for name in TRACK_FIELDS} for track in cluster.get("tracks", [])]
+            self.clusters[cluster_id] = {"id": cluster_id, "name": cluster.get("name", cluster_id), "tracks": tracks}
+            for track in tracks:
+                entry = (cluster_id, track)
+                if track["track_id"] is not None:
+                    self.by_id[str(track["track_id"])] = entry
+                if track["url"]:
+                    self.by_url[normalize_url(track["url"])] = entry
+
+        self.gains = None
+        if (data_dir / GAINS_MANIFEST_FILE).exists():
+            try:
+                self.gains = TrackGainTable(data_dir)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Per-track gains unavailable: {e}")
+
+    def lookup(self, track_id=None, url=None):
+        if track_id is not None:
+            return self.by_id.get(str(track_id))
+        if url:
+            return self.by_url.get(normalize_url(url))
+        return None
+
+    def cluster_summary(self, cluster_id):
+        cluster = self.clusters[cluster_id]
+        return {"id": cluster_id, "name": cluster["name"], "track_count": len(cluster["tracks"]),
+                "preset": self.presets.get(cluster_id)}
+
+
+class IndexStore:
+    """Current PresetIndex per data directory (the default one and per-account ones)."""
+
+    def __init__(self, data_dir=DATA_DIR):
+        self.data_dir = Path(data_dir)
+        self.indexes = OrderedDict()
+        self.failed = {}        # user -> signature of files that didn't load
+        self.lock = threading.Lock()
+
+    def dir_for(self, user):
+        return Path(user_data_dir(self.data_dir, user)) if user else self.data_dir
+
+    def get(self, user=None):
+        """The loaded index for `user` (None = default data dir); loads it on first use."""
+        with self.lock:
+            index = self.indexes.get(user)
+            if index is not None:
+                self.indexes.move_to_end(user)
+                return index
+        index = PresetIndex(self.dir_for(user))
+        with self.lock:
+            self.indexes[user] = index
+            while len(self.indexes) > MAX_INDEXES:
+                self.indexes.popitem(last=False)
+        return index
+
+    def peek(self, user=None):
+        with self.lock:
+            return self.indexes.get(user)
+
+    def refresh(self):
+        """Rebuild indexes whose source files changed; returns the users reloaded."""
+        reloaded = []
+        with self.lock:
+            current = list(self.indexes.items())
+        for user, index in current:
+            data_dir = self.dir_for(user)
+            signature = source_signature(data_dir)
+            if signature in (index.signature, self.failed.get(user)):
+                continue
+            try:
+                fresh = PresetIndex(data_dir)
+            except (OSError, ValueError, KeyError) as e:
+                # Files mid-write or broken: keep serving the old index until they change again
+                print(f"Index reload for {user or 'default'} failed, keeping version {index.version}: {e}")
+                self.failed[user] = signature
+                continue
+            if fresh.signature != source_signature(data_dir):
+                continue  # changed again while building
+            with self.lock:
+                if user in self.indexes:
+                    self.indexes[user] = fresh
+            reloaded.append(user)
+            print(f"Index for {user or 'default'} reloaded: {len(fresh.by_id)} tracks, version {fresh.version}")
+        return reloaded
+
+
+def _json_body(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _first(params, name):
+    values = params.get(name)
+    return values[0] if values else None
+
+
+def _int_param(params, name, default, maximum=None):
+    value = _first(params, name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+    if number < 0:
+        raise ValueError(f"{name} must be >= 0")
+    return min(number, maximum) if maximum is not None else number
+
+
+def eq_response(index, params):
+    track_id, url = _first(params, "track_id"), _first(params, "url")
+    if not track_id and not url:
+        return 400, {"error": "track_id or url is required"}
+    entry = index.lookup(track_id, url)
+    if entry is None:
+        return 404, {"error": "Unknown track"}
+    cluster_id, track = entry
+    body = {
+        "track": track,
+        "cluster": {"id": cluster_id, "name": index.clusters[cluster_id]["name"]},
+        "preset": index.presets.get(cluster_id),
+        "rules_version": index.rules_version,
+    }
+    if index.gains is not None and track["track_id"] is not None:
+        gains = index.gains.gains(track["track_id"])
+        if gains is not None:
+            body["track_gains"] = {str(freq): gain for freq, gain in gains.items()}
+    return 200, body
+
+
+def tracks_response(index, params):
+    cluster_id = _first(params, "cluster")
+    if not cluster_id:
+        return 400, {"error": "cluster is required"}
+    if cluster_id not in index.clusters:
+        return 404, {"error": "Unknown cluster"}
+    offset = _int_param(params, "offset", 0)
+    limit = _int_param(params, "limit", DEFAULT_PAGE, MAX_PAGE)
+    tracks = index.clusters[cluster_id]["tracks"]
+    return 200, {**index.cluster_summary(cluster_id), "offset": offset, "limit": limit,
+                 "tracks": tracks[offset:offset + limit]}
+
+
+def clusters_response(index, params):
+    return 200, {"rules_version": index.rules_version,
+                 "clusters": [index.cluster_summary(cid) for cid in index.clusters]}
+
+
+def health_response(index, params):
+    return 200, {"status": "ok", "version": index.version, "tracks": len(index.by_id),
+                 "clusters": len(index.clusters), "built_at": index.built_at}
+
+
+ROUTES = {
+    "/api/eq": eq_response,
+    "/api/tracks": tracks_response,
+    "/api/clusters": clusters_response,
+    "/api/health": health_response,
+}
+
+
+def respond(store, method, target, headers):
+    """Handle one request; returns (status, extra_headers, body bytes)."""
+    start = time.perf_counter_ns()
+    parts = urlsplit(target)
+    route = ROUTES.get(parts.path.rstrip("/") or "/")
+    if route is None:
+        status, obj = 404, {"error": "Not Found"}
+    elif method not in ("GET", "HEAD"):
+        status, obj = 405, {"error": "Method Not Allowed"}
+    else:
+        params = parse_qs(parts.query)
+        user = _first(params, "user")
+        if user is not None and not USERNAME_PATTERN.match(user):
+            status, obj = 400, {"error": "Invalid user"}
+        else:
+            try:
+                index = store.get(user)
+            except FileNotFoundError:
+                status, obj = 503, {"error": "No pipeline output yet"}
+            except (OSError, ValueError, KeyError) as e:
+                status, obj = 503, {"error": f"Index unavailable: {e}"}
+            else:
+                try:
+                    status, obj = route(index, params)
+                except ValueError as e:
+                    status, obj = 400, {"error": str(e)}
+
+    body = _json_body(obj)
+    etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+    extra = {"ETag": etag, "Cache-Control": "no-cache"}
+    if status == 200 and etag in headers.get("if-none-match", ""):
+        status, body = 304, b""
+    extra["Server-Timing"] = f"app;dur={(time.perf_counter_ns() - start) / 1e6:.3f}"
+    return status, extra, body
+
+
+async def handle_connection(store, reader, writer):
+    """HTTP/1.1 with keep-alive; GET/HEAD only (nginx sits in front)."""
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            request_line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+            if not request_line:
+                break
+            try:
+                method, target, version = request_line.decode("latin-1").split()
+            except ValueError:
+                break
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            params = parse_qs(urlsplit(target).query)
+            if store.peek(_first(params, "user")) is None:
+                # First request for a data dir: build its index off the event loop
+                await loop.run_in_executor(None, respond, store, "HEAD", "/api/health", {})
+            status, extra, body = respond(store, method, target, headers)
+
+            keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+            head = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+                    "Content-Type: application/json; charset=utf-8",
+                    f"Content-Length: {len(body)}",
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+            head.extend(f"{name}: {value}" for name, value in extra.items())
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+            if method != "HEAD":
+                writer.write(body)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.TimeoutError, ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def watch(store, interval=RELOAD_INTERVAL):
+    """Swap in rebuilt indexes when a pipeline run publishes new files."""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        await loop.run_in_executor(None, store.refresh)
+
+
+async def serve(host, port, data_dir=DATA_DIR):
+    store = IndexStore(data_dir)
+    try:
+        index = store.get()
+        print(f"Index loaded: {len(index.by_id)} tracks in {len(index.clusters)} clusters")
+    except (OSError, ValueError) as e:
+        print(f"No index yet ({e}); serving 503 until the pipeline publishes")
+
+    server = await asyncio.start_server(lambda r, w: handle_connection(store, r, w), host, port)
+    loop = asyncio.get_running_loop()
+    # SIGHUP forces an immediate reload check
+    loop.add_signal_handler(signal.SIGHUP, lambda: loop.run_in_executor(None, store.refresh))
+    print(f"Preset service on http://{host}:{port} (data: {data_dir})")
+    async with server:
+        await asyncio.gather(server.serve_forever(), watch(store))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AutoEQ preset lookup service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--data-dir", default=str(DATA_DIR))
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, Path(args.data_dir)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
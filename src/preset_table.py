@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Track Preset Lookup Table
+Compact binary file mapping track_id and a hash of the track URL to its
+preset and per-track gains, for players that can't afford to parse
+track_clusters.json. Keys are stored as sorted arrays; the reader mmaps the
+file and binary-searches it in place, so opening costs microseconds and a
+lookup parses nothing.
+
+Layout (little-endian, sections 8-byte aligned):
+
+    header      magic, version, counts, gain step, section offsets
+    bands       uint32[bands]            EQ frequencies
+    presets     int8[presets, bands]     cluster preset gains (gain steps)
+    preset_ids  utf-8 JSON array       cluster id of each preset
+    ids         uint64[ids]              sorted track ids
+    id_rows     uint32[ids]              row of each id
+    urls        uint64[urls]             sorted URL hashes (see url_key)
+    url_rows    uint32[urls]             row of each URL hash
+    row_preset  uint16[rows]             preset of each row
+    row_gains   int8[rows, bands]        per-track gains (gain steps)
+"""
+
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from similarity_index import EQ_BANDS, load_preset_gains
+from track_gains import GAIN_STEP_DB, blend_track_gains, quantize
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+
+TABLE_FILE = "track_presets.bin"
+MAGIC = b"AEQP"
+FORMAT_VERSION = 2
+
+SECTIONS = ("bands", "presets", "preset_ids", "ids", "id_rows", "urls", "url_rows", "row_preset", "row_gains")
+HEADER = struct.Struct("<4sHHIIIIf4x" + "Q" * len(SECTIONS))
+
+# The reader views sections as native arrays; the file is little-endian
+NATIVE_OK = sys.byteorder == "little"
+
+
+def normalize_url(url):
+    """Compare track URLs without scheme, query, fragment, trailing slash or case."""
+    url = url.strip().split("#", 1)[0].split("?", 1)[0].rstrip("/")
+    return url.split("://", 1)[-1].lower()
+
+
+def url_key(url):
+    """64-bit key of a track URL (blake2b of the normalized URL)."""
+    digest = hashlib.blake2b(normalize_url(url).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def _track_id_key(track_id):
+    """Integer key of a SoundCloud track id, or None if it isn't one."""
+    try:
+        key = int(track_id)
+    except (TypeError, ValueError):
+        return None
+    return key if 0 <= key < 2 ** 64 else None
+
+
+def _sorted_unique(keys, rows):
+    """Sort (key, row) pairs by key, keeping the first row of repeated keys."""
+    keys = np.asarray(keys, dtype="<u8")
+    rows = np.asarray(rows, dtype="<u4")
+    order = np.argsort(keys, kind="stable")
+    keys, rows = keys[order], rows[order]
+    keep = np.ones(len(keys), dtype=bool)
+    keep[1:] = keys[1:] != keys[:-1]
+    return keys[keep], rows[keep]
+
+
+def _align(data, boundary=8):
+    return data + b"\0" * (-len(data) % boundary)
+
+
+def build_table(cluster_data, presets, data_dir=DATA_DIR, bands=EQ_BANDS):
+    """Write the lookup table for track_clusters.json data.
+
+    `presets` maps cluster_id -> gains in `bands` order. A track's gains are
+    the softmax blend over its all_cluster_scores when it has them, otherwise
+    its cluster's preset.
+    """
+    data_dir = Path(data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+
+    preset_ids = list(presets)
+    preset_row = {cid: i for i, cid in enumerate(preset_ids)}
+    preset_matrix = np.array([presets[cid] for cid in preset_ids], dtype=np.float32).reshape(-1, len(bands))
+
+    tracks = []
+    row_preset = []
+    for cluster in cluster_data.get("clusters", []):
+        for track in cluster.get("tracks", []):
+            index = preset_row.get(track.get("cluster") or cluster.get("id"))
+            if index is None:
+                continue
+            tracks.append(track)
+            row_preset.append(index)
+    row_preset = np.asarray(row_preset, dtype="<u2")
+
+    gains = preset_matrix[row_preset] if len(tracks) else np.zeros((0, len(bands)), dtype=np.float32)
+    scored = [row for row, t in enumerate(tracks) if t.get("all_cluster_scores")]
+    if scored:
+        by_cluster = {cid: dict(zip(bands, preset_matrix[i])) for i, cid in enumerate(preset_ids)}
+        gains[scored] = blend_track_gains([tracks[row] for row in scored], by_cluster, bands)
+
+    id_pairs = [(key, row) for row, key in enumerate(_track_id_key(t.get("track_id")) for t in tracks)
+                if key is not None]
+    url_pairs = [(url_key(t["url"]), row) for row, t in enumerate(tracks) if t.get("url")]
+    ids, id_rows = _sorted_unique([k for k, _ in id_pairs], [r for _, r in id_pairs])
+    urls, url_rows = _sorted_unique([k for k, _ in url_pairs], [r for _, r in url_pairs])
+
+    sections = {
+        "bands": np.asarray(bands, dtype="<u4").tobytes(),
+        "presets": quantize(preset_matrix).tobytes(),
+        # JSON, so ids containing newlines or NULs survive the round trip
+        "preset_ids": json.dumps(preset_ids, ensure_ascii=False).encode("utf-8"),
+        "ids": ids.tobytes(),
+        "id_rows": id_rows.tobytes(),
+        "urls": urls.tobytes(),
+        "url_rows": url_rows.tobytes(),
+        "row_preset": row_preset.tobytes(),
+        "row_gains": quantize(gains).tobytes(),
+    }
+
+    offsets = []
+    position = HEADER.size
+    for name in SECTIONS:
+        offsets.append(position)
+        position += len(_align(sections[name]))
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, len(bands), len(tracks), len(ids), len(urls),
+                         len(preset_ids), GAIN_STEP_DB, *offsets)
+
+    # Replace atomically: open readers keep their mapping of the old file
+    path = data_dir / TABLE_FILE
+    with open(f"{path}.tmp", "wb") as f:
+        f.write(header)
+        for name in SECTIONS:
+            f.write(_align(sections[name]))
+    os.replace(f"{path}.tmp", path)
+
+    return {"path": str(path), "rows": len(tracks), "ids": len(ids), "urls": len(urls),
+            "presets": len(preset_ids), "bytes": position}
+
+
+class PresetTable:
+    """Read-only memory-mapped view over a track preset table.
+
+    find_id/find_url return a row (or -1); preset_of/gains_of read that row
+    without parsing anything. lookup() is the convenience form returning dB
+    values. Accessors return copies, so close() never finds the mapping in use.
+    """
+
+    def __init__(self, path=DATA_DIR / TABLE_FILE):
+        if not NATIVE_OK:
+            raise Exception("PresetTable needs a little-endian host")
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, band_count, rows, id_count, url_count, preset_count, step, *offsets = \
+                HEADER.unpack_from(self._mmap)
+        except struct.error:
+            self._mmap.close()
+            raise Exception(f"Not a preset table: {path}")
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._mmap.close()
+            raise Exception(f"Unsupported preset table {magic!r} v{version}: {path}")
+
+        offset = dict(zip(SECTIONS, offsets))
+        view = memoryview(self._mmap)
+
+        def section(name, fmt, count):
+            start = offset[name]
+            return view[start:start + count * struct.calcsize(fmt)].cast(fmt)
+
+        self.rows = rows
+        self.gain_step = step
+        self.bands = section("bands", "I", band_count).tolist()
+        self.band_count = band_count
+        names_end = offset["ids"]
+        self.preset_ids = json.loads(bytes(view[offset["preset_ids"]:names_end]).rstrip(b"\0").decode("utf-8"))
+        self._presets = section("presets", "b", preset_count * band_count)
+        self._ids = section("ids", "Q", id_count)
+        self._id_rows = section("id_rows", "I", id_count)
+        self._urls = section("urls", "Q", url_count)
+        self._url_rows = section("url_rows", "I", url_count)
+        self._row_preset = section("row_preset", "H", rows)
+        self._row_gains = section("row_gains", "b", rows * band_count)
+        self._views = [view, self._presets, self._ids, self._id_rows, self._urls, self._url_rows,
+                       self._row_preset, self._row_gains]
+
+    def __len__(self):
+        return self.rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        views, self._views = self._views, []
+        for v in reversed(views):
+            v.release()
+        self._mmap.close()
+
+    @staticmethod
+    def _find(keys, rows, key):
+        i = bisect.bisect_left(keys, key)
+        return rows[i] if i < len(keys) and keys[i] == key else -1
+
+    def find_id(self, track_id):
+        """Row of a track id, or -1."""
+        key = _track_id_key(track_id)
+        return -1 if key is None else self._find(self._ids, self._id_rows, key)
+
+    def find_url(self, url):
+        """Row of a track URL, or -1."""
+        return self._find(self._urls, self._url_rows, url_key(url))
+
+    def preset_of(self, row):
+        """Preset index of a row (see preset_ids)."""
+        return self._row_preset[row]
+
+    def gains_of(self, row):
+        """Per-track gains of a row in gain steps (list of ints)."""
+        start = row * self.band_count
+        return self._row_gains[start:start + self.band_count].tolist()
+
+    def preset_gains(self, preset):
+        """Gains of a cluster preset in gain steps (list of ints)."""
+        start = preset * self.band_count
+        return self._presets[start:start + self.band_count].tolist()
+
+    def lookup(self, track_id=None, url=None):
+        """{cluster, preset_gains, track_gains} in dB for a track, or None."""
+        row = self.find_id(track_id) if track_id is not None else self.find_url(url) if url else -1
+        if row < 0:
+            return None
+        preset = self.preset_of(row)
+        return {
+            "cluster": self.preset_ids[preset],
+            "preset_gains": {f: g * self.gain_step for f, g in zip(self.bands, self.preset_gains(preset))},
+            "track_gains": {f: g * self.gain_step for f, g in zip(self.bands, self.gains_of(row))},
+        }
+
+
+def main():
+    print("=" * 60)
+    print("Track Preset Lookup Table")
+    print("=" * 60)
+
+    if len(sys.argv) > 1:
+        key = sys.argv[1]
+        with PresetTable(DATA_DIR / TABLE_FILE) as table:
+            result = table.lookup(url=key) if "/" in key else table.lookup(track_id=key)
+        print(json.dumps(result, indent=2) if result else f"Unknown track: {key}")
+        return result
+
+    clusters_file = DATA_DIR / "track_clusters.json"
+    if not clusters_file.exists():
+        print(f"Error: {clusters_file} not found")
+        return
+
+    with open(clusters_file, "r", encoding="utf-8") as f:
+        cluster_data = json.load(f)
+
+    result = build_table(cluster_data, load_preset_gains(DATA_DIR))
+    print(f"Table saved to: {result['path']} ({result['rows']} tracks, {result['bytes']} bytes)")
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Prompt Packing
+Compact encoding of track metadata for LLM prompts, a cheap token estimator
+and token-budgeted batch sizing. Tracks are sent as one tab-separated row
+each under a single header line, with artists that recur in the batch
+listed once and referenced as @n, instead of indented JSON that repeats
+every key (and every artist) for every track.
+"""
+
+import math
+import os
+
+TITLE_CHARS = 100
+ARTIST_CHARS = 50
+MAX_TAGS = 5
+
+# Rough Llama 3 tokenizer rates: Latin text ~4 characters per token, Arabic
+# and other non-ASCII scripts ~2
+ASCII_CHARS_PER_TOKEN = 4.0
+OTHER_CHARS_PER_TOKEN = 2.0
+
+# Prompt tokens per discovery call; requests per second are limited
+# separately, so larger batches mean more tracks per request
+TARGET_PROMPT_TOKENS = int(os.environ.get("GROQ_BATCH_TOKENS", "4000"))
+MIN_BATCH_TRACKS = 20
+MAX_BATCH_TRACKS = 400
+# Calls slower than this shrink the budget
+TARGET_LATENCY_S = 15.0
+
+
+def estimate_tokens(text):
+    """Approximate prompt tokens of `text` without a tokenizer."""
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    other_chars = len(text) - ascii_chars
+    return math.ceil(ascii_chars / ASCII_CHARS_PER_TOKEN + other_chars / OTHER_CHARS_PER_TOKEN)
+
+
+def _field(value, limit=None):
+    text = " ".join(str(value or "").split())
+    return text[:limit] if limit else text
+
+
+def _tags(track):
+    tags = track.get("tags")
+    if not isinstance(tags, list):
+        return ""
+    return ", ".join(t for t in (_field(tag) for tag in tags[:MAX_TAGS]) if t)
+
+
+def pack_tracks(tracks):
+    """Tracks as an artist list plus "index<TAB>artist<TAB>title<TAB>genre<TAB>tags" rows.
+
+    Row indices are positions in `tracks`. Artists appearing more than once
+    are written as @n (see the artist list); empty trailing fields are left off.
+    """
+    artists = [_field(t.get("artist"), ARTIST_CHARS) for t in tracks]
+    counts = {}
+    for artist in artists:
+        counts[artist] = counts.get(artist, 0) + 1
+    refs = {}
+    for artist in artists:
+        if artist and counts[artist] > 1 and artist not in refs:
+            refs[artist] = f"@{len(refs)}"
+
+    lines = []
+    if refs:
+        lines.append("Artists:")
+        lines.extend(f"{ref}\t{artist}" for artist, ref in refs.items())
+    lines.append("Tracks (index\tartist\ttitle\tgenre\ttags):")
+    for i, (track, artist) in enumerate(zip(tracks, artists)):
+        row = [str(i), refs.get(artist, artist), _field(track.get("title"), TITLE_CHARS),
+               _field(track.get("genre")), _tags(track)]
+        while len(row) > 1 and not row[-1]:
+            row.pop()
+        lines.append("\t".join(row))
+    return "\n".join(lines)
+
+
+class BatchSizer:
+    """Picks how many tracks go into the next prompt from a token budget.
+
+    The budget adapts to how calls went (observe()): a reply cut off at
+    max_tokens or that fails to parse halves it, a call slower than
+    target_latency shrinks it proportionally, and a fast clean call grows it
+    back towards the starting budget. Estimates are rescaled by the ratio of
+    reported to estimated prompt tokens.
+    """
+
+    def __init__(self, budget=TARGET_PROMPT_TOKENS, min_tracks=MIN_BATCH_TRACKS,
+                 max_tracks=MAX_BATCH_TRACKS, target_latency=TARGET_LATENCY_S):
+        self.max_budget = budget
+        self.budget = budget
+        self.min_tracks = min_tracks
+        self.max_tracks = max_tracks
+        self.target_latency = target_latency
+        self.scale = 1.0
+
+    def take(self, tracks, start=0, overhead=0):
+        """Number of tracks from tracks[start:] whose packed rows fit the budget.
+
+        `overhead` is the estimated tokens of the rest of the prompt. At least
+        min_tracks are taken when that many remain.
+        """
+        available = self.budget / self.scale - overhead
+        seen = set()
+        count = used = 0
+        for track in tracks[start:start + self.max_tracks]:
+            artist = _field(track.get("artist"), ARTIST_CHARS)
+            # A repeated artist costs a @n reference (plus its list entry once)
+            cost = estimate_tokens(f"{count}\t@\t{_field(track.get('title'), TITLE_CHARS)}\t"
+                                   f"{_field(track.get('genre'))}\t{_tags(track)}\n")
+            if artist not in seen:
+                cost += estimate_tokens(artist)
+                seen.add(artist)
+            if used + cost > available and count >= self.min_tracks:
+                break
+            used += cost
+            count += 1
+        return count
+
+    def observe(self, meta):
+        """Adapt the budget to one call's meta (see groq_cluster.call_groq)."""
+        if "latency" not in meta:
+            return  # the call never got a reply
+
+        estimated, reported = meta.get("estimated_tokens"), meta.get("prompt_tokens")
+        if estimated and reported:
+            self.scale = 0.7 * self.scale + 0.3 * (reported / estimated)
+
+        floor = self.max_budget / 8
+        if meta.get("finish_reason") == "length" or meta.get("failed"):
+            self.budget = max(floor, self.budget / 2)
+        elif meta["latency"] > self.target_latency:
+            self.budget = max(floor, self.budget * max(0.5, self.target_latency / meta["latency"]))
+        else:
+            self.budget = min(self.max_budget, self.budget * 1.25)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Rate Limiting
+Thread-safe token bucket used to pace outgoing API requests, plus a registry
+of named process-wide limiters (one per API) shared by all workers.
+"""
+
+import threading
+import time
+
+
+class TokenBucket:
+    """Token bucket: `rate` tokens per second, bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1.0):
+        """Block until `tokens` are available, then take them."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def try_acquire(self, tokens=1.0):
+        """Take `tokens` if available right now; return whether it succeeded."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+
+# Process-wide limiters by name, so concurrent pipeline runs share one budget
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name, rate, capacity=None):
+    """The process-wide TokenBucket for `name` (created on first use)."""
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limiter = _limiters[name] = TokenBucket(rate, capacity)
+        return limiter
@@ -2,20 +2,39 @@
 """
 SoundCloud Likes Scraper using Playwright
 Scrapes directly from the browser with proper rendering.
+
+Default mode is headless: images, fonts and media are blocked and the likes
+JSON the page fetches for itself is captured while scrolling, stopping once
+a page comes back without next_href. --headed keeps the old DOM scraper.
 """
 
+import argparse
 import json
 import time
 import re
 from datetime import datetime
 from pathlib import Path
+from urllib.parse import urlparse
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
 from playwright.sync_api import sync_playwright
 
+from enrich_tracks import enrich_tracks
+from scrape_likes_http import scan_page
+from track import Track, json_default
+
 OUTPUT_DIR = Path(__file__).parent.parent / "data"
 OUTPUT_DIR.mkdir(exist_ok=True)
 
 TARGET_URL = "https://soundcloud.com/amr-farouk-10/likes"
 
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# Headless mode: resource types never needed to read likes
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}
+# How long to wait for the next likes response after a scroll
+RESPONSE_TIMEOUT_MS = 15000
+MAX_SCROLLS = 1000
+
 
 def parse_duration(duration_str):
     """Parse duration string like '3:45' to seconds."""
@@ -29,12 +48,99 @@ def parse_duration(duration_str):
     return None
 
 
-def main():
-    print("=" * 60)
-    print("SoundCloud Likes Scraper")
-    print("=" * 60)
-    print(f"Target: {TARGET_URL}")
+def is_likes_response(response):
+    """True for the API v2 likes pages the web app requests while scrolling."""
+    parsed = urlparse(response.url)
+    return parsed.netloc.startswith("api") and parsed.path.endswith("/likes")
+
+
+def block_heavy_resources(route):
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        route.abort()
+    else:
+        route.continue_()
+
+
+def add_tracks(collection, tracks, seen_ids):
+    """Append new tracks from a likes collection; returns how many were new."""
+    added = 0
+    for item in collection:
+        track = Track.from_api(item) if isinstance(item, dict) else None
+        if track and track.track_id not in seen_ids:
+            seen_ids.add(track.track_id)
+            tracks.append(track)
+            added += 1
+    return added
+
+
+def scrape_headless(target_url=TARGET_URL, max_scrolls=MAX_SCROLLS):
+    """Scrape likes by capturing the page's own /likes JSON responses."""
+    tracks = []
+    seen_ids = set()
+
+    with sync_playwright() as p:
+        print("\nLaunching headless browser...")
+        browser = p.chromium.launch(
+            headless=True,
+            args=['--disable-blink-features=AutomationControlled']
+        )
+        context = browser.new_context(viewport={"width": 1280, "height": 2000}, user_agent=USER_AGENT)
+        context.route("**/*", block_heavy_resources)
+        page = context.new_page()
+
+        print(f"Navigating to {target_url}...")
+        page.goto(target_url, wait_until="domcontentloaded", timeout=60000)
+
+        # First page of likes is embedded in the HTML
+        hydration, _ = scan_page(page.content())
+        for entry in hydration or []:
+            if entry.get('hydratable') in ('soundCollection', 'collection', 'playlist'):
+                data = entry.get('data') or {}
+                add_tracks(data.get('collection', data.get('tracks', [])), tracks, seen_ids)
+        print(f"Hydration: {len(tracks)} tracks")
+
+        # Each scroll triggers the next /likes request; follow them until the end.
+        # Responses are collected by a listener too, so one that lands between
+        # two waits isn't lost.
+        captured = []
+        page.on("response", lambda r: captured.append(r) if is_likes_response(r) else None)
+        processed = 0
+        done = False
+
+        for scroll_num in range(max_scrolls):
+            if processed == len(captured):
+                try:
+                    with page.expect_response(is_likes_response, timeout=RESPONSE_TIMEOUT_MS) as response_info:
+                        page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+                    if response_info.value not in captured:
+                        captured.append(response_info.value)
+                except PlaywrightTimeoutError:
+                    print("No likes request after scrolling, assuming end of list.")
+                    break
+
+            while processed < len(captured) and not done:
+                response = captured[processed]
+                processed += 1
+                if not response.ok:
+                    print(f"Likes response HTTP {response.status}, stopping.")
+                    done = True
+                    break
+                data = response.json()
+                added = add_tracks(data.get('collection', []), tracks, seen_ids)
+                print(f"Page {processed}: {len(tracks)} tracks ({added} new)")
+                if not data.get('next_href'):
+                    print("Reached the last page of likes.")
+                    done = True
+            if done:
+                break
+
+        browser.close()
+
+    return tracks
+
 
+def scrape_dom(target_url=TARGET_URL):
+    """Headed DOM scraper: scrolls on a timer and reads track links."""
     with sync_playwright() as p:
         # Launch browser in headed mode to avoid crashes
         print("\nLaunching browser...")
@@ -45,14 +151,14 @@ def main():
 
         context = browser.new_context(
             viewport={"width": 1920, "height": 1080},
-            user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+            user_agent=USER_AGENT
         )
 
         page = context.new_page()
 
         # Navigate to likes page
-        print(f"Navigating to {TARGET_URL}...")
-        page.goto(TARGET_URL, timeout=60000)
+        print(f"Navigating to {target_url}...")
+        page.goto(target_url, timeout=60000)
 
         # Wait for initial content
         print("Waiting for content to load...")
@@ -67,9 +173,6 @@ def main():
         print("Starting to scroll and collect tracks...")
 
         for scroll_num in range(100):
-            # Get page HTML and parse tracks
-            html = page.content()
-
             # Find all track links with titles
             # SoundCloud uses various structures, let's try to find tracks
             track_links = page.query_selector_all('a.soundTitle__title, a[class*="trackItem__trackTitle"]')
@@ -94,12 +197,12 @@ def main():
                             if len(parts) >= 1:
                                 artist = parts[0]
 
-                        tracks.append({
-                            "title": title,
-                            "artist": artist,
-                            "url": full_url,
-                            "scraped_at": datetime.now().isoformat()
-                        })
+                        tracks.append(Track(
+                            title=title,
+                            artist=artist,
+                            url=full_url,
+                            scraped_at=datetime.now().isoformat()
+                        ))
                         seen_urls.add(href)
 
                 except Exception as e:
@@ -135,38 +238,13 @@ def main():
                         try:
                             data = json.loads(match)
                             if data.get('permalink_url') and data['permalink_url'] not in seen_urls:
-                                tracks.append({
-                                    "title": data.get('title', 'Unknown'),
-                                    "artist": data.get('user', {}).get('username', 'Unknown'),
-                                    "url": data.get('permalink_url'),
-                                    "duration": data.get('duration'),
-                                    "genre": data.get('genre'),
-                                    "plays": data.get('playback_count'),
-                                    "scraped_at": datetime.now().isoformat()
-                                })
+                                tracks.append(Track.from_api(data, scraped_at=datetime.now().isoformat()))
                                 seen_urls.add(data['permalink_url'])
                         except:
                             continue
             except:
                 continue
 
-        # Save results
-        output = {
-            "source": TARGET_URL,
-            "track_count": len(tracks),
-            "scraped_at": datetime.now().isoformat(),
-            "tracks": tracks
-        }
-
-        output_file = OUTPUT_DIR / "soundcloud_likes.json"
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(output, f, ensure_ascii=False, indent=2)
-
-        print("\n" + "=" * 60)
-        print(f"Scraped {len(tracks)} tracks")
-        print(f"Saved to: {output_file}")
-        print("=" * 60)
-
         # Take screenshot for debugging
         screenshot_path = OUTPUT_DIR / "soundcloud_screenshot.png"
         page.screenshot(path=str(screenshot_path))
@@ -177,5 +255,46 @@ def main():
         return tracks
 
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape SoundCloud likes with Playwright")
+    parser.add_argument("--headed", action="store_true",
+                        help="Visible browser, DOM scraping on a scroll timer (old behaviour)")
+    parser.add_argument("--url", default=TARGET_URL)
+    args = parser.parse_args(argv)
+
+    print("=" * 60)
+    print("SoundCloud Likes Scraper")
+    print("=" * 60)
+    print(f"Target: {args.url}")
+
+    start = time.time()
+    tracks = scrape_dom(args.url) if args.headed else scrape_headless(args.url)
+
+    # Fill genre/tags/duration for DOM-scraped tracks (API tracks are skipped)
+    try:
+        enrich_tracks(tracks, data_dir=OUTPUT_DIR)
+    except Exception as e:
+        print(f"Enrichment failed: {e}")
+
+    # Save results
+    output = {
+        "source": args.url,
+        "track_count": len(tracks),
+        "scraped_at": datetime.now().isoformat(),
+        "tracks": tracks
+    }
+
+    output_file = OUTPUT_DIR / "soundcloud_likes.json"
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(output, f, ensure_ascii=False, indent=2, default=json_default)
+
+    print("\n" + "=" * 60)
+    print(f"Scraped {len(tracks)} tracks in {time.time() - start:.1f}s")
+    print(f"Saved to: {output_file}")
+    print("=" * 60)
+
+    return tracks
+
+
 if __name__ == "__main__":
     main()
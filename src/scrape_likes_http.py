@@ -5,16 +5,22 @@ Parses the initial page data without browser automation.
 """
 
 import json
+import os
 import re
 import time
 from datetime import datetime
 from pathlib import Path
 import requests
 
+from enrich_tracks import enrich_tracks
+from track import Track, json_default
+
 OUTPUT_DIR = Path(__file__).parent.parent / "data"
 OUTPUT_DIR.mkdir(exist_ok=True)
 
-TARGET_URL = "https://soundcloud.com/amr-farouk-10/likes"
+SOUNDCLOUD_URL = os.environ.get("SOUNDCLOUD_URL", "https://soundcloud.com")
+API_V2 = os.environ.get("SOUNDCLOUD_API_URL", "https://api-v2.soundcloud.com")
+TARGET_URL = f"{SOUNDCLOUD_URL}/amr-farouk-10/likes"
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
@@ -25,57 +31,112 @@ HEADERS = {
 }
 
 
+HYDRATION_MARKER = "window.__sc_hydration"
+
+# Where a client_id can appear in the page, in order of preference
+CLIENT_ID_MARKERS = ('"clientId"', 'client_id=', '"client_id"')
+
+_decoder = json.JSONDecoder()
+
+
+def _read_token(html, i):
+    """Read an alphanumeric run starting at index i."""
+    j = i
+    n = len(html)
+    while j < n and html[j].isalnum():
+        j += 1
+    return html[i:j]
+
+
+def _find_client_ids(html, start, end, candidates):
+    """Collect client_id candidates from html[start:end] by marker search."""
+    for marker in CLIENT_ID_MARKERS:
+        i = html.find(marker, start, end)
+        while i != -1:
+            j = i + len(marker)
+            if marker[0] == '"':
+                # "key" : "value"
+                while j < end and html[j] in ' \t\n:':
+                    j += 1
+                if j < end and html[j] == '"':
+                    j += 1
+                else:
+                    i = html.find(marker, j, end)
+                    continue
+            token = _read_token(html, j)
+            if token and token not in candidates:
+                candidates.append(token)
+            i = html.find(marker, j, end)
+
+
+def _decode_hydration(html, i):
+    """Decode the array starting at html[i]; returns (data, end index)."""
+    try:
+        return _decoder.raw_decode(html, i)
+    except json.JSONDecodeError:
+        pass
+
+    # Slow path only for malformed pages: trailing commas inside the script
+    close = html.find("</script>", i)
+    json_str = html[i:close if close != -1 else len(html)].rstrip().rstrip(";")
+    json_str = re.sub(r',\s*]', ']', json_str)
+    json_str = re.sub(r',\s*}', '}', json_str)
+    try:
+        return json.loads(json_str), close
+    except json.JSONDecodeError as e:
+        print(f"JSON parse error: {e}")
+        return None, i
+
+
+def scan_page(html):
+    """Single pass over a profile page.
+
+    Finds the __sc_hydration script by index search, decodes it in place
+    with raw_decode, and collects client_id candidates (the hydration's
+    apiClient entry first, then markers in the surrounding HTML).
+    Returns (hydration or None, client_id candidates).
+    """
+    hydration = None
+    candidates = []
+
+    i = html.find(HYDRATION_MARKER)
+    if i == -1:
+        _find_client_ids(html, 0, len(html), candidates)
+        return None, candidates
+
+    j = html.find("[", i + len(HYDRATION_MARKER))
+    if j != -1:
+        hydration, end = _decode_hydration(html, j)
+    if hydration is None:
+        _find_client_ids(html, 0, len(html), candidates)
+        return None, candidates
+
+    for entry in hydration:
+        if isinstance(entry, dict) and entry.get('hydratable') == 'apiClient':
+            client_id = (entry.get('data') or {}).get('id')
+            if client_id:
+                candidates.append(client_id)
+
+    # Everything outside the hydration array (which was already decoded)
+    _find_client_ids(html, 0, i, candidates)
+    _find_client_ids(html, end, len(html), candidates)
+    return hydration, candidates
+
+
 def extract_hydration_data(html):
     """Extract __sc_hydration data from HTML."""
-    # Look for the hydration script
-    pattern = r'<script>window\.__sc_hydration\s*=\s*(\[.*?\]);</script>'
-    match = re.search(pattern, html, re.DOTALL)
-
-    if match:
-        try:
-            data = json.loads(match.group(1))
-            return data
-        except json.JSONDecodeError:
-            pass
-
-    # Try alternative pattern
-    pattern2 = r'window\.__sc_hydration\s*=\s*(\[[\s\S]*?\]);'
-    match2 = re.search(pattern2, html)
-    if match2:
-        try:
-            # Clean up the JSON string
-            json_str = match2.group(1)
-            # Fix common issues
-            json_str = re.sub(r',\s*]', ']', json_str)
-            json_str = re.sub(r',\s*}', '}', json_str)
-            data = json.loads(json_str)
-            return data
-        except json.JSONDecodeError as e:
-            print(f"JSON parse error: {e}")
-
-    return None
+    return scan_page(html)[0]
 
 
 def extract_client_id(html):
     """Extract client_id from page."""
-    patterns = [
-        r'"clientId"\s*:\s*"([a-zA-Z0-9]+)"',
-        r'client_id=([a-zA-Z0-9]+)',
-        r'"client_id"\s*:\s*"([a-zA-Z0-9]+)"',
-    ]
-
-    for pattern in patterns:
-        match = re.search(pattern, html)
-        if match:
-            return match.group(1)
-
-    return None
+    candidates = scan_page(html)[1]
+    return candidates[0] if candidates else None
 
 
 def fetch_api_v2(endpoint, client_id, params=None):
     """Fetch from SoundCloud API v2."""
-    base_url = "https://api-v2.soundcloud.com"
-    url = f"{base_url}{endpoint}"
+    url = f"{API_V2}{endpoint}"
 
     if params is None:
         params = {}
@@ -111,7 +172,9 @@ def main():
 
     # Extract hydration data
     print("\nExtracting embedded data...")
-    hydration = extract_hydration_data(html)
+    hydration, client_ids = scan_page(html)
+    if client_ids:
+        print(f"client_id candidates: {', '.join(c[:8] + '...' for c in client_ids)}")
 
     tracks = []
 
@@ -135,22 +198,7 @@ def main():
                 for item in collection:
                     track = item.get('track', item) if isinstance(item, dict) else item
                     if isinstance(track, dict) and track.get('kind') == 'track':
-                        tracks.append({
-                            "title": track.get('title', 'Unknown'),
-                            "artist": track.get('user', {}).get('username', 'Unknown'),
-                            "artist_id": track.get('user', {}).get('id'),
-                            "url": track.get('permalink_url'),
-                            "duration_ms": track.get('duration'),
-                            "duration": format_duration(track.get('duration')),
-                            "plays": track.get('playback_count'),
-                            "likes": track.get('likes_count'),
-                            "genre": track.get('genre'),
-                            "tag_list": track.get('tag_list', ''),
-                            "description": (track.get('description') or '')[:500],
-                            "created_at": track.get('created_at'),
-                            "artwork_url": track.get('artwork_url'),
-                            "track_id": track.get('id'),
-                        })
+                        tracks.append(Track.from_api(item))
 
             # Check for soundCollection (likes)
             elif hydratable in ['soundCollection', 'collection']:
@@ -160,23 +208,7 @@ def main():
                 for item in collection:
                     track = item.get('track', item)
                     if isinstance(track, dict) and track.get('kind') == 'track':
-                        tracks.append({
-                            "title": track.get('title', 'Unknown'),
-                            "artist": track.get('user', {}).get('username', 'Unknown'),
-                            "artist_id": track.get('user', {}).get('id'),
-                            "url": track.get('permalink_url'),
-                            "duration_ms": track.get('duration'),
-                            "duration": format_duration(track.get('duration')),
-                            "plays": track.get('playback_count'),
-                            "likes": track.get('likes_count'),
-                            "genre": track.get('genre'),
-                            "tag_list": track.get('tag_list', ''),
-                            "description": (track.get('description') or '')[:500],
-                            "created_at": track.get('created_at'),
-                            "artwork_url": track.get('artwork_url'),
-                            "track_id": track.get('id'),
-                            "liked_at": item.get('created_at'),
-                        })
+                        tracks.append(Track.from_api(item))
     else:
         print("No hydration data found")
 
@@ -186,12 +218,12 @@ def main():
             try:
                 ld_data = json.loads(match.group(1))
                 if isinstance(ld_data, dict) and ld_data.get('@type') == 'MusicRecording':
-                    tracks.append({
-                        "title": ld_data.get('name', 'Unknown'),
-                        "artist": ld_data.get('byArtist', {}).get('name', 'Unknown'),
-                        "url": ld_data.get('url'),
-                        "duration": ld_data.get('duration'),
-                    })
+                    tracks.append(Track(
+                        title=ld_data.get('name', 'Unknown'),
+                        artist=ld_data.get('byArtist', {}).get('name', 'Unknown'),
+                        url=ld_data.get('url'),
+                        duration=ld_data.get('duration'),
+                    ))
             except json.JSONDecodeError:
                 continue
 
@@ -204,6 +236,12 @@ def main():
             seen.add(key)
             unique_tracks.append(track)
 
+    # JSON-LD tracks carry only title/artist/url
+    try:
+        enrich_tracks(unique_tracks, client_ids[0] if client_ids else None, OUTPUT_DIR)
+    except Exception as e:
+        print(f"Enrichment failed: {e}")
+
     # Save results
     output = {
         "source": TARGET_URL,
@@ -214,7 +252,7 @@ def main():
 
     output_file = OUTPUT_DIR / "soundcloud_likes.json"
     with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(output, f, ensure_ascii=False, indent=2)
+        json.dump(output, f, ensure_ascii=False, indent=2, default=json_default)
 
     print("\n" + "=" * 60)
     print(f"Scraped {len(unique_tracks)} tracks")
@@ -231,15 +269,5 @@ def main():
     return unique_tracks
 
 
-def format_duration(ms):
-    """Convert milliseconds to MM:SS format."""
-    if not ms:
-        return None
-    seconds = ms // 1000
-    minutes = seconds // 60
-    secs = seconds % 60
-    return f"{minutes}:{secs:02d}"
-
-
 if __name__ == "__main__":
     main()
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Track Similarity Index
+Builds a nearest-neighbor index over per-track feature vectors and stores
+the top-k neighbors of every track. Libraries of up to a few thousand tracks
+get the exact top-k; larger ones use random-projection LSH.
+"""
+
+import json
+import os
+import sys
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from track import TrackTable
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+
+INDEX_FILE = "track_neighbors.bin"
+MANIFEST_FILE = "track_neighbors.json"
+INDEX_VERSION = 1
+
+# EQ frequency bands (must match generate_eq_presets.EQ_BANDS)
+EQ_BANDS = [32, 64, 125, 250, 500, 1000, 2000, 4000, 8000, 16000]
+
+# Feature hashing
+FEATURE_DIM = 512
+FIELD_WEIGHTS = {
+    "title": 1.0,
+    "artist": 1.5,
+    "genre": 2.0,
+    "tag_list": 1.0,
+}
+# Track.norm attribute holding each field's normalized tokens
+NORM_FIELDS = {"title": "title", "artist": "artist", "genre": "genre", "tag_list": "tags"}
+DURATION_WEIGHT = 0.5
+
+# Up to this many tracks the neighbors are exact (all-pairs, in row chunks)
+EXACT_MAX_ROWS = 4096
+EXACT_CHUNK_ROWS = 1024
+
+# LSH parameters
+NUM_TABLES = 8
+NUM_BITS = 10
+MAX_CANDIDATES = 2048
+DEFAULT_K = 20
+SEED = 1337
+
+# Similarities are stored as Q15 fixed point (int16)
+SIM_SCALE = 32767
+
+
+def track_key(track):
+    """Return the lookup key of a track (track_id, falling back to URL)."""
+    key = track.get("track_id")
+    if key is None or key == "":
+        key = track.get("url")
+    return None if key is None or key == "" else str(key)
+
+
+def track_features(tracks, dim=FEATURE_DIM):
+    """Build an L2-normalized (tracks x dim) feature matrix via feature hashing."""
+    table = TrackTable.from_tracks(tracks)
+    features = np.zeros((len(table), dim + 1), dtype=np.float32)
+
+    # Tokens come from the normalized fields stored at ingest; bucket ids
+    # are cached since artists/genres repeat
+    buckets = {}
+    for row, norm in enumerate(table.norms):
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in getattr(norm, NORM_FIELDS[field]).split():
+                bucket = buckets.get((field, token))
+                if bucket is None:
+                    bucket = buckets[(field, token)] = zlib.crc32(f"{field}:{token}".encode("utf-8")) % dim
+                features[row, bucket] += weight
+
+    # Duration as one extra dimension (log minutes)
+    durations = np.array([d or 0 for d in table.column("duration_ms")], dtype=np.float64)
+    features[:, dim] = DURATION_WEIGHT * np.log1p(durations / 60000)
+
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return features / norms
+
+
+def _bucket_table(codes):
+    """Group rows by LSH code: returns {code: array of row indices}."""
+    if len(codes) == 0:
+        return {}
+    order = np.argsort(codes, kind="stable")
+    boundaries = np.flatnonzero(np.diff(codes[order])) + 1
+    return {int(codes[group[0]]): group for group in np.split(order, boundaries)}
+
+
+def exact_neighbors(features, k=DEFAULT_K, chunk_rows=EXACT_CHUNK_ROWS):
+    """Exact top-k cosine neighbors for every row of `features`.
+
+    Same result layout as nearest_neighbors(); scores are computed
+    chunk_rows rows at a time so memory stays at chunk_rows x rows.
+    """
+    n = features.shape[0]
+    indices = np.full((n, k), -1, dtype=np.int32)
+    sims = np.zeros((n, k), dtype=np.float32)
+    top = min(k, n - 1)
+    if top <= 0:
+        return indices, sims
+
+    for start in range(0, n, chunk_rows):
+        scores = features[start:start + chunk_rows] @ features.T
+        rows = np.arange(len(scores))
+        scores[rows, start + rows] = -np.inf  # a track is not its own neighbor
+        best = np.argpartition(-scores, top - 1, axis=1)[:, :top]
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        indices[start:start + len(scores), :top] = np.take_along_axis(best, order, axis=1)
+        sims[start:start + len(scores), :top] = np.take_along_axis(best_scores, order, axis=1)
+
+    return indices, sims
+
+
+def nearest_neighbors(features, k=DEFAULT_K, num_tables=NUM_TABLES, num_bits=NUM_BITS, seed=SEED,
+                      exact_max_rows=EXACT_MAX_ROWS):
+    """Top-k cosine neighbors for every row of `features`.
+
+    Exact up to exact_max_rows rows, approximate (LSH) above that. Returns
+    (indices, similarities), both shaped (rows, k); missing neighbors are
+    padded with index -1 and similarity 0.
+    """
+    n, dim = features.shape
+    if n <= exact_max_rows:
+        return exact_neighbors(features, k)
+    rng = np.random.default_rng(seed)
+    planes = rng.standard_normal((num_tables, dim, num_bits)).astype(np.float32)
+    powers = (1 << np.arange(num_bits)).astype(np.int64)
+
+    codes = [((features @ planes[t]) > 0).astype(np.int64) @ powers for t in range(num_tables)]
+    tables = [_bucket_table(c) for c in codes]
+
+    indices = np.full((n, k), -1, dtype=np.int32)
+    sims = np.zeros((n, k), dtype=np.float32)
+
+    for row in range(n):
+        candidates = np.unique(np.concatenate([
+            tables[t][int(codes[t][row])] for t in range(num_tables)
+        ]))
+        candidates = candidates[candidates != row]
+        if len(candidates) == 0:
+            continue
+        if len(candidates) > MAX_CANDIDATES:
+            candidates = rng.choice(candidates, MAX_CANDIDATES, replace=False)
+
+        scores = features[candidates] @ features[row]
+        top = min(k, len(candidates))
+        best = np.argpartition(-scores, top - 1)[:top]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        indices[row, :top] = candidates[best]
+        sims[row, :top] = scores[best]
+
+    return indices, sims
+
+
+def tracks_from_clusters(cluster_data):
+    """Flatten track_clusters.json into a (TrackTable, cluster_ids) pair."""
+    tracks = TrackTable()
+    cluster_ids = []
+    seen = set()
+    for cluster in cluster_data.get("clusters", []):
+        for track in cluster.get("tracks", []):
+            key = track_key(track)
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            tracks.append(track)
+            cluster_ids.append(track.get("cluster") or cluster.get("id"))
+    return tracks, cluster_ids
+
+
+def build_index(tracks, cluster_ids, data_dir=DATA_DIR, k=DEFAULT_K):
+    """Build the neighbor index for `tracks` and write it to `data_dir`."""
+    data_dir = Path(data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+
+    keys = [track_key(t) for t in tracks]
+    k = max(1, min(k, len(tracks) - 1)) if len(tracks) > 1 else 1
+
+    features = track_features(tracks)
+    indices, sims = nearest_neighbors(features, k=k)
+
+    # Index layout: int32[rows, k] neighbor rows, then int16[rows, k] Q15 similarities
+    # Replace atomically, index before manifest: open readers keep their
+    # mapping of the old file
+    path = data_dir / INDEX_FILE
+    with open(f"{path}.tmp", "wb") as f:
+        f.write(indices.astype("<i4").tobytes())
+        f.write(np.round(np.clip(sims, -1, 1) * SIM_SCALE).astype("<i2").tobytes())
+    os.replace(f"{path}.tmp", path)
+
+    manifest = {
+        "version": INDEX_VERSION,
+        "built_at": datetime.now().isoformat(),
+        "count": len(keys),
+        "k": k,
+        "index_file": INDEX_FILE,
+        "layout": {"indices": "<i4", "similarities": "<i2", "similarity_scale": SIM_SCALE},
+        "track_ids": keys,
+        "clusters": cluster_ids,
+    }
+    path = data_dir / MANIFEST_FILE
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(f"{path}.tmp", path)
+
+    return manifest
+
+
+class SimilarityIndex:
+    """Read-only view over a built neighbor index (memory-mapped; build_index
+    replaces the files rather than rewriting them, so the mapping stays valid)."""
+
+    def __init__(self, data_dir=DATA_DIR):
+        data_dir = Path(data_dir)
+        with open(data_dir / MANIFEST_FILE, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        self.k = manifest["k"]
+        self.track_ids = manifest["track_ids"]
+        self.clusters = manifest["clusters"]
+        self.rows = {key: row for row, key in enumerate(self.track_ids)}
+
+        count = manifest["count"]
+        if count == 0:
+            # mmap can't map an empty file
+            self._indices = np.zeros((0, self.k), dtype="<i4")
+            self._sims = np.zeros((0, self.k), dtype="<i2")
+            return
+        path = data_dir / manifest["index_file"]
+        if os.path.getsize(path) != count * self.k * 6:
+            raise ValueError(f"{path} does not match its manifest (rebuilt while opening?)")
+        self._indices = np.memmap(path, dtype="<i4", mode="r", shape=(count, self.k))
+        self._sims = np.memmap(path, dtype="<i2", mode="r", offset=count * self.k * 4,
+                               shape=(count, self.k))
+
+    def similar(self, track_id, k=10):
+        """Return up to k (track_id, similarity) pairs most similar to track_id."""
+        row = self.rows.get(str(track_id))
+        if row is None:
+            return []
+        neighbors = self._indices[row, :min(k, self.k)]
+        sims = self._sims[row, :min(k, self.k)]
+        return [
+            (self.track_ids[n], round(float(s) / SIM_SCALE, 4))
+            for n, s in zip(neighbors, sims) if n >= 0
+        ]
+
+    def suggest_eq(self, track_id, presets, k=10):
+        """Similarity-weighted blend of the neighbors' cluster presets.
+
+        `presets` maps cluster_id -> list of gains in EQ_BANDS order. The
+        track's own cluster takes part with weight 1.0.
+        """
+        row = self.rows.get(str(track_id))
+        if row is None:
+            return None
+
+        weighted = [(self.clusters[row], 1.0)]
+        for neighbor, sim in self.similar(track_id, k):
+            if sim > 0:
+                weighted.append((self.clusters[self.rows[neighbor]], sim))
+
+        total = np.zeros(len(EQ_BANDS))
+        weight_sum = 0.0
+        for cluster_id, weight in weighted:
+            gains = presets.get(cluster_id)
+            if gains is None:
+                continue
+            total += weight * np.asarray(gains, dtype=float)
+            weight_sum += weight
+
+        if weight_sum == 0:
+            return None
+        return [round(float(g), 1) for g in total / weight_sum]
+
+
+def load_preset_gains(data_dir=DATA_DIR):
+    """Load cluster_id -> gains (EQ_BANDS order) from eq_presets_detailed.json."""
+    with open(Path(data_dir) / "eq_presets_detailed.json", "r", encoding="utf-8") as f:
+        detailed = json.load(f)
+
+    presets = {}
+    for preset in detailed.get("presets", []):
+        settings = preset.get("eq_settings", {})
+        presets[preset["cluster_id"]] = [float(settings.get(str(freq), settings.get(freq, 0)))
+                                         for freq in EQ_BANDS]
+    return presets
+
+
+# data_dir -> (manifest mtime, SimilarityIndex); reopened once the index is rebuilt
+_index_cache = {}
+
+
+def similar(track_id, k=10, data_dir=DATA_DIR):
+    """Return the k tracks most similar to track_id as (track_id, similarity) pairs."""
+    key = str(data_dir)
+    mtime = os.stat(Path(data_dir) / MANIFEST_FILE).st_mtime_ns
+    cached = _index_cache.get(key)
+    if cached is None or cached[0] != mtime:
+        cached = _index_cache[key] = (mtime, SimilarityIndex(data_dir))
+    return cached[1].similar(track_id, k)
+
+
+def main():
+    print("=" * 60)
+    print("Track Similarity Index")
+    print("=" * 60)
+
+    clusters_file = DATA_DIR / "track_clusters.json"
+    if not clusters_file.exists():
+        print(f"Error: {clusters_file} not found")
+        return
+
+    if len(sys.argv) > 1:
+        for neighbor, sim in similar(sys.argv[1], k=10):
+            print(f"  {neighbor}: {sim:.3f}")
+        return
+
+    with open(clusters_file, "r", encoding="utf-8") as f:
+        cluster_data = json.load(f)
+
+    tracks, cluster_ids = tracks_from_clusters(cluster_data)
+    print(f"Loaded {len(tracks)} tracks")
+
+    manifest = build_index(tracks, cluster_ids)
+    print(f"Index saved to: {DATA_DIR / INDEX_FILE} (k={manifest['k']})")
+
+    return manifest
+
+
+if __name__ == "__main__":
+    main()
@@ -5,18 +5,23 @@ More reliable than browser-based scraping.
 """
 
 import json
-import time
+import os
 import re
 import requests
 from datetime import datetime
 from pathlib import Path
 from urllib.parse import urlencode, quote
 
+import fetch_likes
+from fetch_likes import iter_like_pages
+from track import Track, json_default
+
 OUTPUT_DIR = Path(__file__).parent.parent / "data"
 OUTPUT_DIR.mkdir(exist_ok=True)
 
 # SoundCloud API configuration
-BASE_API = "https://api-v2.soundcloud.com"
+SOUNDCLOUD_URL = os.environ.get("SOUNDCLOUD_URL", "https://soundcloud.com")
+BASE_API = fetch_likes.API_V2
 USER_PROFILE = "amr-farouk-10"
 
 def get_client_id():
@@ -25,7 +30,7 @@ def get_client_id():
 
     # Try to get client_id from the main page
     response = requests.get(
-        "https://soundcloud.com",
+        SOUNDCLOUD_URL,
         headers={
             "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
         }
@@ -39,7 +44,7 @@ def get_client_id():
         return client_id
 
     # Try fetching one of the JS bundles
-    js_urls = re.findall(r'https://[^"]+\.js', response.text)
+    js_urls = re.findall(r'https?://[^"]+\.js', response.text)
     for js_url in js_urls[:5]:
         try:
             js_response = requests.get(js_url, timeout=10)
@@ -87,70 +92,31 @@ def resolve_user(username, client_id):
 
 
 def get_user_likes(user_id, client_id, limit=200):
-    """Fetch all liked tracks for a user."""
+    """Fetch all liked tracks for a user (pipelined, rate-limited paging)."""
     all_tracks = []
-    next_href = f"{BASE_API}/users/{user_id}/likes?client_id={client_id}&limit={limit}"
-
-    page = 1
-    while next_href:
-        print(f"Fetching page {page}...")
+    pages = iter_like_pages(user_id, client_id, limit, max_tracks=float("inf"))
 
-        response = requests.get(next_href)
-        if response.status_code != 200:
-            print(f"Error fetching likes: {response.status_code}")
+    page = 0
+    while True:
+        try:
+            collection, _ = next(pages)
+        except StopIteration:
             break
+        except Exception as e:
+            # Keep what was collected, as before
+            print(f"Error: {e}")
+            break
+        page += 1
+        print(f"Fetched page {page}...")
 
-        data = response.json()
-        collection = data.get("collection", [])
-
-        for item in collection:
-            # Each item has a "track" or "playlist" key
-            track = item.get("track")
-            if track:
-                all_tracks.append({
-                    "title": track.get("title", "Unknown"),
-                    "artist": track.get("user", {}).get("username", "Unknown"),
-                    "artist_id": track.get("user", {}).get("id"),
-                    "url": track.get("permalink_url"),
-                    "duration_ms": track.get("duration"),
-                    "duration": format_duration(track.get("duration", 0)),
-                    "plays": track.get("playback_count"),
-                    "likes": track.get("likes_count"),
-                    "reposts": track.get("reposts_count"),
-                    "comments": track.get("comment_count"),
-                    "genre": track.get("genre"),
-                    "tag_list": track.get("tag_list", ""),
-                    "description": track.get("description", "")[:500] if track.get("description") else None,
-                    "created_at": track.get("created_at"),
-                    "artwork_url": track.get("artwork_url"),
-                    "waveform_url": track.get("waveform_url"),
-                    "track_id": track.get("id"),
-                    "liked_at": item.get("created_at"),
-                })
+        # Each item has a "track" or "playlist" key; playlists are skipped
+        all_tracks.extend(t for t in map(Track.from_api, collection) if t)
 
         print(f"  Collected {len(all_tracks)} tracks so far")
 
-        # Get next page URL
-        next_href = data.get("next_href")
-        if next_href and "client_id" not in next_href:
-            next_href += f"&client_id={client_id}"
-
-        page += 1
-        time.sleep(0.5)  # Rate limiting
-
     return all_tracks
 
 
-def format_duration(ms):
-    """Convert milliseconds to MM:SS format."""
-    if not ms:
-        return None
-    seconds = ms // 1000
-    minutes = seconds // 60
-    secs = seconds % 60
-    return f"{minutes}:{secs:02d}"
-
-
 def save_tracks(tracks, filename="soundcloud_likes.json"):
     """Save tracks to JSON file."""
     output_file = OUTPUT_DIR / filename
@@ -160,7 +126,7 @@ def save_tracks(tracks, filename="soundcloud_likes.json"):
             "track_count": len(tracks),
             "scraped_at": datetime.now().isoformat(),
             "tracks": tracks
-        }, f, ensure_ascii=False, indent=2)
+        }, f, ensure_ascii=False, indent=2, default=json_default)
     print(f"Saved {len(tracks)} tracks to {output_file}")
     return output_file
 
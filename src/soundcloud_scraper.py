@@ -11,6 +11,9 @@ from datetime import datetime
 from pathlib import Path
 from playwright.sync_api import sync_playwright
 
+from enrich_tracks import enrich_tracks
+from track import Track, json_default
+
 # Configuration
 TARGET_URL = "https://soundcloud.com/amr-farouk-10/likes"
 OUTPUT_DIR = Path(__file__).parent.parent / "data"
@@ -45,15 +48,15 @@ def extract_track_data(track_element):
         genre_el = track_element.query_selector('.sc-tag')
         genre = genre_el.inner_text().strip() if genre_el else None
 
-        return {
-            "title": title,
-            "artist": artist,
-            "url": track_url,
-            "duration": duration,
-            "plays": plays,
-            "genre": genre,
-            "scraped_at": datetime.now().isoformat()
-        }
+        return Track(
+            title=title,
+            artist=artist,
+            url=track_url,
+            duration=duration,
+            plays=plays,
+            genre=genre,
+            scraped_at=datetime.now().isoformat()
+        )
     except Exception as e:
         print(f"Error extracting track: {e}")
         return None
@@ -113,7 +116,7 @@ def save_progress(tracks):
             "track_count": len(tracks),
             "last_updated": datetime.now().isoformat(),
             "tracks": tracks
-        }, f, ensure_ascii=False, indent=2)
+        }, f, ensure_ascii=False, indent=2, default=json_default)
     print(f"Progress saved: {len(tracks)} tracks")
 
 
@@ -148,6 +151,12 @@ def main():
         # Collect all tracks
         tracks = scroll_and_collect(page)
 
+        # Fill genre/tags/duration for DOM-scraped tracks
+        try:
+            enrich_tracks(tracks, data_dir=OUTPUT_DIR)
+        except Exception as e:
+            print(f"Enrichment failed: {e}")
+
         # Save final results
         output_file = OUTPUT_DIR / "soundcloud_likes.json"
         with open(output_file, 'w', encoding='utf-8') as f:
@@ -156,7 +165,7 @@ def main():
                 "track_count": len(tracks),
                 "scraped_at": datetime.now().isoformat(),
                 "tracks": tracks
-            }, f, ensure_ascii=False, indent=2)
+            }, f, ensure_ascii=False, indent=2, default=json_default)
 
         print("-" * 50)
         print(f"Scraping complete!")
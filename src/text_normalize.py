@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Text Normalization
+Arabic-aware folding for keyword matching and indexing: alef/ya/ta-marbuta
+variants are unified, tashkeel and tatweel removed, text casefolded and
+reduced to space-separated word tokens. Computed once per track at ingest.
+"""
+
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+ARABIC_PATTERN = re.compile(r'[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF]+')
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+# Letter variants folded to one form
+FOLDED_LETTERS = {
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',  # alef with hamza/madda/wasla
+    'ى': 'ي',                                # alef maksura
+    'ة': 'ه',                                # ta marbuta
+}
+
+# Tashkeel (harakat, tanwin, shadda, sukun, superscript alef, Quranic marks) and tatweel
+REMOVED_CHARS = (
+    [chr(c) for c in range(0x064B, 0x0660)]
+    + ['\u0670', '\u0640']
+    + [chr(c) for c in range(0x06D6, 0x06EE)]
+)
+
+_TABLE = str.maketrans({**{ord(k): v for k, v in FOLDED_LETTERS.items()},
+                        **{ord(c): None for c in REMOVED_CHARS}})
+
+# Normalized views of a track: space-joined tokens per field, `text` covers
+# every searchable field (including the description)
+NormalizedTrack = namedtuple("NormalizedTrack", "title artist genre tags text is_arabic")
+
+
+def normalize(text):
+    """Fold, casefold and tokenize `text`; returns tokens joined by single spaces."""
+    if not text:
+        return ""
+    folded = str(text).casefold().translate(_TABLE)
+    return " ".join(TOKEN_PATTERN.findall(folded))
+
+
+# Artists, genres and tag lists repeat across a library
+normalize_cached = lru_cache(maxsize=65536)(normalize)
+
+
+def tokens(text):
+    """Normalized word tokens of `text`."""
+    return normalize(text).split()
+
+
+def has_arabic(text):
+    """Check if text contains Arabic characters."""
+    if not text:
+        return False
+    return bool(ARABIC_PATTERN.search(str(text)))
+
+
+def normalize_track(track):
+    """Build the NormalizedTrack for a Track or track dict."""
+    title = normalize(track.get('title'))
+    artist = normalize_cached(track.get('artist') or "")
+    genre = normalize_cached(track.get('genre') or "")
+    tags = normalize_cached(track.get('tag_list') or "")
+    description = normalize(track.get('description'))
+    text = " ".join(f for f in (title, artist, genre, tags, description) if f)
+    is_arabic = any(has_arabic(track.get(f)) for f in ('title', 'artist', 'genre', 'tag_list', 'description'))
+    return NormalizedTrack(title, artist, genre, tags, text, is_arabic)
+
+
+def normalized(track):
+    """The track's stored NormalizedTrack (computed on the fly for plain dicts)."""
+    norm = getattr(track, 'norm', None)
+    return norm if norm is not None else normalize_track(track)
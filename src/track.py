@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Track Record
+Compact slotted track type shared by every pipeline stage, plus a columnar
+TrackTable for bulk stages (feature extraction, indexing).
+"""
+
+import sys
+from operator import attrgetter
+
+from text_normalize import normalize_track
+
+# Keep descriptions short; they are only used for keyword matching
+DESCRIPTION_LIMIT = 500
+
+# Every track in the pipeline carries exactly these fields (None when unknown)
+FIELDS = (
+    "title", "artist", "artist_id", "url", "duration_ms", "duration",
+    "plays", "likes", "reposts", "comments", "genre", "tag_list",
+    "description", "created_at", "artwork_url", "waveform_url",
+    "track_id", "liked_at",
+)
+FIELD_SET = frozenset(FIELDS)
+
+# String values that repeat heavily across a library, interned on construction
+INTERNED_FIELDS = ("artist", "genre", "tag_list")
+
+# Fields the normalized text (Track.norm) is derived from
+TEXT_FIELDS = frozenset(("title", "artist", "genre", "tag_list", "description"))
+
+_get_fields = attrgetter(*FIELDS)
+
+
+def format_duration(ms):
+    """Convert milliseconds to MM:SS (or H:MM:SS) format."""
+    if not ms:
+        return None
+    seconds = ms // 1000
+    minutes = seconds // 60
+    secs = seconds % 60
+    if minutes >= 60:
+        hours = minutes // 60
+        mins = minutes % 60
+        return f"{hours}:{mins:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
+
+
+def parse_duration_ms(duration):
+    """Parse an 'M:SS' / 'H:MM:SS' string to milliseconds."""
+    try:
+        parts = [int(p) for p in str(duration).split(':')]
+    except ValueError:
+        return None
+    if len(parts) == 2:
+        return (parts[0] * 60 + parts[1]) * 1000
+    if len(parts) == 3:
+        return (parts[0] * 3600 + parts[1] * 60 + parts[2]) * 1000
+    return None
+
+
+class Track:
+    """One liked track.
+
+    Behaves like the old track dicts for reading (`get`, `[]`, `in`), so
+    stages that only look fields up work unchanged. Fields that are None
+    count as missing for `get` and `in`. Keys outside FIELDS (cluster,
+    cluster_score, scraped_at, ...) live in a small `extra` dict.
+
+    `norm` holds the normalized text fields (text_normalize.NormalizedTrack),
+    computed at construction and refreshed when a text field is set.
+    """
+
+    __slots__ = FIELDS + ("extra", "norm")
+
+    def __init__(self, **fields):
+        for name in FIELDS:
+            setattr(self, name, fields.pop(name, None))
+        self.extra = {sys.intern(k): v for k, v in fields.items()} if fields else None
+
+        for name in INTERNED_FIELDS:
+            value = getattr(self, name)
+            if type(value) is str:
+                setattr(self, name, sys.intern(value))
+        if self.description:
+            self.description = self.description[:DESCRIPTION_LIMIT]
+        if self.tag_list is None:
+            self.tag_list = ""
+
+        # Scrapers see only one of the two duration forms
+        if self.duration_ms is None and self.duration:
+            self.duration_ms = parse_duration_ms(self.duration)
+        elif self.duration is None and self.duration_ms:
+            self.duration = format_duration(self.duration_ms)
+
+        self.norm = normalize_track(self)
+
+    @classmethod
+    def from_api(cls, item, **extra):
+        """Build from an API v2 track, or a likes item wrapping one.
+
+        Returns None for anything that isn't a track (e.g. liked playlists).
+        """
+        track = item.get("track")
+        if isinstance(track, dict):
+            liked_at = item.get("created_at")
+        else:
+            track, liked_at = item, None
+            if item.get("kind", "track") != "track":
+                return None
+        if not track:
+            return None
+
+        user = track.get("user") or {}
+        return cls(
+            title=track.get("title", "Unknown"),
+            artist=user.get("username", "Unknown"),
+            artist_id=user.get("id"),
+            url=track.get("permalink_url"),
+            duration_ms=track.get("duration"),
+            plays=track.get("playback_count"),
+            likes=track.get("likes_count"),
+            reposts=track.get("reposts_count"),
+            comments=track.get("comment_count"),
+            genre=track.get("genre"),
+            tag_list=track.get("tag_list", ""),
+            description=track.get("description") or "",
+            created_at=track.get("created_at"),
+            artwork_url=track.get("artwork_url"),
+            waveform_url=track.get("waveform_url"),
+            track_id=track.get("id"),
+            liked_at=liked_at,
+            **extra,
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build from a stored track dict (soundcloud_likes.json, clusters)."""
+        if isinstance(data, cls):
+            return data
+        return cls(**data)
+
+    def get(self, key, default=None):
+        if key in FIELD_SET:
+            value = getattr(self, key)
+        elif self.extra:
+            value = self.extra.get(key)
+        else:
+            value = None
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        if key in FIELD_SET:
+            return getattr(self, key)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in FIELD_SET:
+            setattr(self, key, value)
+            if key in TEXT_FIELDS:
+                self.norm = normalize_track(self)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[sys.intern(key)] = value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __eq__(self, other):
+        if not isinstance(other, Track):
+            return NotImplemented
+        return _get_fields(self) == _get_fields(other) and (self.extra or {}) == (other.extra or {})
+
+    def __repr__(self):
+        return f"Track({self.track_id!r}, {self.artist!r} - {self.title!r})"
+
+    def copy(self):
+        clone = Track.__new__(Track)
+        for name, value in zip(FIELDS, _get_fields(self)):
+            setattr(clone, name, value)
+        clone.extra = dict(self.extra) if self.extra else None
+        clone.norm = self.norm
+        return clone
+
+    def to_dict(self):
+        """Plain dict with every field (in FIELDS order), then any extras."""
+        data = dict(zip(FIELDS, _get_fields(self)))
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+
+def json_default(obj):
+    """`default=` hook so json.dump can write Tracks and TrackTables directly."""
+    if isinstance(obj, Track):
+        return obj.to_dict()
+    if isinstance(obj, TrackTable):
+        return obj.to_records()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def load_tracks(records):
+    """Convert a list of stored track dicts to Tracks."""
+    return [Track.from_dict(r) for r in records]
+
+
+class TrackTable:
+    """Struct-of-arrays container: one list per field, row-aligned.
+
+    Bulk stages read whole columns (`table.column("genre")`) instead of
+    touching every track object; rows are materialized as Tracks on demand.
+    """
+
+    def __init__(self):
+        self.columns = {name: [] for name in FIELDS}
+        self.extras = []
+        self.norms = []
+
+    @classmethod
+    def from_tracks(cls, tracks):
+        if isinstance(tracks, cls):
+            return tracks
+        table = cls()
+        for track in tracks:
+            table.append(track)
+        return table
+
+    def append(self, track):
+        track = Track.from_dict(track)
+        for column, value in zip(self.columns.values(), _get_fields(track)):
+            column.append(value)
+        self.extras.append(track.extra)
+        self.norms.append(track.norm)
+
+    def __len__(self):
+        return len(self.extras)
+
+    def column(self, name):
+        """All values of one field (or extra key), in row order."""
+        if name in FIELD_SET:
+            return self.columns[name]
+        return [extra.get(name) if extra else None for extra in self.extras]
+
+    def __getitem__(self, row):
+        track = Track.__new__(Track)
+        for name, column in self.columns.items():
+            setattr(track, name, column[row])
+        extra = self.extras[row]
+        track.extra = dict(extra) if extra else None
+        track.norm = self.norms[row]
+        return track
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+    def to_records(self):
+        """Rows as plain dicts (for JSON output)."""
+        names = list(self.columns)
+        records = [dict(zip(names, values)) for values in zip(*self.columns.values())]
+        for record, extra in zip(records, self.extras):
+            if extra:
+                record.update(extra)
+        return records
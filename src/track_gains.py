@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Per-Track EQ Gains
+Blends cluster presets per track using softmax weights over the keyword
+classifier's all_cluster_scores, and stores the result as a compact int8 table.
+"""
+
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+
+GAINS_FILE = "track_gains.bin"
+MANIFEST_FILE = "track_gains.json"
+TABLE_VERSION = 1
+
+# Gains are stored as signed half-dB steps (int8 covers -64..+63.5 dB)
+GAIN_STEP_DB = 0.5
+
+# Softmax temperature: lower values approach the hard argmax preset
+DEFAULT_TEMPERATURE = 1.0
+
+# Logit given to "uncategorized" so weakly scored tracks lean towards the
+# fallback preset (matches the classifier's minimum score threshold). That
+# preset is flat for the keyword rules but AI-generated on the Groq path,
+# where a one-hit track still takes ~38% of it.
+UNCATEGORIZED_LOGIT = 0.5
+
+
+def score_matrix(tracks, cluster_ids):
+    """Build a (tracks x clusters) matrix from each track's all_cluster_scores.
+
+    Clusters a track never scored for are -inf, so they get no softmax weight.
+    """
+    column = {cid: i for i, cid in enumerate(cluster_ids)}
+    scores = np.full((len(tracks), len(cluster_ids)), -np.inf, dtype=np.float32)
+
+    for row, track in enumerate(tracks):
+        for cid, score in (track.get('all_cluster_scores') or {}).items():
+            col = column.get(cid)
+            if col is not None:
+                scores[row, col] = score
+
+    if 'uncategorized' in column:
+        scores[:, column['uncategorized']] = UNCATEGORIZED_LOGIT
+    # Rows with no scores at all fall back to a uniform blend
+    scores[np.isneginf(scores).all(axis=1)] = 0
+    return scores
+
+
+def softmax(scores, temperature=DEFAULT_TEMPERATURE):
+    """Row-wise softmax of a score matrix."""
+    logits = scores / max(temperature, 1e-6)
+    logits -= logits.max(axis=1, keepdims=True)
+    weights = np.exp(logits)
+    return weights / weights.sum(axis=1, keepdims=True)
+
+
+def blend_track_gains(tracks, presets, bands, temperature=DEFAULT_TEMPERATURE):
+    """Blend preset gains for every track in one matrix product.
+
+    `presets` maps cluster_id -> {frequency: gain}. Returns a
+    (tracks x bands) float matrix of per-track gains in dB.
+    """
+    cluster_ids = list(presets.keys())
+    preset_matrix = np.array(
+        [[presets[cid].get(freq, 0) for freq in bands] for cid in cluster_ids],
+        dtype=np.float32
+    )
+    weights = softmax(score_matrix(tracks, cluster_ids), temperature)
+    return weights @ preset_matrix
+
+
+def quantize(gains):
+    """Convert dB gains to int8 half-dB steps."""
+    return np.clip(np.round(gains / GAIN_STEP_DB), -128, 127).astype(np.int8)
+
+
+def save_track_gains(tracks, presets, bands, data_dir=DATA_DIR, temperature=DEFAULT_TEMPERATURE):
+    """Compute and write the per-track gain table keyed by track_id."""
+    data_dir = Path(data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    keyed = [t for t in tracks if t.get('track_id') is not None]
+
+    # Both files are replaced atomically, table first: a reader that gets the
+    # new manifest also gets the table it describes
+    table = quantize(blend_track_gains(keyed, presets, bands, temperature))
+    path = data_dir / GAINS_FILE
+    with open(f"{path}.tmp", 'wb') as f:
+        f.write(table.tobytes())
+    os.replace(f"{path}.tmp", path)
+
+    manifest = {
+        'version': TABLE_VERSION,
+        'generated_at': datetime.now().isoformat(),
+        'count': len(keyed),
+        'bands': list(bands),
+        'gain_step_db': GAIN_STEP_DB,
+        'temperature': temperature,
+        'gains_file': GAINS_FILE,
+        'track_ids': [str(t['track_id']) for t in keyed],
+    }
+    path = data_dir / MANIFEST_FILE
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, separators=(',', ':'))
+    os.replace(f"{path}.tmp", path)
+
+    return manifest
+
+
+class TrackGainTable:
+    """Read-only copy of a written per-track gain table.
+
+    The table is read into memory (about 10 bytes per track) rather than
+    mapped, so a later save_track_gains can't change or truncate it under
+    a long-running reader.
+    """
+
+    def __init__(self, data_dir=DATA_DIR):
+        data_dir = Path(data_dir)
+        with open(data_dir / MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+        self.bands = manifest['bands']
+        self.step = manifest['gain_step_db']
+        self.rows = {tid: row for row, tid in enumerate(manifest['track_ids'])}
+        size = manifest['count'] * len(self.bands)
+        table = np.fromfile(data_dir / manifest['gains_file'], dtype=np.int8)
+        if table.size != size:
+            raise ValueError(f"{manifest['gains_file']} has {table.size} gains, manifest says {size}")
+        self._table = table.reshape(manifest['count'], len(self.bands))
+
+    def gains(self, track_id):
+        """Return {frequency: gain_db} for a track, or None if unknown."""
+        row = self.rows.get(str(track_id))
+        if row is None:
+            return None
+        return {freq: float(g) * self.step for freq, g in zip(self.bands, self._table[row])}
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Pipeline Worker
+Claims jobs from the job queue and runs them, renewing the lease while a
+job runs. With --schedule the worker also queues each account's daily run
+at its staggered slot (idempotent, so every worker can do it). Start one
+per node, or several per machine; they coordinate through the queue.
+
+    python3 src/worker.py --schedule --concurrency 2
+    python3 src/worker.py --broker http://queue-host:8791
+"""
+
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+import traceback
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import instrumentation
+from accounts import load_usernames, parse_usernames, user_data_dir
+from daily_update import resolve_dirs, run_daily_update
+from fetch_likes import DEFAULT_USERNAME
+from job_queue import LEASE_SECONDS, QUEUE_FILE, open_queue, schedule_daily
+
+POLL_INTERVAL = 5          # seconds between claims when the queue is idle
+SCHEDULE_INTERVAL = 300    # seconds between scheduling passes
+RETRY_INTERVAL = 5         # seconds between heartbeat retries after an error
+
+
+def run_update_job(payload, cancel):
+    """daily_update job: the full pipeline for one account, stopping
+    between stages once `cancel` is set."""
+    username = payload.get("username") or DEFAULT_USERNAME
+    data_dir = user_data_dir(resolve_dirs()[0], username)
+    with instrumentation.run_scope():
+        if not run_daily_update(username, data_dir, cancel=cancel):
+            raise Exception(f"Pipeline failed for {username} (see last_update_status.json)")
+
+
+# Job kind -> handler(payload, cancel); a handler signals failure by raising
+# and should give up soon after `cancel` (a threading.Event) is set
+HANDLERS = {
+    "daily_update": run_update_job,
+}
+
+
+def scheduled_accounts():
+    """Accounts with a daily run: AUTOEQ_USERS / AUTOEQ_USERS_FILE, else the default account."""
+    usernames = parse_usernames(os.environ.get("AUTOEQ_USERS", ""))
+    users_file = os.environ.get("AUTOEQ_USERS_FILE")
+    if users_file:
+        usernames += [u for u in load_usernames(users_file) if u not in usernames]
+    return usernames or [DEFAULT_USERNAME]
+
+
+class Worker:
+    """Runs `concurrency` claim loops against one queue."""
+
+    def __init__(self, queue, concurrency=1, lease_seconds=LEASE_SECONDS, name=None):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.stopping = threading.Event()
+
+    def run_job(self, job, worker_id):
+        """Run one claimed job, renewing its lease until it finishes."""
+        done = threading.Event()
+        lost = threading.Event()
+
+        def renew():
+            interval = self.lease_seconds / 3
+            expires = time.monotonic() + self.lease_seconds
+            while not done.wait(interval):
+                try:
+                    renewed = self.queue.heartbeat(job["id"], worker_id, self.lease_seconds)
+                except Exception as e:
+                    # A broker or database hiccup: retry sooner while the lease lasts
+                    print(f"[{worker_id}] Heartbeat for job {job['id']} failed: {e}")
+                    if time.monotonic() < expires - RETRY_INTERVAL:
+                        interval = RETRY_INTERVAL
+                        continue
+                    renewed = False
+                if not renewed:
+                    lost.set()
+                    return
+                interval = self.lease_seconds / 3
+                expires = time.monotonic() + self.lease_seconds
+
+        heartbeat = threading.Thread(target=renew, daemon=True)
+        heartbeat.start()
+        error = None
+        try:
+            handler = HANDLERS.get(job["kind"])
+            if handler is None:
+                raise Exception(f"No handler for job kind {job['kind']!r}")
+            handler(job["payload"], lost)
+        except Exception as e:
+            error = e
+            traceback.print_exc()
+        finally:
+            done.set()
+            heartbeat.join()
+
+        if lost.is_set():
+            print(f"[{worker_id}] Lost the lease on job {job['id']}; result not recorded")
+            return False
+        if error is not None:
+            print(f"[{worker_id}] Job {job['id']} failed (attempt {job['attempts']}): {error}")
+            self.queue.fail(job["id"], worker_id, str(error))
+            return False
+        self.queue.complete(job["id"], worker_id)
+        print(f"[{worker_id}] Job {job['id']} done")
+        return True
+
+    def loop(self, slot, drain=False):
+        worker_id = f"{self.name}/{slot}"
+        while not self.stopping.is_set():
+            try:
+                job = self.queue.claim(worker_id, kinds=list(HANDLERS), lease_seconds=self.lease_seconds)
+            except Exception as e:
+                print(f"[{worker_id}] Claim failed: {e}")
+                job = None
+            if job is None:
+                if drain:
+                    return
+                self.stopping.wait(POLL_INTERVAL)
+                continue
+            print(f"[{worker_id}] Job {job['id']}: {job['kind']} {job['payload']} (attempt {job['attempts']})")
+            self.run_job(job, worker_id)
+
+    def schedule_loop(self):
+        while not self.stopping.is_set():
+            try:
+                added = schedule_daily(self.queue, scheduled_accounts())
+                if added:
+                    print(f"[{self.name}] Scheduled {added} daily runs")
+            except Exception as e:
+                print(f"[{self.name}] Scheduling failed: {e}")
+            self.stopping.wait(SCHEDULE_INTERVAL)
+
+    def run(self, schedule=False, drain=False):
+        """Work until stopped (or, with drain=True, until no job is ready)."""
+        threads = []
+        if schedule:
+            threads.append(threading.Thread(target=self.schedule_loop, daemon=True))
+        for slot in range(self.concurrency):
+            threads.append(threading.Thread(target=self.loop, args=(slot, drain)))
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                if not thread.daemon:
+                    thread.join()
+        except KeyboardInterrupt:
+            print("Stopping after the running jobs...")
+            self.stopping.set()
+            for thread in threads:
+                if not thread.daemon:
+                    thread.join()
+        self.stopping.set()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AutoEQ pipeline worker")
+    parser.add_argument("--queue", default=QUEUE_FILE, help="SQLite queue file")
+    parser.add_argument("--broker", default=os.environ.get("AUTOEQ_BROKER_URL"),
+                        help="Remote queue broker URL instead of the local file (also AUTOEQ_BROKER_URL)")
+    parser.add_argument("--concurrency", type=int, default=int(os.environ.get("AUTOEQ_WORKER_CONCURRENCY", "1")),
+                        help="Jobs run in parallel by this worker (also AUTOEQ_WORKER_CONCURRENCY)")
+    parser.add_argument("--schedule", action="store_true", help="Also queue the daily runs")
+    parser.add_argument("--drain", action="store_true", help="Exit once no job is ready")
+    parser.add_argument("--lease", type=int, default=LEASE_SECONDS, help="Lease length in seconds")
+    args = parser.parse_args(argv)
+
+    queue = open_queue(args.broker, args.queue)
+    worker = Worker(queue, max(1, args.concurrency), args.lease)
+    print(f"Worker {worker.name}: {args.broker or args.queue}, concurrency {worker.concurrency}")
+    worker.run(schedule=args.schedule, drain=args.drain)
+
+
+if __name__ == "__main__":
+    main()